@@ -8,5 +8,5 @@ __version__ = '0.3.3'
 
 import sys
 
-if sys.version_info < (3, 4, 0):
-    raise RuntimeError("Supports only Python 3.4+")
+if sys.version_info < (3, 5, 0):
+    raise RuntimeError("Supports only Python 3.5+")
@@ -0,0 +1,293 @@
+"""
+SQLite-backed HTTP cache for CacheControl with compression and size-bounded
+LRU eviction. Use it instead of the default `FileCache('.webcache')` by setting
+
+    class MyCrawler(BasicCrawler):
+        CACHE = SQLiteCache('.webcache.sqlite3', max_size=2*1024**3)
+
+To import the responses from an existing `.webcache` directory run
+
+    python -m basiccrawler.cache .webcache .webcache.sqlite3
+
+This module also contains the `ParsedPageCache` that remembers the links found
+on each page, so unchanged pages don't need to be parsed again on re-crawls.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from cachecontrol.cache import BaseCache
+
+
+LOGGER = logging.getLogger('crawler')
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    size INTEGER,
+    created REAL,
+    last_access REAL,
+    expires REAL
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+"""
+
+
+
+class SQLiteCache(BaseCache):
+    """
+    CacheControl cache backend that stores the zlib-compressed responses in a
+    single SQLite database file at `path` instead of one file per response.
+      - `max_size` (bytes): when the total compressed size of the cache goes
+        above this limit, least recently used responses are evicted
+      - `max_age` (seconds): responses stored longer ago than this are evicted
+    Keys are hashed the same way as in CacheControl's FileCache, which makes it
+    possible to import existing `.webcache` directories (see `import_file_cache`).
+    The database connection is opened on first use and can be used from
+    multiple threads.
+    """
+
+    def __init__(self, path, max_size=None, max_age=None, compress_level=6):
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.compress_level = compress_level
+        self.conn = None
+        self.total_size = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def encode(key):
+        return hashlib.sha224(key.encode()).hexdigest()
+
+    def connect(self):
+        if self.conn is None:
+            parent_dir, _ = os.path.split(self.path)
+            if parent_dir and not os.path.exists(parent_dir):
+                os.makedirs(parent_dir, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self.conn.executescript(SCHEMA)
+            row = self.conn.execute('SELECT SUM(size) FROM responses').fetchone()
+            self.total_size = row[0] or 0
+        return self.conn
+
+    def get(self, key):
+        hashed_key = self.encode(key)
+        now = time.time()
+        with self.lock:
+            conn = self.connect()
+            row = conn.execute('SELECT value, expires FROM responses WHERE key = ?', (hashed_key,)).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if expires is not None and expires < now:
+                self._delete(hashed_key)
+                return None
+            with conn:
+                conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, hashed_key))
+        return zlib.decompress(value)
+
+    def set(self, key, value, expires=None):
+        self.set_hashed(self.encode(key), value, expires=expires)
+
+    def set_hashed(self, hashed_key, value, expires=None, created=None):
+        now = time.time()
+        if created is None:
+            created = now
+        if hasattr(expires, 'timestamp'):   # datetime
+            expires = expires.timestamp()
+        elif expires:                       # seconds from now
+            expires = now + expires
+        else:
+            expires = None
+        compressed = zlib.compress(value, self.compress_level)
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                old = conn.execute('SELECT size FROM responses WHERE key = ?', (hashed_key,)).fetchone()
+                if old:
+                    self.total_size -= old[0]
+                conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                             (hashed_key, compressed, len(compressed), created, now, expires))
+                self.total_size += len(compressed)
+            self.evict()
+
+    def add_hashed_entries(self, entries):
+        """
+        Bulk insert of (hashed_key, value, created) tuples in a single transaction.
+        """
+        now = time.time()
+        rows = []
+        for hashed_key, value, created in entries:
+            compressed = zlib.compress(value, self.compress_level)
+            rows.append((hashed_key, compressed, len(compressed), created, now, None))
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)', rows)
+            row = conn.execute('SELECT SUM(size) FROM responses').fetchone()
+            self.total_size = row[0] or 0
+            self.evict()
+
+    def delete(self, key):
+        with self.lock:
+            self.connect()
+            self._delete(self.encode(key))
+
+    def _delete(self, hashed_key):
+        with self.conn:
+            row = self.conn.execute('SELECT size FROM responses WHERE key = ?', (hashed_key,)).fetchone()
+            if row:
+                self.total_size -= row[0]
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (hashed_key,))
+
+    def evict(self):
+        """
+        Remove responses older than `max_age`, then remove least recently used
+        responses until the cache size is below `max_size`. Call with lock held.
+        """
+        conn = self.conn
+        with conn:
+            if self.max_age is not None:
+                cutoff = time.time() - self.max_age
+                row = conn.execute('SELECT SUM(size) FROM responses WHERE created < ?', (cutoff,)).fetchone()
+                if row[0]:
+                    conn.execute('DELETE FROM responses WHERE created < ?', (cutoff,))
+                    self.total_size -= row[0]
+            if self.max_size is not None and self.total_size > self.max_size:
+                # free an extra 10% so we don't need to evict on every insert
+                target_size = self.max_size * 0.9
+                cursor = conn.execute('SELECT key, size FROM responses ORDER BY last_access')
+                evicted = []
+                for key, size in cursor:
+                    if self.total_size <= target_size:
+                        break
+                    evicted.append((key,))
+                    self.total_size -= size
+                cursor.close()
+                conn.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+
+# PARSED PAGES CACHE
+################################################################################
+
+PARSED_PAGES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    digest TEXT,
+    title TEXT,
+    links TEXT
+);
+"""
+
+
+class ParsedPageCache(object):
+    """
+    Stores the title and links extracted from each page in the SQLite database
+    at `path`, together with a digest of the page contents. When the same page
+    contents are seen again (e.g. a `304 Not Modified` response served from the
+    HTTP cache during a re-crawl), the stored results are used instead of
+    parsing the page again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def digest(content):
+        return hashlib.sha1(content).hexdigest()
+
+    def connect(self):
+        if self.conn is None:
+            parent_dir, _ = os.path.split(self.path)
+            if parent_dir and not os.path.exists(parent_dir):
+                os.makedirs(parent_dir, exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self.conn.executescript(PARSED_PAGES_SCHEMA)
+        return self.conn
+
+    def get(self, url, digest):
+        """
+        Returns (title, links) if `url` was parsed before with the same `digest`.
+        """
+        with self.lock:
+            row = self.connect().execute('SELECT digest, title, links FROM pages WHERE url = ?', (url,)).fetchone()
+        if row is None or row[0] != digest:
+            return None
+        return (row[1], json.loads(row[2]))
+
+    def set(self, url, digest, title, links):
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)',
+                             (url, digest, title, json.dumps(links)))
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+
+# MIGRATION FROM FileCache
+################################################################################
+
+def import_file_cache(directory, cache, batch_size=1000):
+    """
+    Import all the responses stored in the FileCache `directory` (e.g. `.webcache`)
+    into the SQLiteCache `cache`. Returns the number of responses imported.
+    """
+    count = 0
+    batch = []
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if len(filename) != 56:
+                continue    # not a FileCache entry (sha224 hexdigest filenames)
+            filepath = os.path.join(dirpath, filename)
+            with open(filepath, 'rb') as cache_file:
+                value = cache_file.read()
+            batch.append((filename, value, os.path.getmtime(filepath)))
+            if len(batch) >= batch_size:
+                cache.add_hashed_entries(batch)
+                count += len(batch)
+                batch = []
+                LOGGER.info('Imported ' + str(count) + ' responses from ' + directory)
+    if batch:
+        cache.add_hashed_entries(batch)
+        count += len(batch)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import a CacheControl FileCache directory into a SQLiteCache.')
+    parser.add_argument('directory', help='FileCache directory, e.g. .webcache')
+    parser.add_argument('dbpath', help='SQLiteCache database file, e.g. .webcache.sqlite3')
+    args = parser.parse_args()
+    cache = SQLiteCache(args.dbpath)
+    count = import_file_cache(args.directory, cache)
+    cache.close()
+    print('Imported', count, 'responses from', args.directory, 'into', args.dbpath)
+
+
+if __name__ == '__main__':
+    main()
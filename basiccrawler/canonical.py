@@ -0,0 +1,149 @@
+"""
+URL canonicalization rules used by `cleanup_url` so that the different ways of
+writing the same URL (parameter order, tracking parameters, letter case of the
+host, default ports, `..` segments, percent-encoding) are crawled only once.
+"""
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+from .urlfilter import Pattern
+
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+UNRESERVED_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+PERCENT_ENCODED_RE = re.compile('%([0-9a-fA-F]{2})')
+
+# parameters that can be used with drop_params
+TRACKING_PARAMS = [re.compile('utm_'), 'gclid', 'fbclid', 'mc_cid', 'mc_eid', '_ga']
+SESSION_PARAMS = [re.compile('(?i)(phpsessid|jsessionid|aspsessionid\\w*|sessionid|session_id)$')]
+
+
+
+def normalize_percent_encoding(text):
+    """
+    Decode percent-encoded unreserved characters (letters, digits, -._~) and use
+    uppercase hex digits for the others, e.g. '%7euser%2f' --> '~user%2F'.
+    """
+    if '%' not in text:
+        return text
+    def normalize(match):
+        char = chr(int(match.group(1), 16))
+        if char in UNRESERVED_CHARS:
+            return char
+        return '%' + match.group(1).upper()
+    return PERCENT_ENCODED_RE.sub(normalize, text)
+
+
+def remove_dot_segments(path):
+    """
+    Resolve the `.` and `..` segments of `path` (RFC 3986 section 5.2.4),
+    e.g. '/a/b/../c/./d' --> '/a/c/d'.
+    """
+    if '.' not in path:
+        return path
+    segments = path.split('/')
+    output = []
+    for segment in segments:
+        if segment == '.':
+            continue
+        if segment == '..':
+            if len(output) > 1:
+                output.pop()    # never remove the leading '' of absolute paths
+            continue
+        output.append(segment)
+    if segments[-1] in ('.', '..'):
+        output.append('')       # '/a/b/..' --> '/a/'
+    return '/'.join(output)
+
+
+
+class URLCanonicalizer(object):
+    """
+    Rewrites http(s) URLs to a canonical form by applying the enabled rules:
+      - `lowercase_host`: lowercase the host name (the scheme is always lowercased)
+      - `strip_default_ports`: remove :80 from http and :443 from https URLs
+      - `remove_dot_segments`: resolve `.` and `..` path segments, and use `/`
+        for the empty path
+      - `normalize_percent_encoding`: see `normalize_percent_encoding`
+      - `remove_trailing_slash`: '/about/' --> '/about' (off by default since
+        many sites serve different pages for the two)
+      - `drop_params`: remove query parameters whose name is in this list of
+        strings (exact match) and regular expressions (`re.match`), e.g.
+        `TRACKING_PARAMS + SESSION_PARAMS`
+      - `sort_params`: sort query parameters by name (stable for repeated names)
+    URLs with other schemes (mailto:, javascript:, etc.) are not changed.
+    The results for up to `cache_size` URLs are cached.
+    """
+
+    def __init__(self, sort_params=True, drop_params=(), lowercase_host=True,
+                 strip_default_ports=True, remove_dot_segments=True,
+                 normalize_percent_encoding=True, remove_trailing_slash=False,
+                 cache_size=100000):
+        self.sort_params = sort_params
+        self.drop_names = set()
+        self.drop_regexes = []
+        for param in drop_params:
+            if isinstance(param, str):
+                self.drop_names.add(param)
+            elif isinstance(param, Pattern):
+                self.drop_regexes.append(param)
+            else:
+                raise ValueError('Unrecognized value in drop_params. Use strings or REs.')
+        self.lowercase_host = lowercase_host
+        self.strip_default_ports = strip_default_ports
+        self.remove_dot_segments = remove_dot_segments
+        self.normalize_percent_encoding = normalize_percent_encoding
+        self.remove_trailing_slash = remove_trailing_slash
+        self.cache_size = cache_size
+        self.cache = {}     # url --> canonical url
+
+    def canonicalize(self, url):
+        canonical_url = self.cache.get(url)
+        if canonical_url is None:
+            canonical_url = self.canonicalize_url(url)
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[url] = canonical_url
+        return canonical_url
+
+    def canonicalize_url(self, url):
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        if scheme not in DEFAULT_PORTS or not netloc:
+            return url
+        netloc = self.canonicalize_netloc(scheme, netloc)
+        if self.normalize_percent_encoding:
+            path = normalize_percent_encoding(path)
+            query = normalize_percent_encoding(query)
+        if self.remove_dot_segments:
+            path = remove_dot_segments(path) or '/'
+        if self.remove_trailing_slash and len(path) > 1 and path.endswith('/'):
+            path = path.rstrip('/') or '/'
+        if query:
+            query = self.canonicalize_query(query)
+        return urlunsplit((scheme, netloc, path, query, fragment))
+
+    def canonicalize_netloc(self, scheme, netloc):
+        userinfo, at, hostport = netloc.rpartition('@')
+        if self.lowercase_host:
+            hostport = hostport.lower()
+        if self.strip_default_ports:
+            host, colon, port = hostport.rpartition(':')
+            if colon and ']' not in port and (port == '' or port == DEFAULT_PORTS[scheme]):
+                hostport = host
+        return userinfo + at + hostport
+
+    def canonicalize_query(self, query):
+        params = query.split('&')
+        if self.drop_names or self.drop_regexes:
+            params = [param for param in params if param and not self.should_drop(param.split('=', 1)[0])]
+        if self.sort_params:
+            params.sort(key=lambda param: param.split('=', 1)[0])
+        return '&'.join(params)
+
+    def should_drop(self, name):
+        if name in self.drop_names:
+            return True
+        for regex in self.drop_regexes:
+            if regex.match(name):
+                return True
+        return False
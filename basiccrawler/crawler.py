@@ -1,28 +1,51 @@
+import asyncio
 from bs4 import BeautifulSoup
 from cachecontrol import CacheControlAdapter
 from cachecontrol.caches.file_cache import FileCache
 from cachecontrol.heuristics import BaseHeuristic, expire_after, datetime_to_header
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
+import inspect
+import itertools
 import json
 import logging
 import re
 import os
 import queue
 import requests
+from requests.structures import CaseInsensitiveDict
+import signal
+import sys
+import threading
 import time
-from urllib.parse import urljoin, urldefrag, urlparse
+from urllib.parse import urldefrag, urlparse
 from youtube_dl.utils import std_headers
 
+from .distributed import ShardCoordinator
+from .globalnav import GlobalNavIndex
+from .hooks import Hooks
+from .pathindex import PathTrie
+from .frontier import PriorityFrontier
+from .politeness import HostQueue, HostRateLimiter, RobotsCache, get_host
+from .seenstore import FingerprintCounter
+from .simhash import SimHashIndex, extract_visible_text, simhash
+from .retry import RetryLater, RetryQueue, backoff_delay, parse_retry_after
+from .traversal import iter_nodes, iter_tree, walk_tree
+from .parsing import ParsedPage, extract_links, extract_title, parse_page_html
+from .state import CrawlStateStore
+from .stats import CrawlStats
+from .treediff import diff_web_resource_trees
+from .treejson import write_web_resource_tree_json
+from .urlfilter import Pattern, URLFilter  # noqa: F401  Pattern still importable from here
 
+try:
+    import aiohttp      # optional, needed only for `BasicCrawler.acrawl`
+except ImportError:
+    aiohttp = None
 
 
 
-# Python 3.* compatible type for patterns in re
-try:
-    Pattern = re._pattern_type      # Py3.5, Py3.6
-except AttributeError:
-    Pattern = re.Pattern            # Py3.7
 
 
 # LOGGING
@@ -52,6 +75,30 @@ class CacheForeverHeuristic(BaseHeuristic):
 
 
 
+# ASYNC HTTP
+################################################################################
+
+class AsyncResponse(object):
+    """
+    Minimal stand-in for `requests.Response` built from an `aiohttp` response,
+    so the same media/page logic can be used for both `crawl` and `acrawl`.
+    """
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.encoding = None
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def close(self):
+        pass    # the aiohttp response is already released
+
+
+
 # BASIC CRAWLER
 ################################################################################
 
@@ -68,6 +115,8 @@ class BasicCrawler(object):
         re.compile('^mailto:.*'), re.compile('^javascript:.*'),
     ]
     ALLOW_BROKEN_HEAD_URLS = []     # proceed with request even
+    SINGLE_REQUEST_FETCH = False    # use a streamed GET instead of HEAD + GET
+    GUESS_MEDIA_FROM_EXTENSION = False  # no requests for URLs ending in .pdf etc.
     MEDIA_FILE_FORMATS = ['pdf', 'zip', 'rar', 'mp4', 'wmv', 'mp3', 'm4a', 'ogg',
                           'exe', 'deb']
     MEDIA_CONTENT_TYPES = [
@@ -84,7 +133,55 @@ class BasicCrawler(object):
     ]
 
     GLOBAL_NAV_THRESHOLD = 0.7
+    SKIP_GLOBAL_NAV = False     # don't visit URLs that look like global nav links...
+    GLOBAL_NAV_WARMUP = 100     # ...once this many pages have been visited
+    PATH_INDEX = False          # keep a PathTrie of the URLs visited in self.path_index during the crawl
     CRAWLING_STAGE_OUTPUT = 'chefdata/trees/web_resource_tree.json'
+    CRAWLING_STAGE_DIFF_OUTPUT = None   # default is CRAWLING_STAGE_OUTPUT with _diff added to the file name
+    COMPACT_JSON_OUTPUT = False # write tree json without indentation (smaller and faster)
+    NODE_CLASS = dict           # or basiccrawler.nodes.WebResource to use less memory per node
+    CRAWL_STATE_PATH = 'chefdata/crawl_state.sqlite3'   # used for checkpoint/resume
+    COMPACT_SEEN_STORE = False  # keep 64-bit URL fingerprints instead of URLs in the seen/visited maps
+    SEEN_STORE_DIR = None       # directory for memory-mapped seen/visited tables (default in memory)
+    CHECKPOINT_EVERY = 100      # save crawl state every 100 crawl steps
+
+    # INSTRUMENTATION
+    COLLECT_STATS = False       # time crawl stages and count requests, see `crawler.stats`
+    STATS_LOG_PATH = None       # e.g. 'chefdata/crawl_stats.jsonl' to append stats as JSON lines...
+    STATS_LOG_EVERY = 10.0      # ...every 10 seconds
+    STATS_PROMETHEUS_PATH = None  # e.g. 'chefdata/crawl_metrics.prom' to save Prometheus metrics
+
+    # POLITENESS
+    ROBOTS_TXT = False          # skip URLs disallowed by robots.txt and obey its Crawl-delay
+    ROBOTS_USER_AGENT = 'BasicCrawler'  # user agent whose robots.txt rules apply
+    MAX_REQUESTS_PER_SECOND = None  # per host request rate limit (token bucket)
+    MAX_BURST = 1               # requests to a host allowed back-to-back before rate limit applies
+    INTERLEAVE_HOSTS = False    # take URLs from the queue in round robin order of their hosts
+
+    # SHARDED CRAWLING (see `crawl(shards=...)`)
+    SHARD_BY = None             # assign URLs to worker processes by 'url' hash or by 'host', default
+                                # is 'host' with ROBOTS_TXT or MAX_REQUESTS_PER_SECOND, otherwise 'url'
+    COORDINATOR_ADDRESS = ('127.0.0.1', 0)  # where workers connect, e.g. ('0.0.0.0', 7070) for remote workers
+    COORDINATOR_AUTHKEY = None  # shared secret for remote workers (random for local workers)
+    START_LOCAL_WORKERS = True  # fork the workers, or wait for remote workers to connect
+
+    # CRAWLING ORDER
+    PRIORITY_CRAWL = False      # crawl URLs in order of `get_priority` instead of first in first out
+    KIND_PRIORITIES = {}        # context['kind'] --> priority, lower priorities are crawled first
+                                # e.g. {'channel': 0, 'topic': 1, 'document': 5}, default is 0
+    DEPTH_PRIORITY = 0          # added to priority for each level of depth in the tree
+    FRONTIER_MAX_MEMORY_ITEMS = 1000000  # queue items kept in memory, the rest go to disk
+
+    # RETRIES
+    RETRY_LATER = True          # put aside URLs that failed and retry them later in the crawl
+    MAX_RETRIES = 5             # retries before a URL is recorded as a BrokenLink
+    RETRY_BACKOFF = 1.0         # seconds before first retry, doubled for every retry...
+    RETRY_MAX_BACKOFF = 300.0   # ...up to this many seconds (plus random jitter), also caps Retry-After
+    RETRY_STATUS_CODES = [429, 500, 502, 503, 504]  # connection errors are always retried
+
+    # DUPLICATE CONTENT
+    DETECT_DUPLICATES = False   # add near-duplicates of visited pages as DuplicateOf nodes
+    DUPLICATE_MAX_DISTANCE = 3  # SimHash bits (out of 64) two pages can differ in to be duplicates
 
     # Subclass attributes
     MAIN_SOURCE_DOMAIN = None   # should be defined by subclass
@@ -94,13 +191,41 @@ class BasicCrawler(object):
     IGNORE_URLS = []            # should be defined by subclass
     kind_handlers = {}          # map from web resource kinds and handlers
                                 # e.g. {'LesssonWebResource': self.on_lesson, .. }
+    FAST_LINK_EXTRACTION = True # don't soupify pages unless a handler needs it
+    PAGE_FIELDS = {}            # extra fields to extract when parsing in processes
+                                # e.g. {'description': get_description} where
+                                # get_description(page) is a module-level function
+
+    URL_CANONICALIZER = None    # basiccrawler.canonical.URLCanonicalizer used by cleanup_url
+
+    # compiled version of ignore lists used by should_ignore_url
+    url_filter = None
+    url_filter_signature = None
+    URL_FILTER_CACHE_SIZE = 100000  # max number of should-ignore decisions to remember
 
     # CACHE LOGIC
     SESSION = requests.Session()
-    CACHE = FileCache('.webcache')
+    CACHE = FileCache('.webcache')    # or basiccrawler.cache.SQLiteCache for large sites
+    REVALIDATE = False          # send conditional GETs to check cached responses are current
+    PARSED_PAGES_CACHE = None   # basiccrawler.cache.ParsedPageCache to skip parsing unchanged pages
 
     # queue used keep track of what pages we should crawl next
-    queue = None  # instance of queue.Queue created insite `crawl` method
+    queue = None  # instance of queue.Queue (or HostQueue) created insite `crawl` method
+    robots = None  # RobotsCache used when ROBOTS_TXT is True
+    rate_limiter = None  # HostRateLimiter used when ROBOTS_TXT or MAX_REQUESTS_PER_SECOND is set
+    retry_queue = None  # RetryQueue of urls waiting to be retried
+    global_nav_deferred = None  # (url, context) of likely global nav urls put aside during warm-up
+    stats = None  # CrawlStats of the last crawl when COLLECT_STATS is True
+    duplicate_index = None  # SimHashIndex of pages visited used when DETECT_DUPLICATES is True
+    hooks = None  # Hooks with the listeners added using `add_hook`
+    step_children = None  # (parent, number of children) when the current step started
+    node_depths = {}  # id(node) --> (depth, node) used by `get_depth`
+    retry_attempts = {}  # url --> list of failed attempts (dicts) for urls being retried
+    parse_pool = None  # ProcessPoolExecutor used when crawling with parse_processes
+    state_store = None  # CrawlStateStore used when crawling with checkpoint=True
+    global_nav_index = None  # GlobalNavIndex of likely global nav urls created in `crawl`
+    path_index = None  # PathTrie of the paths of urls visited when PATH_INDEX is set
+    stop_requested = False  # set by Ctrl-C when checkpointing to stop after current step
 
     # keep track of how many times a given URL is seen during crawl
     # first time a URL is seen will be automatically followed, but
@@ -109,6 +234,12 @@ class BasicCrawler(object):
     #  { 'http://site.../fullpath?a=b#c': 3, ... }
     urls_visited = {}  # 'http://site.../fullpath?a=b#c' --> 'visited'
 
+    # number of links that would be fetched again without URL_CANONICALIZER
+    duplicate_fetches_prevented = 0
+    url_variants_seen = set()       # urls seen that were changed by canonicalization
+    url_variants_pending = set()    # canonical urls seen only as variants so far
+    duplicate_pages_found = 0       # pages added as DuplicateOf nodes when DETECT_DUPLICATES
+
 
     def __init__(self, main_source_domain=None, start_page=None):
         if main_source_domain is None and start_page is None:
@@ -127,6 +258,12 @@ class BasicCrawler(object):
         # keep track of broken links
         self.broken_links = []
 
+        # listeners for crawl events, see `add_hook`
+        self.hooks = Hooks()
+
+        # media file check results of the URLs whose GET will be retried  url --> verdict
+        self.media_verdicts = {}
+
         forever_adapter= CacheControlAdapter(heuristic=CacheForeverHeuristic(), cache=self.CACHE)
         for source_domain in self.SOURCE_DOMAINS:
             self.SESSION.mount(source_domain, forever_adapter)   # TODO: change to less aggressive in final version
@@ -134,18 +271,73 @@ class BasicCrawler(object):
 
 
 
+    # HOOKS
+    ############################################################################
+
+    def add_hook(self, event, listener):
+        """
+        Call `listener` on `event`, with the arguments:
+          - `before_request(url, method, kwargs)`: before each HEAD and GET request
+            made by `make_request` or `amake_request`. Return a response object to
+            use it instead of sending the request (e.g. from a custom cache).
+          - `after_response(url, method, response)`: after the response is received.
+            Return a response to replace it.
+          - `after_parse(url, page)`: after a page is downloaded and parsed. Return
+            a page to replace it.
+          - `before_enqueue(url, context)`: before `url` is added to the crawling
+            queue. Return any value (e.g. True) to skip the URL.
+          - `on_node_created(node)`: for each node added to the tree in a crawl step,
+            by the handler or for media files, broken links, etc.
+          - `on_crawl_end(web_resource_tree)`: before the tree is saved.
+        Listeners are called in the order they were added until one returns a value
+        other than None. With `workers`, the request and parse events are called
+        from the worker threads. Exceptions raised by listeners are not caught, so
+        they stop the crawl instead of being recorded as broken links (except
+        in shard workers, see `ShardCoordinator`).
+        """
+        self.hooks.add(event, listener)
+
+    def remove_hook(self, event, listener):
+        self.hooks.remove(event, listener)
+
+
+
     # GENERIC URL HELPERS
     ############################################################################
 
     def cleanup_url(self, url):
         """
-        Removes URL fragment that falsely make URLs look diffent.
+        Removes URL fragment that falsely make URLs look diffent, and applies the
+        rules of the `URL_CANONICALIZER` if set.
         Subclasses can overload this method to perform other URL-normalizations.
         """
         url = urldefrag(url)[0]
+        if self.URL_CANONICALIZER:
+            url = self.URL_CANONICALIZER.canonicalize(url)
         return url
 
 
+    def count_prevented_duplicate(self, raw_url, url):
+        """
+        Update `duplicate_fetches_prevented` for the link `raw_url` whose canonical
+        form is `url`: every distinct way of writing a URL after the first one seen
+        would have been fetched separately without canonicalization.
+        """
+        raw_url = urldefrag(raw_url)[0]
+        if raw_url == url:
+            if url in self.url_variants_pending:
+                self.url_variants_pending.discard(url)
+                self.duplicate_fetches_prevented += 1
+            return
+        if raw_url in self.url_variants_seen:
+            return
+        self.url_variants_seen.add(raw_url)
+        if url in self.global_urls_seen_count:
+            self.duplicate_fetches_prevented += 1
+        else:
+            self.url_variants_pending.add(url)
+
+
     def url_to_path(self, url):
         """
         Remove any of the SOURCE_DOMAINS from url if it starts with one of them.
@@ -161,38 +353,76 @@ class BasicCrawler(object):
         """
         Returns True if `url` matches any of the IGNORE_URL criteria.
         """
-        url = self.cleanup_url(url)
-
-        # 1. run through ignore lists
-        combined_ignore_patterns = self.BASE_IGNORE_URLS.copy()
-        combined_ignore_patterns.extend(self.IGNORE_URLS)
-        for pattern in combined_ignore_patterns:
-            if isinstance(pattern, str):
-                if url == pattern:
-                    return True
-            elif isinstance(pattern, Pattern):
-                if pattern.match(url):
-                    return True
-            elif callable(pattern):
-                if pattern(url):
-                    return True
-            else:
-                raise ValueError('Unrecognized pattern in IGNORE_URLS. Use strings, REs, or callables.')
-
-        # 2. check if url is on one of the specified source domains
-        found = False
-        for source_domain in self.SOURCE_DOMAINS:
-            if url.startswith(source_domain):
-                found = True
-        return not found     # should ignore if not found in SOURCE_DOMAINS list
+        if self.stats is None:
+            return self.get_url_filter().should_ignore(url)
+        start = time.perf_counter()
+        ignore = self.get_url_filter().should_ignore(url)
+        self.stats.observe('ignore_check', time.perf_counter() - start)
+        if ignore:
+            self.stats.incr('ignored_urls')
+        return ignore
 
 
-    def is_media_file(self, url):
+    def get_url_filter(self):
+        """
+        Returns the `URLFilter` compiled from BASE_IGNORE_URLS, IGNORE_URLS, and
+        SOURCE_DOMAINS, rebuilding it if any of these lists have been replaced or
+        had elements added/removed. Call `reset_url_filter` after other changes.
+        """
+        signature = (id(self.BASE_IGNORE_URLS), len(self.BASE_IGNORE_URLS),
+                     id(self.IGNORE_URLS), len(self.IGNORE_URLS),
+                     id(self.SOURCE_DOMAINS), len(self.SOURCE_DOMAINS))
+        if self.url_filter is None or self.url_filter_signature != signature:
+            combined_ignore_patterns = self.BASE_IGNORE_URLS.copy()
+            combined_ignore_patterns.extend(self.IGNORE_URLS)
+            self.url_filter = URLFilter(combined_ignore_patterns, self.SOURCE_DOMAINS,
+                                        normalize=self.cleanup_url,
+                                        cache_size=self.URL_FILTER_CACHE_SIZE)
+            self.url_filter_signature = signature
+        return self.url_filter
+
+    def reset_url_filter(self):
+        self.url_filter = None
+
+
+    def is_media_file(self, url, retry_later=False):
         """
         Makes a HEAD request for `url` and reuturns (vertict, head_response),
         where verdict is True if `url` points to a media file (.pdf, .docx, etc.)
         """
-        head_response = self.make_request(url, method='HEAD')
+        verdict = self.media_verdicts.pop(url, None)
+        if verdict is not None:
+            return (verdict, None)
+        try:
+            head_response = self.make_request(url, method='HEAD', retry_later=retry_later)
+        except RetryLater:
+            # only the GET is retried later: a failed HEAD uses the fallback verdict
+            return self.media_file_verdict(url, None)
+        return self.media_file_verdict(url, head_response)
+
+
+    def record_media_verdict(self, url, verdict):
+        """
+        Remember the media file check result for `url` whose GET failed and will
+        be retried, so the retry doesn't send a second HEAD request. The verdict
+        is forgotten when it is used (only pages are retried, so it's always False
+        and the HEAD response is not needed).
+        """
+        self.media_verdicts[url] = verdict
+
+
+    def has_media_extension(self, url):
+        """
+        Returns True if `url` ends with one of the `MEDIA_FILE_FORMATS` extensions.
+        """
+        return url.endswith(tuple('.' + media_ext for media_ext in self.MEDIA_FILE_FORMATS))
+
+
+    def media_file_verdict(self, url, head_response):
+        """
+        Returns (vertict, head_response) based on the `content-type` header of
+        `head_response`, or on the extension of `url` if HEAD request failed.
+        """
         if head_response:
             content_type = head_response.headers.get('content-type', None)
             if not content_type:
@@ -207,9 +437,8 @@ class BasicCrawler(object):
             if url in self.ALLOW_BROKEN_HEAD_URLS:
                 return (False, None)   # special case when no valid HEAD response but GET is OK
             # Fallback strategy: try to guess if media link based on extension
-            for media_ext in self.MEDIA_FILE_FORMATS:
-                if url.endswith('.' + media_ext):
-                    return (True, None)
+            if self.has_media_extension(url):
+                return (True, None)
             # if all else fails, assume False
             return (False, None)
 
@@ -226,21 +455,118 @@ class BasicCrawler(object):
     #     - `context['kind']` can be used to assign a custom handler, e.g., on_course
 
     def queue_is_empty(self):
-        return self.queue.empty()
+        return self.queue.empty() and not self.retry_queue and not self.global_nav_deferred
 
     def get_url_and_context(self):
-        return self.queue.get()
+        """
+        Remove and return the next (url, context) from the crawling queue. When
+        only URLs waiting to be retried are left, sleeps until one of them is due.
+        """
+        self.requeue_global_nav_deferred()
+        self.requeue_due_retries()
+        while self.queue.empty() and self.retry_queue:
+            time.sleep(self.retry_queue.wait_time())   # nothing else to do until the next retry
+            self.requeue_due_retries()
+        if self.queue.empty():
+            raise queue.Empty('The crawling queue is empty.')
+        url, context = self.queue.get()
+        if self.state_store:
+            self.state_store.record_dequeue(url, context)
+        if self.hooks.on_node_created and 'parent' in context:
+            self.step_children = (context['parent'], len(context['parent']['children']))
+        return (url, context)
+
+    def peek_urls(self, n):
+        """
+        Returns the next `n` urls in the crawling queue without removing them.
+        """
+        if isinstance(self.queue, queue.Queue):
+            return [url for url, _ in itertools.islice(self.queue.queue, n)]
+        return [url for url, _ in self.queue.peek(n)]
+
+    def retry_wait_time(self):
+        """
+        Returns the number of seconds until a URL waiting to be retried is due when
+        the crawling queue is empty, otherwise 0.
+        """
+        if not self.retry_queue or not self.queue.empty() or self.global_nav_deferred:
+            return 0.0
+        return self.retry_queue.wait_time()
+
+    def requeue_due_retries(self):
+        if self.retry_queue:
+            for url, context in self.retry_queue.pop_due():
+                self.queue.put((url, context))
+
+    def create_queue(self):
+        """
+        Returns the crawling queue: a FIFO queue.Queue, a PriorityFrontier ordered
+        by `get_priority` when `PRIORITY_CRAWL` is set, or a HostQueue that takes
+        URLs from the hosts in round robin order when `INTERLEAVE_HOSTS` is set.
+        """
+        if self.PRIORITY_CRAWL:
+            return PriorityFrontier(self.get_priority, max_items_in_memory=self.FRONTIER_MAX_MEMORY_ITEMS)
+        if self.INTERLEAVE_HOSTS:
+            return HostQueue()
+        return queue.Queue()
+
+    def get_priority(self, url, context):
+        """
+        Returns the crawling priority of `url` when `PRIORITY_CRAWL` is set: a
+        number where lower values are crawled first. URLs with the same priority
+        are crawled in the order they were enqueued. The default priority is
+        `KIND_PRIORITIES[context['kind']]` + `DEPTH_PRIORITY` * depth, and
+        subclasses can overload this method to use their own scoring function.
+        """
+        priority = self.KIND_PRIORITIES.get(context.get('kind'), 0)
+        if self.DEPTH_PRIORITY:
+            priority += self.DEPTH_PRIORITY * self.get_depth(context)
+        return priority
+
+    def get_depth(self, context):
+        """
+        Returns the depth in the web resource tree of the node for `context`,
+        i.e., 0 for the start page, 1 for the pages it links to, and so on.
+        """
+        chain = []
+        node = context.get('parent')
+        depth = -1  # depth of the outer container's parent
+        while node is not None:
+            entry = self.node_depths.get(id(node))
+            if entry is not None:
+                depth = entry[0]
+                break
+            chain.append(node)
+            node = node.get('parent')
+        for node in reversed(chain):
+            depth += 1
+            self.node_depths[id(node)] = (depth, node)  # keep ref so id(node) stays unique
+        return max(depth, 0)
 
     def enqueue_url_and_context(self, url, context, force=False):
         # TODO(ivan): clarify crawl-only-once logic and use of force flag in docs
+        raw_url = url
         url = self.cleanup_url(url)
-        if url not in self.global_urls_seen_count.keys() or force:
-            # LOGGER.debug('adding to queue:  url=' + url)
-            self.queue.put((url, context))
+        if self.hooks.before_enqueue and self.hooks.dispatch('before_enqueue', url, context) is not None:
+            return
+        if self.URL_CANONICALIZER:
+            self.count_prevented_duplicate(raw_url, url)
+        if url not in self.global_urls_seen_count or force:
+            if self.robots and not self.robots.can_fetch(url):
+                LOGGER.info('Not going to crawl url ' + url + ' because robots.txt disallows it.')
+            else:
+                # LOGGER.debug('adding to queue:  url=' + url)
+                self.queue.put((url, context))
+                if self.state_store:
+                    self.state_store.record_enqueue(url, context)
         else:
             pass
             # LOGGER.debug('Not going to crawl url ' + url + 'beacause previously seen.')
         self.global_urls_seen_count[url] += 1
+        if self.global_nav_index:
+            self.global_nav_index.record_seen(url)
+        if self.state_store:
+            self.state_store.record_seen(url)
 
 
 
@@ -253,7 +579,7 @@ class BasicCrawler(object):
         adds all links on current page to the crawling queue.
         """
         LOGGER.debug('on_page is visiting the URL ' + url)
-        page_dict = dict(
+        page_dict = self.NODE_CLASS(
             kind='PageWebResource',
             url=url,
             children=[],
@@ -263,117 +589,503 @@ class BasicCrawler(object):
         # attach this page as another child in parent page
         context['parent']['children'].append(page_dict)
 
-        links = page.find_all('a')
-        for i, link in enumerate(links):
-            if link.has_attr('href'):
-                link_url = urljoin(url, link['href'])
-                if self.should_ignore_url(link_url):
-                    pass
-                    # Uncomment three lines below for debugging to record ignored links
-                    # ignored_rsrc_dict = self.create_ignored_url_dict(link_url)
-                    # ignored_rsrc_dict['parent'] = page_dict
-                    # page_dict['children'].append(page_dict)
-                else:
-                    self.enqueue_url_and_context(link_url, {'parent':page_dict})
-            else:
+        for link_url in self.get_links(url, page):
+            if self.should_ignore_url(link_url):
                 pass
-                # LOGGER.debug('a with no nohref found ' + str(link))
+                # Uncomment three lines below for debugging to record ignored links
+                # ignored_rsrc_dict = self.create_ignored_url_dict(link_url)
+                # ignored_rsrc_dict['parent'] = page_dict
+                # page_dict['children'].append(page_dict)
+            else:
+                self.enqueue_url_and_context(link_url, {'parent':page_dict})
 
 
     # MAIN LOOP
     ############################################################################
 
-    def crawl(self, limit=1000, save_web_resource_tree=True, devmode=True):
-        # initialize or reset crawler state
-        self.queue = queue.Queue()
-        self.global_urls_seen_count = defaultdict(int)
-        self.urls_visited = {}
+    def crawl(self, limit=1000, save_web_resource_tree=True, devmode=True, workers=None,
+              parse_processes=None, checkpoint=False, resume=False, save_tree_diff=False, shards=None):
+        """
+        Visit all pages reachable from `START_PAGE` and build the web resource tree.
+        When `workers` > 1, the URLs next in the crawling queue are downloaded
+        ahead of time by a pool of `workers` threads. Handlers are still called
+        one at a time from this thread and in queue order, so the resulting tree
+        is identical to the tree obtained from the sequential crawl.
+        When `parse_processes` is set, HTML parsing and link extraction are done
+        in a pool of processes. Pages are then downloaded and parsed ahead of time
+        by at least `parse_processes` worker threads, even if `workers` is not set.
+        When `shards` is set, URLs are downloaded and parsed by `shards` worker
+        processes (each with `workers` threads) assigned by `SHARD_BY`, see
+        `ShardCoordinator`. The tree is still identical to the sequential crawl,
+        but handlers only get the title, links and fields of the pages.
+        When `checkpoint` is True, the crawl state is saved to `CRAWL_STATE_PATH`
+        every `CHECKPOINT_EVERY` steps and on Ctrl-C. Use `resume=True` to continue
+        a previous crawl from its last checkpoint.
+        When `save_tree_diff` is True, the differences from the tree saved in
+        `CRAWLING_STAGE_OUTPUT` by the previous crawl are saved next to it, in the
+        `_diff.json` file (or in `CRAWLING_STAGE_DIFF_OUTPUT` if set).
+        """
+        channel_dict, counter = self.start_crawl(checkpoint=checkpoint, resume=resume)
+        self.start_parse_pool(parse_processes)
+
+        executor = None
+        prefetched = {}  # url --> Future for urls downloaded ahead of dispatch
+        lookahead = workers
+        if shards:
+            executor = self.start_shards(shards, threads=workers or 1)
+            lookahead = executor.max_pending
+        else:
+            if parse_processes and (workers or 1) < parse_processes:
+                workers = lookahead = parse_processes   # so pages are parsed ahead, not one at a time
+            if workers and workers > 1:
+                executor = ThreadPoolExecutor(max_workers=workers)
+
+        try:
+            while not self.queue_is_empty():
+
+                # 1. GET next url to crawl an its context dict
+                original_url, context = self.get_url_and_context()
+                if self.should_skip_global_nav(original_url, context):
+                    future = prefetched.pop(original_url, None)
+                    if future:
+                        future.cancel()
+                    self.end_crawl_step(context, counter)
+                    continue
+
+                # 2. Media file check and GET (possibly already started by a worker)
+                if self.stats is not None:
+                    fetch_start = time.perf_counter()
+                try:
+                    if executor:
+                        future = prefetched.pop(original_url, None)
+                        if future is None:
+                            future = executor.submit(self.fetch_url, original_url)
+                        for next_url in self.peek_urls(lookahead):
+                            if next_url not in prefetched:
+                                prefetched[next_url] = executor.submit(self.fetch_url, next_url)
+                        fetched = future.result()
+                    else:
+                        fetched = self.fetch_url(original_url)
+                except RetryLater as e:
+                    self.schedule_retry(original_url, context, e)
+                    self.end_crawl_step(context, counter)
+                    continue
+                if self.stats is not None:
+                    self.stats.observe('fetch', time.perf_counter() - fetch_start)
+
+                # 3. Add media files and broken links to tree
+                url, page = self.process_fetched(original_url, context, fetched)
+
+                # 4. Handler dispatch
+                if page is not None:
+                    handler = self.get_handler(context)
+                    if self.stats is None:
+                        handler(url, page, context)
+                    else:
+                        handler_start = time.perf_counter()
+                        handler(url, page, context)
+                        self.stats.observe('handler', time.perf_counter() - handler_start)
+                        self.stats.incr('pages')
+                    counter += 1
+
+                self.end_crawl_step(context, counter)
+
+                # limit crawling to 1000 pages unless otherwise told (failsafe default)
+                if limit and counter > limit:
+                    break
+        finally:
+            if executor:
+                for future in prefetched.values():
+                    future.cancel()
+                executor.shutdown(wait=True)
+            self.stop_parse_pool()
+            self.stop_checkpointing(counter)
+
+        return self.finish_crawl(channel_dict, save_web_resource_tree, devmode, save_tree_diff)
+
+
+    async def acrawl(self, limit=1000, save_web_resource_tree=True, devmode=True, concurrency=100,
+                     parse_processes=None, checkpoint=False, resume=False, save_tree_diff=False):
+        """
+        Asyncio version of `crawl` that keeps up to `concurrency` requests in
+        flight using a single `aiohttp` session. Handlers in `kind_handlers` can
+        be coroutine functions or plain callables. Handlers are called one at a
+        time in queue order so the result is the same as for `crawl`.
+        Usage: `web_resource_tree = asyncio.run(crawler.acrawl())`, or
+        `web_resource_tree = await crawler.acrawl()` from a coroutine.
+        """
+        if aiohttp is None:
+            raise ImportError('BasicCrawler.acrawl requires aiohttp: pip install aiohttp')
+        channel_dict, counter = self.start_crawl(checkpoint=checkpoint, resume=resume)
+        self.start_parse_pool(parse_processes)
+
+        prefetched = {}  # url --> Task for urls downloaded ahead of dispatch
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        self.async_session = aiohttp.ClientSession(connector=connector)
+
+        try:
+            while not self.queue_is_empty():
+                delay = self.retry_wait_time()
+                while delay > 0:
+                    await asyncio.sleep(delay)
+                    delay = self.retry_wait_time()
+                original_url, context = self.get_url_and_context()
+                if self.should_skip_global_nav(original_url, context):
+                    task = prefetched.pop(original_url, None)
+                    if task:
+                        task.cancel()
+                    self.end_crawl_step(context, counter)
+                    continue
+
+                task = prefetched.pop(original_url, None)
+                if task is None:
+                    task = asyncio.ensure_future(self.afetch_url(original_url))
+                for next_url in self.peek_urls(concurrency):
+                    if next_url not in prefetched:
+                        prefetched[next_url] = asyncio.ensure_future(self.afetch_url(next_url))
+                if self.stats is not None:
+                    fetch_start = time.perf_counter()
+                try:
+                    fetched = await task
+                except RetryLater as e:
+                    self.schedule_retry(original_url, context, e)
+                    self.end_crawl_step(context, counter)
+                    continue
+                if self.stats is not None:
+                    self.stats.observe('fetch', time.perf_counter() - fetch_start)
+
+                url, page = self.process_fetched(original_url, context, fetched)
+
+                if page is not None:
+                    handler = self.get_handler(context)
+                    if self.stats is not None:
+                        handler_start = time.perf_counter()
+                    result = handler(url, page, context)
+                    if inspect.isawaitable(result):
+                        await result
+                    if self.stats is not None:
+                        self.stats.observe('handler', time.perf_counter() - handler_start)
+                        self.stats.incr('pages')
+                    counter += 1
+
+                self.end_crawl_step(context, counter)
+                if limit and counter > limit:
+                    break
+        finally:
+            for task in prefetched.values():
+                task.cancel()
+            if prefetched:
+                await asyncio.gather(*prefetched.values(), return_exceptions=True)
+            await self.async_session.close()
+            self.async_session = None
+            self.stop_parse_pool()
+            self.stop_checkpointing(counter)
+
+        return self.finish_crawl(channel_dict, save_web_resource_tree, devmode, save_tree_diff)
+
+
+    def start_crawl(self, checkpoint=False, resume=False):
+        """
+        Initialize or reset crawler state and add the start page to the queue,
+        or restore the crawler state saved in `CRAWL_STATE_PATH` if `resume`.
+        Returns (channel_dict, counter) where `channel_dict` is the temporary
+        outer container for the web resource tree and `counter` is the number
+        of pages crawled so far.
+        """
+        self.queue = self.create_queue()
+        self.start_stats()
+        self.start_politeness()
+        self.create_seen_stores()
+        self.global_nav_index = GlobalNavIndex(self.global_urls_seen_count, self.urls_visited,
+                                               self.GLOBAL_NAV_THRESHOLD)
+        self.path_index = PathTrie(url_to_path=self.url_to_path) if self.PATH_INDEX else None
+        self.media_verdicts = {}
+        self.retry_queue = RetryQueue()
+        self.retry_attempts = {}
+        self.global_nav_deferred = []
+        self.node_depths = {}
+        self.duplicate_fetches_prevented = 0
+        self.url_variants_seen = set()
+        self.url_variants_pending = set()
+        self.duplicate_index = SimHashIndex(self.DUPLICATE_MAX_DISTANCE) if self.DETECT_DUPLICATES else None
+        self.duplicate_pages_found = 0
+        self.state_store = None
+        self.stop_requested = False
+
+        if checkpoint or resume:
+            self.state_store = CrawlStateStore(self.CRAWL_STATE_PATH)
+            self.start_checkpointing()
+            if resume and self.state_store.has_saved_state():
+                return self.restore_crawl_state()
+            elif resume:
+                LOGGER.warning('No unfinished crawl state found in ' + self.CRAWL_STATE_PATH
+                               + ' so starting a new crawl.')
+            self.state_store.clear()
 
         #  add the start page to the crawling queue
-        channel_dict = dict(
+        channel_dict = self.NODE_CLASS(
             url='This is a temp. outer container for the crawler channel tree.'
                 'Its unique child node is the web root.',
             kind='WEB_RESOURCE_TREE_CONTAINER',
             children=[],
         )
+        if self.state_store:
+            self.state_store.set_root(channel_dict)
         start_url = self.START_PAGE
         root_context = {'parent': channel_dict}
         if self.START_PAGE_CONTEXT:
             root_context.update(self.START_PAGE_CONTEXT)
         self.enqueue_url_and_context(start_url, root_context)
+        return (channel_dict, 0)
 
-        counter = 0
-        while not self.queue_is_empty():
-
-            # 1. GET next url to crawl an its context dict
-            original_url, context = self.get_url_and_context()
-
-            # 2. Media files (PDF/ZIP/MP3) and broken link check
-            verdict, head_response = self.is_media_file(original_url)
-            if verdict == True:
-                media_rsrc_dict = self.create_media_url_dict(original_url, head_response)
-                media_rsrc_dict['parent'] = context['parent']
-                context['parent']['children'].append(media_rsrc_dict)
-                continue
-
-            # 3. Let's go GET that url
-            url, page = self.download_page(original_url)
-            if page is None:
-                LOGGER.warning('GET ' + original_url + ' did not return page.')
-                broken_link_dict = self.create_broken_link_url_dict(original_url)
-                broken_link_dict['parent'] = context['parent']
-                context['parent']['children'].append(broken_link_dict)
-                continue
-
-            # record page URL as visited
-            self.urls_visited[original_url] = 'visited'
-
-            # annotate context to keep track of URL befor redirects
-            if url != original_url:
-                context['original_url'] = original_url
 
+    def create_seen_stores(self):
+        """
+        Create `global_urls_seen_count` and `urls_visited`: dicts keyed by URL,
+        or FingerprintCounters when `COMPACT_SEEN_STORE` is set. FingerprintCounters
+        support lookups and updates of URLs, but can't list the URLs.
+        """
+        if not self.COMPACT_SEEN_STORE:
+            self.global_urls_seen_count = defaultdict(int)
+            self.urls_visited = {}
+            return
+        seen_path, visited_path = None, None
+        if self.SEEN_STORE_DIR:
+            os.makedirs(self.SEEN_STORE_DIR, exist_ok=True)
+            seen_path = os.path.join(self.SEEN_STORE_DIR, 'urls_seen.bin')
+            visited_path = os.path.join(self.SEEN_STORE_DIR, 'urls_visited.bin')
+        self.global_urls_seen_count = FingerprintCounter(path=seen_path)
+        self.urls_visited = FingerprintCounter(path=visited_path)
+
+
+    def start_stats(self):
+        """
+        Create the `CrawlStats` for this crawl if `COLLECT_STATS` is set.
+        """
+        self.stats = None
+        if not self.COLLECT_STATS:
+            return
+        for path in [self.STATS_LOG_PATH, self.STATS_PROMETHEUS_PATH]:
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.stats = CrawlStats(log_path=self.STATS_LOG_PATH, log_every=self.STATS_LOG_EVERY,
+                                prometheus_path=self.STATS_PROMETHEUS_PATH)
+
+    def frontier_size(self):
+        """
+        Returns the number of URLs waiting in the crawling queue and retry queue.
+        """
+        return self.queue.qsize() + len(self.retry_queue) + len(self.global_nav_deferred)
 
-            ##########  HANDLER DISPATCH LOGIC  ################################
-            handled = False
 
-            # A. kind-handler based dispatch logic
-            if 'kind' in context:
-                kind = context['kind']
-                if kind in self.kind_handlers:
-                    handler = self.kind_handlers[kind]
-                    if callable(handler):
-                        handler(url, page, context)
-                        handled = True
-                    elif isinstance(handler, str) and hasattr(self, handler):
-                        handler_fn = getattr(self, handler)
-                        handler_fn(url, page, context)
-                        handled = True
-                    else:
-                        raise ValueError('Unrecognized handler type', handler, 'Should be method or name of method.')
-                else:
-                    LOGGER.info('No handler registered for kind ' + str(kind)
-                                 + ' so falling back to on_page handler.')
+    def restore_crawl_state(self):
+        """
+        Load crawler state from the last checkpoint. Returns (channel_dict, counter).
+        """
+        saved = self.state_store.load(node_class=self.NODE_CLASS)
+        for url, context in saved['queue_items']:
+            self.queue.put((url, context))
+        self.global_urls_seen_count.update(saved['seen'])
+        for url in saved['visited']:
+            self.urls_visited[url] = 'visited'
+        self.broken_links = saved['broken_links']
+        self.global_nav_index.rebuild(saved['seen'])
+        if self.path_index is not None:
+            self.path_index.add_tree(saved['root'])
+        LOGGER.info('Resuming crawl with ' + str(len(saved['queue_items'])) + ' URLs in queue.')
+        return (saved['root'], saved['counter'])
+
+
+    def end_crawl_step(self, context, counter):
+        """
+        Called after each URL taken from the queue has been processed.
+        Saves a checkpoint every `CHECKPOINT_EVERY` steps or if Ctrl-C was pressed.
+        """
+        if self.stats is not None:
+            self.stats.tick(self.frontier_size())
+        if self.step_children is not None:
+            parent, num_children = self.step_children
+            self.step_children = None
+            for node in parent['children'][num_children:]:
+                self.hooks.dispatch('on_node_created', node)
+        if self.state_store is None:
+            return
+        self.state_store.record_step(context.get('parent'))
+        if self.stop_requested:
+            self.state_store.checkpoint(counter)
+            raise KeyboardInterrupt('Crawl stopped. Use resume=True to continue.')
+        if self.state_store.steps_since_checkpoint >= self.CHECKPOINT_EVERY:
+            self.state_store.checkpoint(counter)
+
+
+    def start_politeness(self):
+        """
+        Setup the robots.txt rules cache and the per host rate limiter.
+        """
+        self.robots = None
+        self.rate_limiter = None
+        if self.ROBOTS_TXT:
+            self.robots = RobotsCache(self.fetch_robots_txt, user_agent=self.ROBOTS_USER_AGENT)
+        if self.ROBOTS_TXT or self.MAX_REQUESTS_PER_SECOND:
+            self.rate_limiter = HostRateLimiter(rate=self.MAX_REQUESTS_PER_SECOND,
+                                                burst=self.MAX_BURST, robots=self.robots)
+
+    def fetch_robots_txt(self, robots_url):
+        """
+        Returns (status_code, text) of the robots.txt at `robots_url` or None on error.
+        """
+        try:
+            # revalidate cached copy so changes to robots.txt are picked up
+            headers = dict(std_headers, **{'Cache-Control': 'max-age=0'})
+            response = self.SESSION.get(robots_url, headers=headers, timeout=30)
+        except Exception as e:
+            LOGGER.error("FAILED TO RETRIEVE:" + str(robots_url))
+            LOGGER.error("GOT ERROR: " + str(e))
+            return None
+        return (response.status_code, response.text)
 
-            # if none of the above caught it, we use the default on_page handler
-            if not handled:
-                self.on_page(url, page, context)
-            ####################################################################
 
-            # limit crawling to 1000 pages unless otherwise told (failsafe default)
-            counter += 1
-            if limit and counter > limit:
-                break
+    def should_skip_global_nav(self, url, context):
+        """
+        Returns True if `SKIP_GLOBAL_NAV` is set and `url` currently looks like a
+        global nav link. Before `GLOBAL_NAV_WARMUP` pages have been visited, the
+        URL is put aside to be checked again later instead of being skipped,
+        since the global nav links are usually the first URLs taken from the queue.
+        """
+        if not self.SKIP_GLOBAL_NAV or not self.global_nav_index.is_global_nav(url):
+            return False
+        if len(self.urls_visited) < self.GLOBAL_NAV_WARMUP:
+            if self.queue.empty():
+                return False    # nothing else to crawl so visit it to continue the warm-up
+            self.global_nav_deferred.append((url, context))
+            if self.state_store:
+                self.state_store.record_enqueue(url, context)
+            return True
+        LOGGER.info('Skipping global nav url ' + url)
+        return True
+
+    def requeue_global_nav_deferred(self):
+        """
+        Put back in the queue the URLs put aside by `should_skip_global_nav`: all
+        of them once the warm-up is over (those that still look like global nav
+        links are then skipped), otherwise the ones that don't look like global
+        nav links anymore, or one of them if the queue is empty.
+        """
+        if not self.global_nav_deferred:
+            return
+        if len(self.urls_visited) >= self.GLOBAL_NAV_WARMUP:
+            ready, self.global_nav_deferred = self.global_nav_deferred, []
+        else:
+            ready, still_deferred = [], []
+            for url, context in self.global_nav_deferred:
+                if self.global_nav_index.is_global_nav(url):
+                    still_deferred.append((url, context))
+                else:
+                    ready.append((url, context))
+            if not ready and self.queue.empty():
+                # nothing else to crawl so the warm-up can continue: take the least seen URL,
+                # the last one put aside if tied, since global nav links usually come first in pages
+                index = min(range(len(still_deferred) - 1, -1, -1),
+                            key=lambda i: self.global_nav_index.ratio(still_deferred[i][0]))
+                ready = [still_deferred.pop(index)]
+            self.global_nav_deferred = still_deferred
+        for url, context in ready:
+            self.queue.put((url, context))
 
 
-        # remove parent links before output tree
-        self.cleanup_web_resource_tree(channel_dict)
+    def schedule_retry(self, url, context, error):
+        """
+        Put aside `url` to be retried after an exponential backoff delay (or the
+        delay from the `Retry-After` header, up to `RETRY_MAX_BACKOFF`), or add it
+        to the tree as a BrokenLink with the history of failed attempts if
+        `MAX_RETRIES` has been reached.
+        """
+        attempts = self.retry_attempts.setdefault(url, [])
+        attempt = dict(time=datetime.now().isoformat(), error=error.reason)
+        if error.status_code is not None:
+            attempt['status_code'] = error.status_code
+        attempts.append(attempt)
+        if len(attempts) > self.MAX_RETRIES:
+            LOGGER.error('FAILED TO RETRIEVE:' + url + ' after ' + str(len(attempts)) + ' attempts.')
+            del self.retry_attempts[url]
+            self.media_verdicts.pop(url, None)
+            self.add_broken_link(url, context, attempts=attempts)
+            return
+        if self.stats is not None:
+            self.stats.incr('retries')
+        if error.retry_after is not None:
+            delay = min(error.retry_after, self.RETRY_MAX_BACKOFF)
+            if error.retry_after > self.RETRY_MAX_BACKOFF:
+                LOGGER.warning('Retry-After for ' + url + ' is ' + '{:.0f}'.format(error.retry_after)
+                               + ' seconds; waiting RETRY_MAX_BACKOFF seconds instead.')
+        else:
+            delay = backoff_delay(len(attempts), base=self.RETRY_BACKOFF, max_delay=self.RETRY_MAX_BACKOFF)
+        LOGGER.warning('Request for ' + url + ' failed (' + error.reason + '); will retry in '
+                       + '{:.1f}'.format(delay) + ' seconds.')
+        self.retry_queue.push(url, context, delay)
+        if self.state_store:
+            self.state_store.record_enqueue(url, context)
 
+
+    def start_checkpointing(self):
+        """
+        Install a Ctrl-C handler that stops the crawl at the end of current step
+        so the crawl state can be saved before exiting (second Ctrl-C exits now).
+        """
+        self.previous_sigint_handler = None
+        if threading.current_thread() is not threading.main_thread():
+            return  # signal handlers can only be installed from the main thread
+        def request_stop(signum, frame):
+            if self.stop_requested:
+                raise KeyboardInterrupt
+            LOGGER.warning('Stopping crawl after current step to save crawl state...')
+            self.stop_requested = True
+        self.previous_sigint_handler = signal.signal(signal.SIGINT, request_stop)
+
+
+    def stop_checkpointing(self, counter):
+        """
+        Save a final checkpoint (unless stopped by an error) and close state store.
+        """
+        if self.state_store is None:
+            return
+        if self.previous_sigint_handler is not None:
+            signal.signal(signal.SIGINT, self.previous_sigint_handler)
+        if sys.exc_info()[0] is None:
+            # crawl finished or reached limit (after an error, keep last checkpoint)
+            self.state_store.checkpoint(counter, finished=self.queue_is_empty())
+        self.state_store.close()
+        self.state_store = None
+
+
+    def finish_crawl(self, channel_dict, save_web_resource_tree=True, devmode=True, save_tree_diff=False):
+        """
+        Cleanup, save, and print the web resource tree built during the crawl.
+        """
         # hoist entire tree one level up to get rid of the tmep. outer container
         channel_dict = channel_dict['children'][0]
+        if self.hooks.on_crawl_end:
+            self.hooks.dispatch('on_crawl_end', channel_dict)
+
+        # Compare with tree from previous crawl before it gets overwritten
+        if save_tree_diff:
+            self.write_web_resource_tree_diff_json(channel_dict)
+
+        if self.URL_CANONICALIZER:
+            LOGGER.info('URL canonicalization prevented ' + str(self.duplicate_fetches_prevented)
+                        + ' duplicate fetches.')
+        if self.duplicate_index is not None:
+            LOGGER.info('Found ' + str(self.duplicate_pages_found) + ' near-duplicate pages.')
 
-        # Save output
+        # Save output (parent links are removed while writing the json)
+        save_start = time.perf_counter()
         if save_web_resource_tree:
             self.write_web_resource_tree_json(channel_dict)
+        else:
+            self.cleanup_web_resource_tree(channel_dict)
+        if self.stats is not None:
+            self.stats.observe('save_tree', time.perf_counter() - save_start)
+            self.stats.tick(self.frontier_size(), force=True)
 
         # Display debug info
         if devmode:
@@ -382,34 +1094,356 @@ class BasicCrawler(object):
         return channel_dict
 
 
+    def start_parse_pool(self, parse_processes):
+        if parse_processes:
+            self.parse_pool = ProcessPoolExecutor(max_workers=parse_processes)
+
+    def start_shards(self, shards, threads=1):
+        """
+        Returns a `ShardCoordinator` connected to `shards` worker processes.
+        """
+        authkey = self.COORDINATOR_AUTHKEY.encode('utf-8') if self.COORDINATOR_AUTHKEY else None
+        politeness = self.ROBOTS_TXT or self.MAX_REQUESTS_PER_SECOND
+        shard_by = self.SHARD_BY or ('host' if politeness else 'url')
+        if shard_by == 'url' and politeness and shards > 1:
+            LOGGER.warning('Each worker applies the rate limits separately, so with SHARD_BY = \'url\' '
+                           'hosts get up to ' + str(shards) + ' times more requests per second.')
+        coordinator = ShardCoordinator(self, shards, threads=threads, shard_by=shard_by,
+                                       address=self.COORDINATOR_ADDRESS, authkey=authkey,
+                                       start_local_workers=self.START_LOCAL_WORKERS)
+        return coordinator.start()
+
+    def stop_parse_pool(self):
+        if self.parse_pool:
+            self.parse_pool.shutdown(wait=True)
+            self.parse_pool = None
+
+
+    def fetch_url(self, url):
+        """
+        Network part of visiting `url`: media file check followed by a GET.
+        Does not modify crawler state so it can run in worker threads.
+        Returns (verdict, head_response, final_url, page).
+        Raises `RetryLater` if the GET failed and `RETRY_LATER` is set.
+        """
+        if self.GUESS_MEDIA_FROM_EXTENSION and self.has_media_extension(url):
+            return (True, None, None, None)
+        if self.SINGLE_REQUEST_FETCH:
+            response = self.make_request(url, stream=True, retry_later=self.RETRY_LATER)
+            return self.process_single_request_response(url, response)
+        verdict, head_response = self.is_media_file(url, retry_later=self.RETRY_LATER)
+        if verdict == True:
+            return (verdict, head_response, None, None)
+        try:
+            url, page = self.download_page(url, retry_later=self.RETRY_LATER)
+        except RetryLater:
+            self.record_media_verdict(url, verdict)
+            raise
+        if self.DETECT_DUPLICATES and page is not None:
+            self.get_page_simhash(page)     # computed here to run in the worker threads
+        return (verdict, head_response, url, page)
+
+
+    def process_single_request_response(self, url, response):
+        """
+        Decide if `url` is a media file from the headers of the streamed GET
+        `response`, and download and parse the body only if it's not.
+        Returns (verdict, media_response, final_url, page) like `fetch_url`.
+        """
+        if not response:
+            # same fallback as when the HEAD request fails in `media_file_verdict`
+            if self.has_media_extension(url):
+                return (True, None, None, None)
+            return (False, None, None, None)
+        content_type = response.headers.get('content-type', None)
+        if content_type in self.MEDIA_CONTENT_TYPES:
+            response.close()   # don't download the media file
+            return (True, response, None, None)
+        url, page = self.parse_response(url, response)
+        return (False, None, url, page)
+
+
+    async def afetch_url(self, url):
+        """
+        Asyncio version of `fetch_url` used by `acrawl`.
+        """
+        if self.GUESS_MEDIA_FROM_EXTENSION and self.has_media_extension(url):
+            return (True, None, None, None)
+        if self.SINGLE_REQUEST_FETCH:
+            response = await self.amake_request(url, stream=True, retry_later=self.RETRY_LATER)
+            if response and response.content is not None and self.parse_pool:
+                return await self.aparse_in_pool(response)
+            return self.process_single_request_response(url, response)
+        verdict, head_response = self.media_verdicts.pop(url, None), None
+        if verdict is None:
+            try:
+                head_response = await self.amake_request(url, method='HEAD', retry_later=self.RETRY_LATER)
+            except RetryLater:
+                head_response = None    # see `is_media_file`
+            verdict, head_response = self.media_file_verdict(url, head_response)
+        if verdict == True:
+            return (verdict, head_response, None, None)
+        try:
+            response = await self.amake_request(url, retry_later=self.RETRY_LATER)
+        except RetryLater:
+            self.record_media_verdict(url, verdict)
+            raise
+        if self.parse_pool and response:
+            return await self.aparse_in_pool(response)
+        url, page = self.parse_response(url, response)
+        return (verdict, head_response, url, page)
+
+
+    async def aparse_in_pool(self, response):
+        """
+        Parse the GET `response` in the process pool without blocking the event loop.
+        """
+        loop = asyncio.get_event_loop()
+        response.encoding = 'utf-8'
+        title, links, fields = await loop.run_in_executor(
+            self.parse_pool, parse_page_html, response.url, response.text, self.PAGE_FIELDS)
+        page = ParsedPage(response.url, response.text, title, links, fields)
+        if self.hooks.after_parse:
+            new_page = self.hooks.dispatch('after_parse', response.url, page)
+            if new_page is not None:
+                page = new_page
+        return (False, None, response.url, page)
+
+
+    def process_fetched(self, original_url, context, fetched):
+        """
+        Attach the result `fetched` of `fetch_url(original_url)` to the tree.
+        Media files and broken links are added to the parent's children and
+        (None, None) is returned. For pages, returns (url, page) to be passed to
+        the handler for the kind in `context`.
+        """
+        verdict, head_response, url, page = fetched
+        self.retry_attempts.pop(original_url, None)
+        if verdict == True:
+            media_rsrc_dict = self.create_media_url_dict(original_url, head_response)
+            media_rsrc_dict['parent'] = context['parent']
+            context['parent']['children'].append(media_rsrc_dict)
+            if self.path_index is not None:
+                self.path_index.add_url(media_rsrc_dict['url'])
+            if self.stats is not None:
+                self.stats.incr('media_files')
+            return (None, None)
+
+        if page is None:
+            LOGGER.warning('GET ' + original_url + ' did not return page.')
+            self.add_broken_link(original_url, context)
+            return (None, None)
+
+        if self.duplicate_index is not None:
+            duplicate_of = self.find_duplicate(url, page)
+            if duplicate_of:
+                self.add_duplicate(original_url, context, duplicate_of)
+                return (None, None)
+
+        # record page URL as visited
+        self.urls_visited[original_url] = 'visited'
+        self.global_nav_index.record_visited()
+        if self.path_index is not None:
+            self.path_index.add_url(url)
+        if self.state_store:
+            self.state_store.record_visited(original_url)
+
+        # annotate context to keep track of URL befor redirects
+        if url != original_url:
+            context['original_url'] = original_url
+
+        return (url, page)
+
+
+    def get_page_simhash(self, page):
+        """
+        Returns the SimHash fingerprint of the visible text of `page`, or None
+        for pages without text. The fingerprint is saved on `ParsedPage` pages.
+        """
+        if not isinstance(page, ParsedPage):
+            return simhash(extract_visible_text(str(page)))
+        if page.simhash is None and page.raw_html is not None:
+            page.simhash = simhash(extract_visible_text(page.raw_html))
+        return page.simhash
+
+
+    def find_duplicate(self, url, page):
+        """
+        Returns the URL of a visited page whose text is a near-duplicate of the
+        text of `page`, or None after adding `page` to the `duplicate_index`.
+        """
+        fingerprint = self.get_page_simhash(page)
+        if fingerprint is None:
+            return None
+        duplicate_of = self.duplicate_index.find(fingerprint)
+        if duplicate_of is None:
+            self.duplicate_index.add(fingerprint, url)
+        return duplicate_of
+
+
+    def add_duplicate(self, url, context, duplicate_of):
+        """
+        Add a DuplicateOf node for `url` to the children of `context['parent']`.
+        The links on the page are not followed.
+        """
+        duplicate_dict = self.NODE_CLASS(
+            kind='DuplicateOf',
+            url=url,
+            duplicate_of=duplicate_of,
+            children=[],
+        )
+        duplicate_dict['parent'] = context['parent']
+        context['parent']['children'].append(duplicate_dict)
+        self.urls_visited[url] = 'visited'
+        self.global_nav_index.record_visited()
+        if self.path_index is not None:
+            self.path_index.add_url(url)
+        if self.state_store:
+            self.state_store.record_visited(url)
+        self.duplicate_pages_found += 1
+        LOGGER.debug('Page ' + url + ' is a duplicate of ' + duplicate_of)
+
+
+    def add_broken_link(self, url, context, attempts=None):
+        """
+        Add a BrokenLink node for `url` to the children of `context['parent']`.
+        """
+        broken_link_dict = self.create_broken_link_url_dict(url, attempts=attempts)
+        broken_link_dict['parent'] = context['parent']
+        context['parent']['children'].append(broken_link_dict)
+        if self.path_index is not None:
+            self.path_index.add_url(url)
+
+
+    def get_handler(self, context):
+        """
+        Handler dispatch logic: returns the handler registered in `kind_handlers`
+        for `context['kind']`, falling back to the default `on_page` handler.
+        """
+        if 'kind' in context:
+            kind = context['kind']
+            if kind in self.kind_handlers:
+                handler = self.kind_handlers[kind]
+                if callable(handler):
+                    return handler
+                elif isinstance(handler, str) and hasattr(self, handler):
+                    return getattr(self, handler)
+                else:
+                    raise ValueError('Unrecognized handler type', handler, 'Should be method or name of method.')
+            else:
+                LOGGER.info('No handler registered for kind ' + str(kind)
+                             + ' so falling back to on_page handler.')
+        # if none of the above caught it, we use the default on_page handler
+        return self.on_page
+
+
     def download_page(self, url, *args, **kwargs):
         """
         Download `url` (following redirects) and soupify response contents.
         Returns (final_url, page) where final_url is URL afrer following redirects.
         """
         response = self.make_request(url, *args, **kwargs)
+        return self.parse_response(url, response)
+
+
+    def parse_response(self, url, response):
+        """
+        Parse the contents of the GET `response` for `url`.
+        Returns (final_url, page) or (None, None) if the request failed.
+        See `parse_html_response`.
+        """
+        if self.stats is None or not response:
+            final_url, page = self.parse_html_response(url, response)
+        else:
+            start = time.perf_counter()
+            final_url, page = self.parse_html_response(url, response)
+            self.stats.observe('parse', time.perf_counter() - start)
+            if getattr(response, 'from_cache', False):
+                self.stats.incr('cache_bytes', len(response.content))
+            else:
+                self.stats.incr('bytes', len(response.content))
+        if page is not None and self.hooks.after_parse:
+            new_page = self.hooks.dispatch('after_parse', final_url, page)
+            if new_page is not None:
+                page = new_page
+        return (final_url, page)
+
+
+    def parse_html_response(self, url, response):
+        """
+        Parse the contents of the GET `response` for `url`.
+        Returns (final_url, page) or (None, None) if the request failed.
+        The `page` returned is a `ParsedPage` that contains the title and links
+        found using the fast `LinkExtractor` (in the process pool when crawling
+        with `parse_processes`), and builds the full soup only if a handler
+        needs it. Set `FAST_LINK_EXTRACTION = False` to always get `BeautifulSoup` pages.
+        """
         if not response:
             return (None, None)
         response.encoding = 'utf-8'  # to avoid guessing logic which has a problem parsing https://learningequality.org/directions/
         html = response.text
+        use_parsed_pages_cache = self.PARSED_PAGES_CACHE is not None and not self.PAGE_FIELDS
+        if use_parsed_pages_cache and (self.parse_pool or self.FAST_LINK_EXTRACTION):
+            digest = self.PARSED_PAGES_CACHE.digest(response.content)
+            cached = self.PARSED_PAGES_CACHE.get(response.url, digest)
+            if cached:
+                title, links = cached
+                return (response.url, ParsedPage(response.url, html, title, links))
+        if self.parse_pool:
+            future = self.parse_pool.submit(parse_page_html, response.url, html, self.PAGE_FIELDS)
+            title, links, fields = future.result()
+        elif self.FAST_LINK_EXTRACTION:
+            title, links, fields = parse_page_html(response.url, html, self.PAGE_FIELDS)
+        if self.parse_pool or self.FAST_LINK_EXTRACTION:
+            if use_parsed_pages_cache:
+                self.PARSED_PAGES_CACHE.set(response.url, digest, title, links)
+            page = ParsedPage(response.url, html, title, links, fields)
+            return (response.url, page)
         page = BeautifulSoup(html, "html.parser")
         LOGGER.debug('Downloaded page ' + str(url) + ' title:' + self.get_title(page))
         return (response.url, page)
 
 
-    def make_request(self, url, timeout=60, *args, method='GET', **kwargs):
+    def make_request(self, url, timeout=60, *args, method='GET', retry_later=False, **kwargs):
         """
         Failure-resistant HTTP GET/HEAD request helper method.
+        When `retry_later` is True, connection errors are not retried here and
+        `RetryLater` is raised instead, also for status codes in `RETRY_STATUS_CODES`,
+        so the crawler can retry the URL later without waiting.
         """
+        stats = self.stats
         retry_count = 0
         max_retries = 10
-        while True:
+        response = None
+        sent = False    # False when a before_request listener returned the response
+        if self.hooks.before_request:
+            response = self.hooks.dispatch('before_request', url, method, kwargs)
+        while response is None:
+            if self.rate_limiter:
+                delay = self.rate_limiter.wait(url)
+                if stats is not None:
+                    stats.observe('rate_limit_wait', delay)
             try:
                 kwargs['headers'] = std_headers  # set random user-agent headers
+                if self.REVALIDATE and method == 'GET':
+                    # bypass cache freshness so the cached response is revalidated using
+                    # If-None-Match/If-Modified-Since; a 304 response returns cached body
+                    kwargs['headers'] = dict(std_headers, **{'Cache-Control': 'max-age=0'})
+                if stats is not None:
+                    start = time.perf_counter()
                 response = self.SESSION.request(method, url, *args, timeout=timeout, **kwargs)
+                if stats is not None:
+                    self.record_request_stats(url, method, response, time.perf_counter() - start)
+                sent = True
                 break
             except (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout) as e:
+                if stats is not None:
+                    stats.incr('connection_errors')
+                if retry_later:
+                    raise RetryLater(url, 'Connection error: ' + str(e))
                 retry_count += 1
+                if stats is not None:
+                    stats.incr('retries')
                 LOGGER.warning("Connection error ('{msg}'); about to perform retry {count} of {trymax}."
                                .format(msg=str(e), count=retry_count, trymax=max_retries))
                 time.sleep(retry_count * 1)
@@ -420,12 +1454,115 @@ class BasicCrawler(object):
                     LOGGER.error("FAILED TO RETRIEVE:" + str(url))
                     LOGGER.error("GOT ERROR: " + str(e))
                     return None
+        if sent and self.hooks.after_response:
+            new_response = self.hooks.dispatch('after_response', url, method, response)
+            if new_response is not None:
+                response = new_response
         if response.status_code != 200:
+            response.close()
+            if retry_later and response.status_code in self.RETRY_STATUS_CODES:
+                self.raise_retry_later(url, response)
             LOGGER.error("ERROR " + str(response.status_code) + ' when getting url=' + url)
             return None
         return response
 
 
+    def record_request_stats(self, url, method, response, seconds):
+        """
+        Count the request as a cache hit or network request and record its latency.
+        """
+        if getattr(response, 'from_cache', False):
+            self.stats.incr('cache_hits')
+            self.stats.observe(method.lower() + '_cached', seconds)
+        else:
+            self.stats.incr('network_requests')
+            self.stats.observe(method.lower(), seconds, host=get_host(url))
+        if response.status_code != 200:
+            self.stats.incr('http_errors')
+
+
+    def raise_retry_later(self, url, response):
+        retry_after = None
+        if response.status_code in (429, 503):
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        raise RetryLater(url, 'HTTP ' + str(response.status_code), status_code=response.status_code,
+                         retry_after=retry_after)
+
+
+    async def amake_request(self, url, timeout=60, method='GET', stream=False, retry_later=False, **kwargs):
+        """
+        Asyncio version of `make_request` that uses the `aiohttp` session of
+        `acrawl`. Returns an `AsyncResponse` that has the same attributes as
+        `requests.Response` objects, or None if the request failed.
+        When `stream` is True, the body of media files (see MEDIA_CONTENT_TYPES)
+        is not downloaded and the response `content` is None.
+        """
+        stats = self.stats
+        retry_count = 0
+        max_retries = 10
+        response = None
+        sent = False    # False when a before_request listener returned the response
+        if self.hooks.before_request:
+            response = self.hooks.dispatch('before_request', url, method, kwargs)
+        while response is None:
+            if self.rate_limiter:
+                delay = self.rate_limiter.reserve(url)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if stats is not None:
+                    stats.observe('rate_limit_wait', delay)
+            try:
+                kwargs['headers'] = std_headers  # set random user-agent headers
+                client_timeout = aiohttp.ClientTimeout(total=timeout)
+                if stats is not None:
+                    start = time.perf_counter()
+                async with self.async_session.request(method, url, timeout=client_timeout, **kwargs) as resp:
+                    if stream and resp.headers.get('content-type', None) in self.MEDIA_CONTENT_TYPES:
+                        content = None
+                    else:
+                        content = await resp.read()
+                    response = AsyncResponse(str(resp.url), resp.status, resp.headers, content)
+                if stats is not None:
+                    self.record_request_stats(url, method, response, time.perf_counter() - start)
+                sent = True
+                break
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if stats is not None:
+                    stats.incr('connection_errors')
+                if retry_later:
+                    raise RetryLater(url, 'Connection error: ' + str(e))
+                retry_count += 1
+                if stats is not None:
+                    stats.incr('retries')
+                LOGGER.warning("Connection error ('{msg}'); about to perform retry {count} of {trymax}."
+                               .format(msg=str(e), count=retry_count, trymax=max_retries))
+                await asyncio.sleep(retry_count * 1)
+                if retry_count >= max_retries:
+                    LOGGER.error("FAILED TO RETRIEVE:" + str(url))
+                    return None
+            except Exception as e:
+                    LOGGER.error("FAILED TO RETRIEVE:" + str(url))
+                    LOGGER.error("GOT ERROR: " + str(e))
+                    return None
+        if sent and self.hooks.after_response:
+            new_response = self.hooks.dispatch('after_response', url, method, response)
+            if new_response is not None:
+                response = new_response
+        if response.status_code != 200:
+            if retry_later and response.status_code in self.RETRY_STATUS_CODES:
+                self.raise_retry_later(url, response)
+            LOGGER.error("ERROR " + str(response.status_code) + ' when getting url=' + url)
+            return None
+        return response
+
+    async def adownload_page(self, url, **kwargs):
+        """
+        Asyncio version of `download_page` for use in async handlers.
+        """
+        response = await self.amake_request(url, **kwargs)
+        return self.parse_response(url, response)
+
+
 
 
     # DEFAULT ACTIONS FOR MEDIA FILES AND BROKEN LINKS
@@ -436,7 +1573,7 @@ class BasicCrawler(object):
         Create metadata dict for media URL `original_url` using `head_response`.
         """
         original_url_clean = self.cleanup_url(original_url)   # before redirects
-        media_rsrc_dict = dict(
+        media_rsrc_dict = self.NODE_CLASS(
             kind='MediaWebResource',
             url=original_url_clean,
             children=[],
@@ -463,23 +1600,31 @@ class BasicCrawler(object):
         return media_rsrc_dict
 
 
-    def create_broken_link_url_dict(self, url):
+    def create_broken_link_url_dict(self, url, attempts=None):
         """
-        Create a metadata dict for the broken link `url`.
+        Create a metadata dict for the broken link `url`. When the link was given
+        up on after retries, `attempts` is the list of failed attempts, each a
+        dict with the `time`, the `error`, and the `status_code` (if any).
         """
-        broken_link_dict = dict(
+        broken_link_dict = self.NODE_CLASS(
             kind='BrokenLink',
             url=url,
             children=[],
         )
+        if attempts:
+            broken_link_dict['attempts'] = attempts
         self.broken_links.append(url)
+        if self.stats is not None:
+            self.stats.incr('broken_links')
+        if self.state_store:
+            self.state_store.record_broken_link(url)
         return broken_link_dict
 
     def create_ignored_url_dict(self, url):
         """
         Create metadata link for a URL that matches one of self.IGNORE_URLS.
         """
-        ignored_url_dict = dict(
+        ignored_url_dict = self.NODE_CLASS(
             kind='IgnoredUrl',
             url=url,
             children=[],
@@ -514,89 +1659,61 @@ class BasicCrawler(object):
             print('\n3. These are broken links --- you might want to add them to IGNORE_URLS')
             print(self.broken_links)
 
+        if self.URL_CANONICALIZER:
+            print('\nURL canonicalization prevented', self.duplicate_fetches_prevented, 'duplicate fetches.')
+
+        if self.duplicate_index is not None:
+            print('\nFound', self.duplicate_pages_found, 'near-duplicate pages (see DuplicateOf nodes).')
+
+        if self.stats is not None:
+            print('\nTime spent in each stage of the crawl (see crawler.stats):')
+            for stage, histogram in sorted(self.stats.stages.items(), key=lambda item: -item[1].sum):
+                print('  -  {:16s} {:8d} times {:10.2f} s total {:10.2f} ms mean'.format(
+                    stage, histogram.count, histogram.sum, 1000.0 * histogram.sum / histogram.count))
+            print('  ', dict(self.stats.counters))
+
         print('\n')
         print('#'*80)
         print('\n\n')
 
 
-    def infer_tree_structure(self, tree_root, show_top=10):
+    def infer_tree_structure(self, tree_root, show_top=10, depth=1):
         """
         Walk web resource tree and look for patterns in urls.
         Print the top 10 occurence of subpaths that are common to multiple URLs.
         E.g. if we see a lot of URLs like /pat/smth1 /pat/smth2 /pat/smth3, we'll
         identify `/pat` as a candidate for site structure: Returns ['/pat', ...]
+        Use `depth=2` to get the common subpaths like `/pat/sub`.
+        When `PATH_INDEX` is set, use `self.path_index.top_prefixes(depth, k)` during
+        the crawl to get the same information for the URLs visited so far.
         """
-        # Get URLs
-        unique_urls = set()
-        def recusive_visit_extract_urls(subtree):
-            url = subtree['url']
-            if url not in unique_urls:
-                unique_urls.add(url)
-            for child in subtree['children']:
-                recusive_visit_extract_urls(child)
-        recusive_visit_extract_urls(tree_root)
-
-        # Build path trie
-        subpath_trie = {}
-        def _add_parts_here(path_parts, here):
-            if not path_parts:
-                return
-            else:
-                part = path_parts.pop(0)
-                if part not in here.keys():
-                    here[part] = {}
-                    _add_parts_here(path_parts, here[part])
-                else:
-                    _add_parts_here(path_parts, here[part])
-        for url in unique_urls:
-            path = self.url_to_path(url)
-            path = path.split('?')[0]  # rm query string
-            path_parts = path.split('/')[1:]
-            _add_parts_here(path_parts, subpath_trie)
-
-        # annotate with counts
-        def _recusive_count_children(here):
-            if not here.keys():
-                return 1
-            count = 0
-            for subpath in here.keys():
-                count += _recusive_count_children(here[subpath])
-            return count
-
-        path_count_tuples = []
-        for path, subtrie in subpath_trie.items():
-            count = _recusive_count_children(subtrie)
-            path_count_tuples.append( (path, count) )
-
-        # top 10 sorted by count
-        sorted_path_count_tuples = sorted(path_count_tuples, key=lambda t: t[1], reverse=True)
-        return sorted_path_count_tuples[0:show_top]
+        path_trie = PathTrie(url_to_path=self.url_to_path)
+        path_trie.add_tree(tree_root)
+        return path_trie.top_prefixes(depth=depth, k=show_top)
 
 
     def compute_subtree_stats(self, subtree, counter=None):
         """
-        Recusively compute counts of different `kind` web sesources in subtree.
+        Compute counts of different `kind` web sesources in subtree.
         """
+        nodes = iter_nodes(subtree)
         if counter is None:
             counter = Counter()
-            # don't count subtree itself, only its children
-        else:
-            counter[subtree['kind']] += 1
-        if 'children' in subtree:
-            for child in subtree['children']:
-                self.compute_subtree_stats(child, counter=counter)
+            next(nodes)  # don't count subtree itself, only its children
+        counter.update(node['kind'] for node in nodes)
         return counter
 
     def print_tree(self, tree_root, print_depth=4, hide_keys=[]):
         """
         Print contents of web resource tree starting at `tree_root`.
         """
-        def print_web_resource_node(node, depth=1):
+        def print_web_resource_node(node, parent, depth):
+            depth = depth + 1   # tree_root is printed at depth 1
             INDENT_BY = 3
             extra_attrs = ''
             if node is None:
                 print('Encountered a None node in print_web_resource_node')
-                return
+                return False
             if 'kind' in node:
                 extra_attrs = ' ('+node['kind']+') '
             path = self.url_to_path(node['url'])  # print paths instead of full URLs
@@ -605,17 +1722,17 @@ class BasicCrawler(object):
             else:
                 title = ''
             print(' '*INDENT_BY*depth + '  -', title, 'path:', path, extra_attrs)
-            if depth < print_depth:                 # recurse and print children
+            if depth < print_depth:                 # print children next
                 if node['children']:
                     print(' '*INDENT_BY*depth + '   ', 'children:')
-                    for child in node['children']:
-                        print_web_resource_node(child, depth=depth+1)
+                return True
             else:                                    # print only summary counts
                 counts = self.compute_subtree_stats(node)
                 if counts:
                     counts_str = str(counts).replace('Counter', '').strip('()')
                     print(' '*INDENT_BY*depth + '   ', 'children counts:', counts_str)
-        print_web_resource_node(tree_root)
+                return False
+        walk_tree(tree_root, pre_visit=print_web_resource_node)
 
 
     def infer_gloabal_nav(self, tree_root, debug=False):
@@ -629,43 +1746,43 @@ class BasicCrawler(object):
         )
 
         # 1. infer global nav URLs based on total seen count / total pages visited
-        total_urls_seen_count = len(self.urls_visited.keys())
+        total_urls_seen_count = len(self.urls_visited)
+        global_nav_urls = set()
 
         def _is_likely_global_nav(url):
             """
             Returns True if `url` is likely a global nav link based on how often seen in pages.
             """
-            seen_count = self.global_urls_seen_count[url]
+            seen_count = self.global_urls_seen_count.get(url, 0)
             if debug:
                 LOGGER.debug('seen_count/total_urls_seen_count='
                               + str(float(seen_count)/total_urls_seen_count)
                               + '=' + str(seen_count) + '/' + str(total_urls_seen_count)
                               + self.url_to_path(url))
             # if previously determined to be a global nav link
-            for global_nav_resource in global_nav_nodes['children']:
-                if url == global_nav_resource['url']:
-                    return True
-            # if new link that is seen a lot
+            if url in global_nav_urls:
+                return True
+            # if new link that is seen a lot (use the index kept up to date during crawl)
+            if self.global_nav_index is not None:
+                return self.global_nav_index.is_global_nav(url)
             if float(seen_count)/total_urls_seen_count > self.GLOBAL_NAV_THRESHOLD:
                 return True
             return False
 
-        def recusive_visit_find_global_nav_children(subtree):
-            for child in subtree['children']:
-                child_url = child['url']
-                if len(child['children'])== 0 and _is_likely_global_nav(child_url):
-                    LOGGER.debug('Found candidate for global nav url=' + str(child_url)
-                                  + 'adding to global_nav_nodes')
-                    global_nav_resource = dict(
-                        kind='GlobalNavLink',
-                        url=child_url,
-                    )
-                    global_nav_resource.update(child)
-                    global_nav_nodes['children'].append(global_nav_resource)
-                # recurse
-                recusive_visit_find_global_nav_children(child)
-
-        recusive_visit_find_global_nav_children(tree_root)
+        for child, parent, _ in iter_tree(tree_root):
+            if parent is None:
+                continue    # only check the descendants of tree_root
+            child_url = child['url']
+            if len(child['children'])== 0 and _is_likely_global_nav(child_url):
+                LOGGER.debug('Found candidate for global nav url=' + str(child_url)
+                              + 'adding to global_nav_nodes')
+                global_nav_resource = dict(
+                    kind='GlobalNavLink',
+                    url=child_url,
+                )
+                global_nav_resource.update(child)
+                global_nav_nodes['children'].append(global_nav_resource)
+                global_nav_urls.add(child_url)
         return global_nav_nodes
 
 
@@ -676,31 +1793,27 @@ class BasicCrawler(object):
         This method is a helper for debugging. Your production crawler should use
         `self.IGNORE_URLS` to remove global nav links so won't crawl them at all.
         """
-        global_nav_urls = [d['url'] for d in global_nav_nodes['children']]
-        def _recusive_visit_rm_global_nav_children(subtree):
+        global_nav_urls = set(d['url'] for d in global_nav_nodes['children'])
+        def _rm_global_nav_children(subtree, parent, depth):
+            # remove children before they are visited
             newchildren = []
             for child in subtree['children']:
                 child_url = child['url']
                 if len(child['children'])== 0 and child_url in global_nav_urls:
                     LOGGER.info('Removing global nav url =' + child_url)
                 else:
-                    clean_child = _recusive_visit_rm_global_nav_children(child)
-                    newchildren.append(clean_child)
+                    newchildren.append(child)
             subtree['children'] = newchildren
-            return subtree
-        _recusive_visit_rm_global_nav_children(tree_root)
+        walk_tree(tree_root, pre_visit=_rm_global_nav_children)
 
 
     def cleanup_web_resource_tree(self, tree_root):
         """
         Remove nodes' parent links (otherwise tree is not json serializable).
         """
-        def cleanup_subtree(subtree):
-            if 'parent' in subtree:
-                del subtree['parent']
-            for child in subtree['children']:
-                cleanup_subtree(child)
-        cleanup_subtree(tree_root)
+        for node in iter_nodes(tree_root):
+            if 'parent' in node:
+                del node['parent']
         return tree_root
 
 
@@ -718,13 +1831,17 @@ class BasicCrawler(object):
             return element.get_text().replace('\r', '').replace('\n', ' ').strip()
 
     def get_title(self, page):
-        title = ''
-        head_el = page.find('head')
-        if head_el:
-            title_el = head_el.find('title')
-            if title_el:
-                title = title_el.get_text().strip()
-        return title
+        if isinstance(page, ParsedPage):
+            return page.title_text
+        return extract_title(page)
+
+    def get_links(self, url, page):
+        """
+        Returns the absolute URLs of all `<a href>` links on `page`.
+        """
+        if isinstance(page, ParsedPage):
+            return page.links
+        return extract_links(url, page)
 
 
 
@@ -733,9 +1850,43 @@ class BasicCrawler(object):
     ############################################################################
 
     def write_web_resource_tree_json(self, channel_dict):
+        """
+        Stream the web resource tree `channel_dict` to `CRAWLING_STAGE_OUTPUT` and
+        remove the nodes' parent links. The output is the same as for `json.dump`
+        with `indent=2` and `sort_keys=True`, unless `COMPACT_JSON_OUTPUT` is set.
+        """
         destpath = self.CRAWLING_STAGE_OUTPUT
         parent_dir, _ = os.path.split(destpath)
-        if not os.path.exists(parent_dir):
+        if parent_dir and not os.path.exists(parent_dir):
+            os.makedirs(parent_dir, exist_ok=True)
+        with open(destpath, 'w') as wrt_file:
+            write_web_resource_tree_json(channel_dict, wrt_file, compact=self.COMPACT_JSON_OUTPUT)
+
+    def write_web_resource_tree_diff_json(self, channel_dict):
+        """
+        Save the added, removed, moved, and changed nodes of the web resource tree
+        `channel_dict` compared to the tree in `CRAWLING_STAGE_OUTPUT` (if present)
+        to `CRAWLING_STAGE_DIFF_OUTPUT`, by default `CRAWLING_STAGE_OUTPUT` with
+        `_diff` added before the extension. See `treediff.diff_web_resource_trees`.
+        """
+        old_tree_path = self.CRAWLING_STAGE_OUTPUT
+        if os.path.exists(old_tree_path):
+            with open(old_tree_path) as old_tree_file:
+                old_tree = json.load(old_tree_file)
+        else:
+            LOGGER.warning('No previous web resource tree found in ' + old_tree_path
+                           + ' so all nodes will be reported as added.')
+            old_tree = None
+        tree_diff = diff_web_resource_trees(old_tree, channel_dict)
+        LOGGER.info('Web resource tree diff: ' + ', '.join(
+            str(len(tree_diff[key])) + ' ' + key for key in ['added', 'removed', 'moved', 'changed']))
+        destpath = self.CRAWLING_STAGE_DIFF_OUTPUT
+        if destpath is None:
+            stem, ext = os.path.splitext(self.CRAWLING_STAGE_OUTPUT)
+            destpath = stem + '_diff' + (ext or '.json')
+        parent_dir, _ = os.path.split(destpath)
+        if parent_dir and not os.path.exists(parent_dir):
             os.makedirs(parent_dir, exist_ok=True)
         with open(destpath, 'w') as wrt_file:
-            json.dump(channel_dict, wrt_file, ensure_ascii=False, indent=2, sort_keys=True)
+            json.dump(tree_diff, wrt_file, ensure_ascii=False, indent=2, sort_keys=True)
+        return tree_diff
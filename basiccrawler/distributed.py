@@ -0,0 +1,396 @@
+"""
+Sharded crawling: the crawler process acts as coordinator and keeps the crawling
+queue, the seen/visited URLs, and the web resource tree, while worker processes,
+on this machine or on other machines, download and parse the URLs assigned to
+their shard and send the title, links and fields of the pages back over a socket.
+If a worker disconnects, its URLs are sent to the other workers.
+
+Start remote workers with:
+
+    BASICCRAWLER_AUTHKEY=secret python -m basiccrawler.distributed mychef.crawler:MyCrawler coordinator-host:7070
+"""
+import argparse
+from concurrent.futures import Future, ThreadPoolExecutor
+import importlib
+import itertools
+import logging
+from multiprocessing.connection import Client, Listener, wait as wait_for_connections
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+import traceback
+import zlib
+
+from .parsing import ParsedPage
+from .politeness import get_host
+from .retry import RetryLater
+
+
+LOGGER = logging.getLogger('crawler')
+AUTHKEY_ENV = 'BASICCRAWLER_AUTHKEY'
+INHERITED_STORES = []   # SQLite connections of the coordinator, kept so they're not closed in workers
+
+
+
+def shard_by_host(url, num_shards):
+    """
+    All the URLs of a host go to the same worker, so per host rate limits hold.
+    """
+    return zlib.crc32(get_host(url).encode('utf-8')) % num_shards
+
+
+def shard_by_url(url, num_shards):
+    """
+    Spread URLs over the workers even when crawling a single host.
+    """
+    return zlib.crc32(url.encode('utf-8')) % num_shards
+
+
+SHARD_FUNCTIONS = {
+    'host': shard_by_host,
+    'url': shard_by_url,
+}
+
+
+
+class MediaHeadResponse(object):
+    """
+    The parts of the HEAD (or streamed GET) response of a media file used by
+    `create_media_url_dict`, sent instead of the response, which can't be pickled
+    without downloading the file.
+    """
+    def __init__(self, response):
+        self.url = response.url
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+
+def compact_page(crawler, url, page):
+    """
+    Returns a `ParsedPage` with only the title, links, fields and simhash of the
+    `page` downloaded from `url` (a ParsedPage or a BeautifulSoup page), to send
+    to the coordinator without the HTML of the page.
+    """
+    if isinstance(page, ParsedPage):
+        compact = ParsedPage(page.url, None, page.title_text, page.links, page.fields)
+        compact.simhash = page.simhash
+        return compact
+    compact = ParsedPage(url, None, crawler.get_title(page), crawler.get_links(url, page))
+    if crawler.DETECT_DUPLICATES:
+        compact.simhash = crawler.get_page_simhash(page)
+    return compact
+
+
+def get_instance_config(crawler):
+    """
+    Returns the picklable config attributes (with UPPERCASE names) set on the
+    `crawler` instance, which remote workers set on their own crawler.
+    """
+    config = {}
+    for name, value in vars(crawler).items():
+        if not name.isupper():
+            continue
+        try:
+            pickle.dumps(value)
+        except Exception:
+            LOGGER.warning('Not sending ' + name + ' to remote workers since it can\'t be pickled.')
+            continue
+        config[name] = value
+    return config
+
+
+
+# COORDINATOR
+################################################################################
+
+class ShardCoordinator(object):
+    """
+    Sends the URLs to download to `num_workers` worker processes, choosing the
+    worker with `shard_by` ('host' or 'url'), and has the same `submit` and
+    `shutdown` methods as `concurrent.futures` executors, so `crawl` uses it in
+    place of its thread pool: URLs are downloaded ahead of time and the handlers
+    are called in queue order, so the tree is the same as for a sequential crawl.
+    Each worker downloads up to `threads` URLs at the same time.
+
+    Workers connect to the `address` of the coordinator using `authkey`. When
+    `start_local_workers` is True they are forked from this process, otherwise
+    they must be started with `python -m basiccrawler.distributed`, and create
+    their crawler from its class and the config attributes set on `crawler`.
+
+    When a worker disconnects (e.g. its process died), its URLs are sharded over
+    the remaining workers. URLs whose download raised an exception in a worker
+    are recorded as broken links.
+    """
+
+    def __init__(self, crawler, num_workers, threads=1, shard_by='url',
+                 address=('127.0.0.1', 0), authkey=None, start_local_workers=True):
+        if shard_by not in SHARD_FUNCTIONS:
+            raise ValueError('Unknown shard_by ' + repr(shard_by) + '. Use one of ' + ', '.join(sorted(SHARD_FUNCTIONS)))
+        if authkey is None:
+            if not start_local_workers:
+                raise ValueError('Need an authkey for remote workers.')
+            authkey = os.urandom(16)
+        self.crawler = crawler
+        self.num_workers = num_workers
+        self.threads = threads
+        self.shard_fn = SHARD_FUNCTIONS[shard_by]
+        self.address = address
+        self.authkey = authkey
+        self.start_local_workers = start_local_workers
+        self.max_pending = num_workers * threads   # how far ahead in the queue to download
+        self.listener = None
+        self.connections = []
+        self.processes = []
+        self.receiver = None
+        self.lock = threading.Lock()    # held to send to the workers
+        self.workers = []       # indexes of the connected workers, URLs are sharded over these
+        self.futures = {}       # request id --> (worker index, url, Future)
+        self.request_ids = itertools.count()
+        self.stopping = False
+
+    def start(self):
+        """
+        Start the workers (if local) and wait for all of them to connect.
+        """
+        self.listener = Listener(self.address, authkey=self.authkey)
+        if self.start_local_workers:
+            context = multiprocessing.get_context('fork')
+            for _ in range(self.num_workers):
+                process = context.Process(target=run_local_worker,
+                                          args=(self.crawler, self.listener.address, self.authkey))
+                process.daemon = True
+                process.start()
+                self.processes.append(process)
+        else:
+            LOGGER.info('Waiting for ' + str(self.num_workers) + ' workers to connect to '
+                        + str(self.listener.address))
+        config = {} if self.start_local_workers else get_instance_config(self.crawler)
+        for worker in range(self.num_workers):
+            connection = self.listener.accept()
+            connection.send(('start', self.crawler.START_PAGE, self.threads, config))
+            self.connections.append(connection)
+            self.workers.append(worker)
+        self.receiver = threading.Thread(target=self.receive_results, daemon=True)
+        self.receiver.start()
+        return self
+
+    def submit(self, fn, url):
+        """
+        Download `url` in the worker of its shard. `fn` must be `crawler.fetch_url`,
+        which is called in the worker. Returns a Future with the result of `fn(url)`.
+        """
+        future = Future()
+        with self.lock:
+            self.send_fetch(next(self.request_ids), url, future)
+        return future
+
+    def send_fetch(self, request_id, url, future):
+        """
+        Send `url` to the worker of its shard among the connected workers, or fail
+        `future` if there are none left. Call with lock held.
+        """
+        if not self.workers:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError('All the workers disconnected.'))
+            return
+        worker = self.workers[self.shard_fn(url, len(self.workers))]
+        self.futures[request_id] = (worker, url, future)
+        try:
+            self.connections[worker].send(('fetch', request_id, url))
+        except OSError:
+            self.remove_worker(worker)      # also sends url to another worker
+
+    def remove_worker(self, worker):
+        """
+        Stop sending URLs to `worker` after it disconnected, and send its pending
+        URLs to the remaining workers. Call with lock held.
+        """
+        if worker not in self.workers:
+            return
+        self.workers.remove(worker)
+        if not self.stopping:
+            LOGGER.error('Worker ' + str(worker) + ' disconnected, ' + str(len(self.workers)) + ' workers left.')
+        pending = [(request_id, url, future) for request_id, (w, url, future) in self.futures.items() if w == worker]
+        for request_id, url, future in pending:
+            del self.futures[request_id]
+        for request_id, url, future in pending:
+            if self.stopping:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(RuntimeError('Worker ' + str(worker) + ' disconnected.'))
+            elif not future.cancelled():
+                self.send_fetch(request_id, url, future)
+
+    def receive_results(self):
+        connections = list(self.connections)
+        while connections:
+            for connection in wait_for_connections(connections):
+                worker = self.connections.index(connection)
+                try:
+                    message = connection.recv()
+                except Exception as e:
+                    if not isinstance(e, (EOFError, OSError)):
+                        LOGGER.error('Bad message from worker ' + str(worker) + ': ' + repr(e))
+                    connections.remove(connection)
+                    with self.lock:
+                        self.remove_worker(worker)
+                    continue
+                kind, request_id = message[:2]
+                with self.lock:
+                    entry = self.futures.get(request_id)
+                    if entry is None or entry[0] != worker:
+                        continue    # already sent to another worker
+                    del self.futures[request_id]
+                _, url, future = entry
+                if not future.set_running_or_notify_cancel():
+                    continue    # cancelled, e.g. the URL was skipped as global nav
+                if kind == 'done':
+                    future.set_result(message[2])
+                elif kind == 'retry':
+                    future.set_exception(RetryLater(*message[2:]))
+                else:
+                    LOGGER.error('Fetch of ' + url + ' failed in worker ' + str(worker) + ':\n' + message[2])
+                    future.set_result((False, None, None, None))     # recorded as a broken link
+
+    def shutdown(self, wait=True):
+        """
+        Tell the workers to stop after their current downloads.
+        """
+        self.stopping = True
+        for connection in self.connections:
+            try:
+                connection.send(('stop',))
+            except OSError:
+                pass    # worker already gone
+        if wait:
+            if self.receiver:
+                self.receiver.join()
+            for process in self.processes:
+                process.join()
+        for connection in self.connections:
+            connection.close()
+        if self.listener:
+            self.listener.close()
+
+
+
+# WORKER
+################################################################################
+
+def reopen_after_fork(store):
+    """
+    Make the SQLite-backed `store` (e.g. a `SQLiteCache` or `ParsedPageCache`)
+    open a new database connection on first use in this process, because SQLite
+    connections can't be used after a fork. The inherited connection is kept
+    open, since closing it here could interfere with the coordinator.
+    """
+    if getattr(store, 'conn', None) is not None:
+        INHERITED_STORES.append(store.conn)
+        store.conn = None
+    if hasattr(store, 'lock'):
+        store.lock = threading.Lock()   # may have been held by another thread when forked
+
+
+def setup_worker_crawler(crawler):
+    """
+    Reset the parts of the crawler state used by `fetch_url` in a worker process.
+    """
+    for adapter in crawler.SESSION.adapters.values():
+        adapter.close()     # don't reuse connections opened before the fork
+    reopen_after_fork(crawler.CACHE)
+    reopen_after_fork(crawler.PARSED_PAGES_CACHE)
+    crawler.media_verdicts = {}
+    crawler.stats = None
+    if crawler.state_store is not None:
+        INHERITED_STORES.append(crawler.state_store)
+    crawler.state_store = None
+    crawler.parse_pool = None   # pages are parsed in the worker
+    crawler.start_politeness()
+
+
+def run_worker(crawler, connection, threads):
+    """
+    Download the URLs received from the coordinator on `connection` using
+    `crawler.fetch_url` in `threads` threads, and send back the results.
+    """
+    setup_worker_crawler(crawler)
+    send_lock = threading.Lock()
+
+    def fetch(request_id, url):
+        try:
+            verdict, head_response, final_url, page = crawler.fetch_url(url)
+            # the HEAD response is only used for media files
+            head_response = MediaHeadResponse(head_response) if verdict and head_response else None
+            if page is not None:
+                page = compact_page(crawler, final_url, page)
+            message = ('done', request_id, (verdict, head_response, final_url, page))
+        except RetryLater as e:
+            message = ('retry', request_id, e.url, e.reason, e.status_code, e.retry_after)
+        except Exception:
+            message = ('error', request_id, traceback.format_exc())
+        with send_lock:
+            try:
+                connection.send(message)
+            except Exception:
+                connection.send(('error', request_id, traceback.format_exc()))   # e.g. can't pickle fields
+
+    executor = ThreadPoolExecutor(max_workers=threads)
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message[0] == 'stop':
+            break
+        _, request_id, url = message
+        executor.submit(fetch, request_id, url)
+    executor.shutdown(wait=True)
+    connection.close()
+
+
+def run_local_worker(crawler, address, authkey):
+    connection = Client(address, authkey=authkey)
+    _, _, threads, _ = connection.recv()
+    run_worker(crawler, connection, threads)
+
+
+def make_remote_worker_crawler(crawler_class, start_page, config):
+    """
+    Create the crawler of a remote worker with the `config` attributes set on the
+    coordinator's crawler instance, which are set before `__init__` so they are
+    used there too (e.g. `SOURCE_DOMAINS`).
+    """
+    crawler = crawler_class.__new__(crawler_class)
+    crawler.__dict__.update(config)
+    crawler.__init__(start_page=start_page)
+    return crawler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Start a worker process for a sharded crawl.')
+    parser.add_argument('crawler', help='crawler class, e.g. mychef.crawler:MyCrawler')
+    parser.add_argument('address', help='HOST:PORT of the coordinator (see COORDINATOR_ADDRESS)')
+    parser.add_argument('--connect-timeout', type=int, default=60, help='seconds to wait for the coordinator')
+    args = parser.parse_args()
+    if AUTHKEY_ENV not in os.environ:
+        parser.error('Set ' + AUTHKEY_ENV + ' to the COORDINATOR_AUTHKEY of the crawler.')
+    module_name, class_name = args.crawler.split(':')
+    crawler_class = getattr(importlib.import_module(module_name), class_name)
+    host, port = args.address.rsplit(':', 1)
+    for attempt in range(args.connect_timeout):
+        try:
+            connection = Client((host, int(port)), authkey=os.environ[AUTHKEY_ENV].encode('utf-8'))
+            break
+        except ConnectionRefusedError:
+            if attempt == args.connect_timeout - 1:
+                raise
+            time.sleep(1)   # coordinator not started yet
+    _, start_page, threads, config = connection.recv()
+    run_worker(make_remote_worker_crawler(crawler_class, start_page, config), connection, threads)
+
+
+if __name__ == '__main__':
+    # run the imported module, so the classes of pickled results are found in the coordinator
+    from basiccrawler import distributed
+    distributed.main()
@@ -0,0 +1,180 @@
+"""
+Priority-ordered crawling frontier: a drop-in replacement for the FIFO crawling
+queue that returns the (url, context) items with the lowest priority first and
+keeps the items with the highest priority on disk when the queue grows too large.
+"""
+from bisect import insort
+from collections import deque
+import itertools
+import pickle
+import sqlite3
+
+
+SPILL_SCHEMA = """
+CREATE TABLE items (
+    priority,
+    seq INTEGER,
+    url TEXT,
+    parent_key INTEGER,
+    context BLOB,
+    PRIMARY KEY (priority, seq)
+) WITHOUT ROWID;
+"""
+
+
+
+class PriorityFrontier(object):
+    """
+    Crawling queue with the same `put`, `get`, and `empty` methods as `queue.Queue`
+    that orders (url, context) items by `priority_fn(url, context)`, a number where
+    lower values are crawled first. Items with the same priority are returned in
+    the order they were added, so the crawl order is deterministic.
+
+    When more than `max_items_in_memory` items are queued, the items with the
+    highest priority values are moved to a temporary SQLite database and are
+    loaded back when they are next. The contexts of items on disk are pickled
+    except for `context['parent']`, which is already in the tree and is kept in
+    memory, so the contexts must be picklable and items come back as copies.
+    """
+
+    def __init__(self, priority_fn, max_items_in_memory=None):
+        self.priority_fn = priority_fn
+        self.max_items_in_memory = max_items_in_memory
+        self.buckets = {}           # priority --> deque of (seq, url, context)
+        self.priorities = []        # sorted priorities of non-empty buckets
+        self.memory_size = 0
+        self.seq = itertools.count()
+
+        # items spilled to disk all come after the items in memory
+        self.spill = None           # sqlite3 connection, created when needed
+        self.spill_size = 0
+        self.spill_min = None       # (priority, seq) of first item on disk
+        self.parents = {}           # id(parent) --> [parent, number of items on disk]
+
+    def empty(self):
+        return self.memory_size == 0 and self.spill_size == 0
+
+    def qsize(self):
+        return self.memory_size + self.spill_size
+
+    def put(self, item):
+        url, context = item
+        priority = self.priority_fn(url, context)
+        seq = next(self.seq)
+        if self.spill_min is not None and priority >= self.spill_min[0]:
+            self.write_spilled([(priority, seq, url, context)])
+            return
+        self.add_to_memory(priority, seq, url, context)
+        if self.max_items_in_memory and self.memory_size > self.max_items_in_memory:
+            self.spill_last_items()
+
+    def get(self):
+        if self.memory_size == 0:
+            self.load_spilled()
+        priority = self.priorities[0]
+        bucket = self.buckets[priority]
+        _, url, context = bucket.popleft()
+        if not bucket:
+            del self.buckets[priority]
+            self.priorities.pop(0)
+        self.memory_size -= 1
+        return (url, context)
+
+    def peek(self, n):
+        """
+        Returns the next `n` items in the order `get` would return them.
+        """
+        items = []
+        for priority in self.priorities:
+            for _, url, context in self.buckets[priority]:
+                if len(items) >= n:
+                    return items
+                items.append((url, context))
+        if len(items) < n and self.spill_size:
+            rows = self.spill.execute('SELECT * FROM items ORDER BY priority, seq LIMIT ?',
+                                      (n - len(items),))
+            items.extend((url, context) for _, _, url, context in map(self.row_to_item, rows))
+        return items
+
+
+    # MEMORY
+    ############################################################################
+
+    def add_to_memory(self, priority, seq, url, context):
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            bucket = self.buckets[priority] = deque()
+            insort(self.priorities, priority)
+        bucket.append((seq, url, context))
+        self.memory_size += 1
+
+    def spill_last_items(self):
+        """
+        Move the last items to disk until half of `max_items_in_memory` are left.
+        """
+        items = []
+        while self.memory_size > self.max_items_in_memory // 2:
+            priority = self.priorities[-1]
+            bucket = self.buckets[priority]
+            seq, url, context = bucket.pop()
+            if not bucket:
+                del self.buckets[priority]
+                self.priorities.pop()
+            self.memory_size -= 1
+            items.append((priority, seq, url, context))
+        self.write_spilled(items)
+        self.spill_min = items[-1][:2]      # items were taken in decreasing order
+
+
+    # DISK
+    ############################################################################
+
+    def write_spilled(self, items):
+        if self.spill is None:
+            self.spill = sqlite3.connect('')    # temporary database deleted on close
+            self.spill.executescript(SPILL_SCHEMA)
+        rows = []
+        for priority, seq, url, context in items:
+            parent_key = None
+            if 'parent' in context:
+                parent = context['parent']
+                parent_key = id(parent)
+                entry = self.parents.get(parent_key)
+                if entry is None:
+                    entry = self.parents[parent_key] = [parent, 0]
+                entry[1] += 1
+                context = dict(context, parent=None)    # keeps key order
+            rows.append((priority, seq, url, parent_key, pickle.dumps(context, pickle.HIGHEST_PROTOCOL)))
+        self.spill.executemany('INSERT INTO items VALUES (?, ?, ?, ?, ?)', rows)
+        self.spill_size += len(rows)
+        if self.spill_min is None:
+            self.spill_min = (items[0][0], items[0][1])
+
+    def row_to_item(self, row):
+        priority, seq, url, parent_key, context_data = row
+        context = pickle.loads(context_data)
+        if parent_key is not None:
+            context['parent'] = self.parents[parent_key][0]
+        return (priority, seq, url, context)
+
+    def load_spilled(self):
+        """
+        Move the first items on disk to memory.
+        """
+        limit = max(1, (self.max_items_in_memory or 0) // 2)
+        rows = self.spill.execute('SELECT * FROM items ORDER BY priority, seq LIMIT ?', (limit,)).fetchall()
+        for row in rows:
+            priority, seq, url, context = self.row_to_item(row)
+            self.add_to_memory(priority, seq, url, context)
+            parent_key = row[3]
+            if parent_key is not None:
+                entry = self.parents[parent_key]
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.parents[parent_key]
+        last_priority, last_seq = rows[-1][:2]
+        self.spill.execute('DELETE FROM items WHERE priority < ? OR (priority = ? AND seq <= ?)',
+                           (last_priority, last_priority, last_seq))
+        self.spill_size -= len(rows)
+        next_row = self.spill.execute('SELECT priority, seq FROM items ORDER BY priority, seq LIMIT 1').fetchone()
+        self.spill_min = tuple(next_row) if next_row else None
@@ -0,0 +1,53 @@
+"""
+Live index of the URLs that look like global navigation links, i.e., URLs that
+are linked from more than `GLOBAL_NAV_THRESHOLD` of all the pages visited.
+"""
+
+
+
+class GlobalNavIndex(object):
+    """
+    Keeps the set of likely global nav URLs up to date during the crawl, using the
+    crawler's `seen_counts` (url --> number of times seen) and `visited` (dict
+    of visited urls), which can also be FingerprintCounters. Call `record_seen(url)` after the seen count of `url` is
+    incremented and `record_visited()` after a new URL is added to `visited`.
+    Only the URLs in the set need to be checked when the number of pages visited
+    grows, so updates are cheap and `is_global_nav(url)` is a set lookup.
+    """
+
+    def __init__(self, seen_counts, visited, threshold):
+        self.seen_counts = seen_counts
+        self.visited = visited
+        self.threshold = threshold
+        self.urls = set()
+        if len(seen_counts) > 0:
+            self.rebuild()
+
+    def ratio(self, url):
+        """
+        Returns the number of times `url` was seen divided by the number of pages visited.
+        """
+        pages_visited = len(self.visited)
+        if pages_visited == 0:
+            return 0.0
+        return float(self.seen_counts.get(url, 0)) / pages_visited
+
+    def rebuild(self, urls=None):
+        """
+        Recompute the set from scratch by checking `urls`, or all the URLs in
+        `seen_counts` (only possible if it's a dict).
+        """
+        if urls is None:
+            urls = self.seen_counts
+        self.urls = set(url for url in urls if self.ratio(url) > self.threshold)
+
+    def record_seen(self, url):
+        if self.ratio(url) > self.threshold:
+            self.urls.add(url)
+
+    def record_visited(self):
+        dropped = [url for url in self.urls if self.ratio(url) <= self.threshold]
+        self.urls.difference_update(dropped)
+
+    def is_global_nav(self, url):
+        return url in self.urls
@@ -0,0 +1,60 @@
+"""
+Lifecycle hooks that let extensions (profilers, custom caches, filters) observe
+and change the crawl without overriding crawler methods. See `BasicCrawler.add_hook`.
+"""
+
+
+EVENTS = {  # event --> arguments passed to listeners
+    'before_request': ('url', 'method', 'kwargs'),
+    'after_response': ('url', 'method', 'response'),
+    'after_parse': ('url', 'page'),
+    'before_enqueue': ('url', 'context'),
+    'on_node_created': ('node',),
+    'on_crawl_end': ('web_resource_tree',),
+}
+
+
+
+class Hooks(object):
+    """
+    Listeners registered for each of the `EVENTS`. The listeners of an event are
+    kept in a tuple in the attribute with the name of the event, which is empty
+    when there are no listeners, so the crawler can skip an event with a single
+    attribute check: `if self.hooks.before_request: ...`.
+    """
+
+    def __init__(self):
+        for event in EVENTS:
+            setattr(self, event, ())
+
+    @staticmethod
+    def check_event(event):
+        if event not in EVENTS:
+            raise ValueError('Unknown hook event ' + repr(event) + '. Use one of ' + ', '.join(sorted(EVENTS)))
+
+    def add(self, event, listener):
+        self.check_event(event)
+        # replace the tuple instead of modifying it, so dispatch in other threads is safe
+        setattr(self, event, getattr(self, event) + (listener,))
+
+    def remove(self, event, listener):
+        """
+        Remove the first registration of `listener` for `event`; raises ValueError
+        if it isn't registered.
+        """
+        self.check_event(event)
+        listeners = list(getattr(self, event))
+        listeners.remove(listener)
+        setattr(self, event, tuple(listeners))
+
+    def dispatch(self, event, *args):
+        """
+        Call the listeners of `event` in the order they were added, until one of
+        them returns a value other than None, which is returned. Exceptions raised
+        by the listeners are not caught.
+        """
+        for listener in getattr(self, event):
+            result = listener(*args)
+            if result is not None:
+                return result
+        return None
@@ -0,0 +1,168 @@
+"""
+Compact node type for the web resource tree. Use it instead of plain dicts by
+setting `NODE_CLASS = WebResource` on the crawler.
+"""
+from collections.abc import MutableMapping
+
+
+MISSING = object()      # marks the keys stored in slots as not set
+
+
+
+class WebResource(MutableMapping):
+    """
+    Web resource tree node that stores the `kind`, `url`, and `children` keys
+    in slots instead of a per-node hash table, and any other keys (e.g. `title`,
+    `content-type`) in an `extra` dict that is only created when needed.
+    Nodes behave like dicts (`node['url']`, `node.get('title')`, `node.update(context)`,
+    `'kind' in node`, etc.) so existing handlers and tree utilities keep working.
+
+    The `parent` key is kept separately from the node data: `node['parent']`
+    works as usual, but `parent` is not included in `keys()` and `items()`, so
+    nodes can be serialized without removing the parent links first.
+    Note: `json.dump` doesn't accept WebResource nodes, so save trees using the
+    `treejson` module or convert them to dicts using `to_dict_tree` first.
+    """
+    __slots__ = ('_kind', '_url', '_children', '_parent', '_extra')
+
+    def __init__(self, *args, **kwargs):
+        # set the slots directly for the common case WebResource(kind=.., url=.., children=[])
+        self._kind = kwargs.pop('kind', MISSING)
+        self._url = kwargs.pop('url', MISSING)
+        self._children = kwargs.pop('children', MISSING)
+        self._parent = kwargs.pop('parent', MISSING)
+        self._extra = None
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        if key == 'kind':
+            value = self._kind
+        elif key == 'url':
+            value = self._url
+        elif key == 'children':
+            value = self._children
+        elif key == 'parent':
+            value = self._parent
+        elif self._extra is not None:
+            value = self._extra.get(key, MISSING)
+        else:
+            value = MISSING
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key == 'kind':
+            self._kind = value
+        elif key == 'url':
+            self._url = value
+        elif key == 'children':
+            self._children = value
+        elif key == 'parent':
+            self._parent = value
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        self[key]   # raises KeyError if key not set
+        if key == 'kind':
+            self._kind = MISSING
+        elif key == 'url':
+            self._url = MISSING
+        elif key == 'children':
+            self._children = MISSING
+        elif key == 'parent':
+            self._parent = MISSING
+        else:
+            del self._extra[key]
+            if not self._extra:
+                self._extra = None
+
+    def __contains__(self, key):
+        if key == 'kind':
+            return self._kind is not MISSING
+        elif key == 'url':
+            return self._url is not MISSING
+        elif key == 'children':
+            return self._children is not MISSING
+        elif key == 'parent':
+            return self._parent is not MISSING
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        # `parent` is not included, see class docstring
+        if self._kind is not MISSING:
+            yield 'kind'
+        if self._url is not MISSING:
+            yield 'url'
+        if self._children is not MISSING:
+            yield 'children'
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        count = (self._kind is not MISSING) + (self._url is not MISSING) + (self._children is not MISSING)
+        if self._extra is not None:
+            count += len(self._extra)
+        return count
+
+    def update(self, other=(), **kwargs):
+        # faster than the generic MutableMapping.update
+        if hasattr(other, 'keys'):
+            for key in other.keys():
+                self[key] = other[key]
+        else:
+            for key, value in other:
+                self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return 'WebResource(' + repr(self.to_dict()) + ')'
+
+    def __reduce__(self):
+        # support for pickle and copy.deepcopy (which must keep the parent links)
+        parent = None if self._parent is MISSING else self._parent
+        return (self.__class__, (), (dict(self.items()), self._parent is not MISSING, parent))
+
+    def __setstate__(self, state):
+        data, has_parent, parent = state
+        self.update(data)
+        if has_parent:
+            self._parent = parent
+
+    def to_dict(self):
+        """
+        Returns the node's data (without `parent`) as a dict.
+        """
+        return dict(self.items())
+
+
+
+def to_dict_tree(tree_root):
+    """
+    Returns a copy of the web resource tree `tree_root` that uses plain dicts
+    for all nodes (without `parent` links), e.g., to pass it to `json.dump`.
+    """
+    root_copy = {key: val for key, val in tree_root.items() if key != 'parent'}
+    stack = [root_copy]
+    while stack:
+        node_copy = stack.pop()
+        children = node_copy.get('children')
+        if isinstance(children, list):
+            node_copy['children'] = children_copy = []
+            for child in children:
+                if isinstance(child, (dict, WebResource)):
+                    child = {key: val for key, val in child.items() if key != 'parent'}
+                    stack.append(child)
+                children_copy.append(child)
+    return root_copy
@@ -0,0 +1,263 @@
+"""
+Page parsing helpers that can run in worker processes.
+The functions in this module don't depend on crawler state, so the CPU-heavy
+HTML parsing can be sent to a `ProcessPoolExecutor` (see `crawl(parse_processes=N)`).
+"""
+from bs4 import BeautifulSoup
+from html import unescape as html_unescape
+import re
+from urllib.parse import urljoin
+
+
+
+# EXTRACTION HELPERS
+################################################################################
+
+def extract_title(page):
+    """
+    Returns the stripped text of the `<head><title>` of the soupified `page`.
+    """
+    title = ''
+    head_el = page.find('head')
+    if head_el:
+        title_el = head_el.find('title')
+        if title_el:
+            title = title_el.get_text().strip()
+    return title
+
+
+def extract_links(url, page):
+    """
+    Returns the absolute URLs of all `<a href>` links in the soupified `page`
+    in document order. Relative links are resolved with respect to `url`, or
+    with respect to the page's `<base href>` if present.
+    """
+    base_el = page.find('base', href=True)
+    if base_el:
+        url = urljoin(url, base_el['href'])
+    links = []
+    for link in page.find_all('a'):
+        if link.has_attr('href'):
+            links.append(urljoin(url, link['href']))
+    return links
+
+
+def parse_page_html(url, html, page_fields=None):
+    """
+    Extract the information needed to build the tree from the `html` of `url`.
+    This is the task function sent to the parser processes.
+    Returns (title, links, fields) where `fields` contains the output of each
+    of the `page_fields` functions (see `BasicCrawler.PAGE_FIELDS`), which
+    is the only case when the `html` needs to be soupified.
+    """
+    title, links = extract_title_and_links(url, html)
+    fields = {}
+    if page_fields:
+        page = BeautifulSoup(html, "html.parser")
+        for name, field_fn in page_fields.items():
+            fields[name] = field_fn(page)
+    return (title, links, fields)
+
+
+
+# FAST LINK EXTRACTION
+################################################################################
+
+# Tokenizer regexes. Like in html.parser, quotes only delimit attribute values
+# right after `=` (quoted values can contain `>`), other quotes are part of names
+# or unquoted values, e.g. `title=Don't`.
+#   SKIP_RE: text, end tags, and start tags other than the tags of interest
+#   TAG_START_RE: comment start, or start/end tag and its name
+#   TAG_REST_RE: the rest of a start tag, up to its closing `>`
+#   ATTR_RE: attribute name/value pairs inside a start tag
+TAGS_OF_INTEREST = ('a', 'base', 'head', 'title', 'script', 'style')
+START_TAG_REST = r'''(?:[^>=]|=(?:\s*"[^"]*"|\s*'[^']*'|(?!\s*["'])))*>'''
+SKIP_RE = re.compile(r'''(?:[^<]+|<(?![a-zA-Z/]|!--)|</(?!head[\s/>])[^>]*>'''
+                     r'''|<(?!(?:''' + '|'.join(TAGS_OF_INTEREST) + r''')[\s/>])[a-zA-Z]''' + START_TAG_REST + ')*',
+                     re.IGNORECASE)
+TAG_START_RE = re.compile(r'<(!--|/?[a-zA-Z][^\s/>\x00]*)')
+TAG_REST_RE = re.compile(START_TAG_REST)
+ATTR_RE = re.compile(r'''([^\s/>=][^\s/>=]*)(?:\s*=+\s*("[^"]*"|'[^']*'|(?!["'])[^\s>]*))?''')
+INNER_TAG_RE = re.compile(r'<[^>]*>')
+
+
+def parse_attrs(attrs_str):
+    """
+    Returns a dict of the attributes in `attrs_str`, the inside of a start tag.
+    Like in BeautifulSoup, names are lowercased and the last duplicate wins.
+    """
+    attrs = {}
+    for match in ATTR_RE.finditer(attrs_str):
+        name, value = match.groups()
+        if value is None:
+            value = ''
+        elif value[:1] in ('"', "'"):
+            value = value[1:-1]
+        if '&' in value:
+            value = html_unescape(value)
+        attrs[name.lower()] = value
+    return attrs
+
+
+def is_self_closing(attrs_str):
+    """
+    Returns True if the start tag whose inside is `attrs_str` ends with `/>`, e.g.
+    `<script src="a.js"/>`. Like in html.parser, the `/` of an unquoted value
+    is part of the value, so `<script src=a.js/>` is not self-closing.
+    """
+    if not attrs_str.endswith('/'):
+        return False
+    last_attr = None
+    for last_attr in ATTR_RE.finditer(attrs_str):
+        pass
+    if last_attr is None or last_attr.end() < len(attrs_str):
+        return True
+    value = last_attr.group(2)
+    return value is None or value[:1] in ('"', "'")
+
+
+def extract_title_and_links(url, html):
+    """
+    Fast alternative to `extract_title` and `extract_links` that works directly
+    on the `html` string of the page `url`. Returns (title, links).
+    Instead of building a document tree, a tokenizer jumps from one tag of
+    interest to the next (`<a>`, `<base>`, `<head>`, `<title>`), skipping
+    over comments, other tags, and the contents of `<script>` and `<style>` tags
+    (self-closing `<script/>` and `<style/>` tags have no contents).
+    """
+    hrefs = []
+    base_href = None
+    title = None
+    in_head = False
+    html_lower = None   # lowercased copy of html used to find closing tags
+    pos = 0
+    end = len(html)
+    while True:
+        pos = SKIP_RE.match(html, pos).end()
+        match = TAG_START_RE.match(html, pos)
+        if match is None:
+            break
+        tag = match.group(1).lower()
+        start = match.end()
+        if tag == '!--':
+            comment_end = html.find('-->', start)
+            pos = end if comment_end < 0 else comment_end + 3
+            continue
+        if tag[0] == '/':
+            # end tags stop at the first `>`, quotes or not
+            pos = html.find('>', start) + 1
+            if pos == 0:
+                break
+            if tag == '/head':
+                in_head = False
+            continue
+        rest = TAG_REST_RE.match(html, start) if tag in TAGS_OF_INTEREST else None
+        if rest is None:
+            # a quoted value is never closed so this is not a tag, but text up to the next `>`
+            close = html.find('>', start)
+            pos = start if close < 0 else close + 1
+            continue
+        pos = rest.end()
+        self_closing = html[pos-2] == '/' and is_self_closing(html[start:pos-1])
+        if tag == 'a':
+            attrs_str = html[start:pos-1]
+            if 'href' in attrs_str.lower():
+                attrs = parse_attrs(attrs_str)
+                if 'href' in attrs:
+                    hrefs.append(attrs['href'])
+        elif (tag == 'script' or tag == 'style') and not self_closing:
+            if html_lower is None:
+                html_lower = html.lower()
+            close = html_lower.find('</' + tag, pos)
+            pos = end if close < 0 else close
+        elif tag == 'head':
+            in_head = True
+        elif tag == 'title' and in_head and title is None:
+            if self_closing:
+                title = ''
+                continue
+            if html_lower is None:
+                html_lower = html.lower()
+            close = html_lower.find('</title', pos)
+            if close < 0:
+                close = end
+            title = html_unescape(INNER_TAG_RE.sub('', html[pos:close])).strip()
+            pos = close
+        elif tag == 'base' and base_href is None:
+            attrs = parse_attrs(html[start:pos-1])
+            if 'href' in attrs:
+                base_href = attrs['href']
+
+    base_url = url
+    if base_href is not None:
+        base_url = urljoin(url, base_href)
+    links = []
+    joined = {}     # global nav links repeat a lot so cache urljoin results
+    for href in hrefs:
+        link_url = joined.get(href)
+        if link_url is None:
+            link_url = urljoin(base_url, href)
+            joined[href] = link_url
+        links.append(link_url)
+    return (title or '', links)
+
+
+
+# PARSED PAGE
+################################################################################
+
+class ParsedPage(object):
+    """
+    Compact representation of a downloaded page that contains the `title_text`,
+    the absolute URLs of the `links` on the page, and any extra `fields`.
+    Attributes not defined here are looked up on a BeautifulSoup object for the
+    page, which is built on first use, so handlers that expect a BeautifulSoup
+    `page` argument (e.g. `page.find('div', ...)`, `page('a')`, `for el in page`)
+    keep working. Use `page.soup` where an actual `BeautifulSoup` is required,
+    e.g. for `isinstance` checks.
+    """
+    def __init__(self, url, raw_html, title_text, links, fields=None):
+        self.url = url
+        self.raw_html = raw_html
+        self.title_text = title_text
+        self.links = links
+        self.fields = fields if fields is not None else {}
+        self.simhash = None     # fingerprint of the page text set when DETECT_DUPLICATES
+        self._soup = None
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            if self.raw_html is None:
+                raise ValueError('The HTML of ' + str(self.url) + ' was not kept (pages downloaded by '
+                                 'shard workers only have the title_text, links and fields).')
+            self._soup = BeautifulSoup(self.raw_html, "html.parser")
+        return self._soup
+
+    def __getattr__(self, name):
+        # only called for attributes not found on the ParsedPage itself
+        if name.startswith('__') or name == '_soup':
+            raise AttributeError(name)
+        return getattr(self.soup, name)
+
+    # special methods are looked up on the class, so __getattr__ doesn't proxy them
+    def __call__(self, *args, **kwargs):
+        return self.soup(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self.soup)
+
+    def __len__(self):
+        return len(self.soup)
+
+    def __contains__(self, item):
+        return item in self.soup
+
+    def __getitem__(self, key):
+        return self.soup[key]
+
+    def __bool__(self):
+        return True     # like a soup, even if the page is empty
+
+    def __str__(self):
+        return str(self.soup)
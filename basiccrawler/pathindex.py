@@ -0,0 +1,119 @@
+"""
+Path-prefix index (trie of URL path parts) used to find the common path prefixes
+of the URLs on a site, e.g. `/course` or `/lesson`, which are candidates for
+`kind_handlers` or `IGNORE_URLS` patterns.
+"""
+import heapq
+
+from .traversal import iter_nodes
+
+
+
+class PathTrieNode(object):
+    """
+    Node of the `PathTrie`. The `count` of a node is the number of leaves in the
+    subtree below the node, i.e., the number of distinct URL paths that start
+    with the node's prefix and are not a prefix of any other path.
+    The node's prefix is not stored but rebuilt from the `part` of the node and
+    of its ancestors when needed (see `get_prefix`).
+    """
+    __slots__ = ('children', 'count', 'parent', 'part')
+
+    def __init__(self, parent=None, part=None):
+        self.children = None    # path part --> PathTrieNode, created when needed
+        self.count = 1          # new nodes are leaves
+        self.parent = parent
+        self.part = part
+
+    def get_prefix(self):
+        parts = []
+        node = self
+        while node.parent is not None:
+            parts.append(node.part)
+            node = node.parent
+        return '/'.join(reversed(parts))
+
+
+
+class PathTrie(object):
+    """
+    Trie of the path parts of URLs (query strings are ignored) that is updated one
+    URL at a time and keeps the `count` of every node up to date, so queries for
+    the most common prefixes can be answered at any time during the crawl.
+    `url_to_path` is used to remove the source domain from URLs.
+    """
+
+    def __init__(self, url_to_path=None):
+        self.url_to_path = url_to_path
+        self.root = PathTrieNode()
+        self.root.count = 0
+        self.levels = []        # depth-1 --> list of nodes in insertion order
+
+    def path_parts(self, url):
+        path = self.url_to_path(url) if self.url_to_path else url
+        path = path.split('?')[0]  # rm query string
+        return path.split('/')[1:]
+
+    def add_url(self, url):
+        self.add_path_parts(self.path_parts(url))
+
+    def add_path_parts(self, path_parts):
+        """
+        Add the path `path_parts` (list of str) to the trie and update the counts
+        of the nodes along the path. Takes time linear in the length of the path.
+        """
+        node = self.root
+        ancestors = [node]
+        depth = 0
+        while depth < len(path_parts):
+            if node.children is None or path_parts[depth] not in node.children:
+                break
+            node = node.children[path_parts[depth]]
+            ancestors.append(node)
+            depth += 1
+        if depth == len(path_parts):
+            return  # path already in trie
+        if node is self.root or node.children:
+            # new leaf under `node` so one more leaf for node and its ancestors
+            for ancestor in ancestors:
+                ancestor.count += 1
+        # else: `node` stops being a leaf so counts of node and ancestors don't change
+        for part in path_parts[depth:]:
+            child = PathTrieNode(node, part)
+            if node.children is None:
+                node.children = {}
+            node.children[part] = child
+            if len(self.levels) <= depth:
+                self.levels.append([])
+            self.levels[depth].append(child)
+            node = child
+            depth += 1
+
+    def add_tree(self, tree_root):
+        """
+        Add the URLs of all the nodes in the web resource tree `tree_root`.
+        """
+        for node in iter_nodes(tree_root):
+            self.add_url(node['url'])
+
+    def get_count(self, prefix):
+        """
+        Returns the count for the path `prefix` (e.g. 'course/math'), or 0 if no
+        path starts with `prefix`.
+        """
+        node = self.root
+        for part in prefix.split('/'):
+            if node.children is None or part not in node.children:
+                return 0
+            node = node.children[part]
+        return node.count
+
+    def top_prefixes(self, depth=1, k=10):
+        """
+        Returns a list of the `k` most common path prefixes with `depth` parts as
+        (prefix, count) tuples, sorted by decreasing count.
+        """
+        if depth < 1 or depth > len(self.levels):
+            return []
+        top = heapq.nlargest(k, self.levels[depth - 1], key=lambda node: node.count)
+        return [(node.get_prefix(), node.count) for node in top]
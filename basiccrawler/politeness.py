@@ -0,0 +1,219 @@
+"""
+Politeness helpers used to avoid overloading the websites being crawled:
+  - `RobotsCache`: robots.txt rules (disallow and Crawl-delay) fetched once per host
+  - `HostRateLimiter`: per host token bucket that spaces out requests to each host
+  - `HostQueue`: crawling queue that takes URLs from the hosts in round robin order
+"""
+from collections import OrderedDict, deque
+import itertools
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+
+LOGGER = logging.getLogger('crawler')
+
+
+
+def get_host(url):
+    """
+    Returns the scheme and host part of `url`, e.g. 'http://site.org:8080'.
+    """
+    parsedurl = urlparse(url)
+    return parsedurl.scheme + '://' + parsedurl.netloc
+
+
+
+# ROBOTS.TXT
+################################################################################
+
+class RobotsCache(object):
+    """
+    Parsed robots.txt files by host. The robots.txt of a host is downloaded the
+    first time one of its URLs is checked using `fetch(robots_url)`, which should
+    return (status_code, text) or None if the request failed. Status codes are
+    handled like `urllib.robotparser` does: 401 and 403 disallow all URLs, other
+    4xx status codes allow all URLs, and 5xx status codes disallow all URLs.
+    """
+
+    def __init__(self, fetch, user_agent='*'):
+        self.fetch = fetch
+        self.user_agent = user_agent
+        self.parsers = {}   # host --> RobotFileParser
+        self.lock = threading.Lock()
+
+    def get_parser(self, url):
+        host = get_host(url)
+        parser = self.parsers.get(host)
+        if parser is not None:
+            return parser
+        with self.lock:
+            if host not in self.parsers:
+                self.parsers[host] = self.load_parser(host)
+            return self.parsers[host]
+
+    def load_parser(self, host):
+        robots_url = host + '/robots.txt'
+        parser = RobotFileParser(robots_url)
+        result = self.fetch(robots_url)
+        if result is None:
+            LOGGER.warning('Could not get ' + robots_url + ' so assuming all URLs are allowed.')
+            parser.allow_all = True
+            return parser
+        status_code, text = result
+        if status_code in (401, 403):
+            parser.disallow_all = True
+        elif 400 <= status_code < 500:
+            parser.allow_all = True
+        elif status_code >= 500:
+            LOGGER.warning('ERROR ' + str(status_code) + ' when getting ' + robots_url
+                           + ' so assuming no URLs are allowed.')
+            parser.disallow_all = True
+        else:
+            parser.parse(text.splitlines())
+        return parser
+
+    def can_fetch(self, url):
+        return self.get_parser(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        """
+        Returns the minimum number of seconds between requests to the host of
+        `url` from the Crawl-delay or Request-rate rules, or None if not set.
+        """
+        parser = self.get_parser(url)
+        delay = parser.crawl_delay(self.user_agent)
+        rate = parser.request_rate(self.user_agent)
+        if rate is not None and rate.requests > 0:
+            rate_delay = float(rate.seconds) / rate.requests
+            delay = max(float(delay or 0), rate_delay)
+        return float(delay) if delay is not None else None
+
+
+
+# RATE LIMITING
+################################################################################
+
+class HostRateLimiter(object):
+    """
+    Token bucket per host that allows up to `burst` back-to-back requests and
+    then `rate` requests per second. When `robots` (a RobotsCache) is given,
+    hosts with a robots.txt Crawl-delay get at most one request per Crawl-delay
+    seconds. Requests reserve their slot with `reserve(url)` so threads (or
+    tasks) waiting for the same host are spaced out instead of all going at once.
+    """
+
+    def __init__(self, rate=None, burst=1, robots=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.robots = robots
+        self.clock = clock
+        self.buckets = {}   # host --> [tokens, last update time, rate, burst]
+        self.lock = threading.Lock()
+
+    def get_host_limits(self, url):
+        """
+        Returns (rate, burst) for the host of `url`, where rate is None for no limit.
+        """
+        rate, burst = self.rate, self.burst
+        delay = self.robots.crawl_delay(url) if self.robots else None
+        if delay:
+            rate = min(rate, 1.0 / delay) if rate else 1.0 / delay
+            burst = 1
+        return (rate, burst)
+
+    def reserve(self, url):
+        """
+        Take a token from the bucket of the host of `url`. Returns the number of
+        seconds the caller must wait before making the request (0 if none).
+        """
+        host = get_host(url)
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            rate, burst = self.get_host_limits(url)
+            bucket = self.buckets.setdefault(host, [float(burst), self.clock(), rate, burst])
+        with self.lock:
+            tokens, last_update, rate, burst = bucket
+            if rate is None:
+                return 0.0
+            now = self.clock()
+            tokens = min(float(burst), tokens + (now - last_update) * rate)
+            tokens -= 1     # can go below zero when requests are waiting for this host
+            bucket[0], bucket[1] = tokens, now
+            if tokens >= 0:
+                return 0.0
+            return -tokens / rate
+
+    def wait(self, url):
+        """
+        Sleep until a request can be made to the host of `url`. Returns the delay.
+        """
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+
+# HOST QUEUE
+################################################################################
+
+class HostQueue(object):
+    """
+    Crawling queue with the same `put`, `get`, and `empty` methods as `queue.Queue`
+    that keeps a FIFO queue of (url, context) items for each host and takes items
+    from the hosts in round robin order, so the next URLs to be crawled are from
+    different hosts and a slow host does not hold up the URLs of the others.
+    The order of the items depends only on the order of the `put` calls.
+    """
+
+    def __init__(self):
+        self.host_queues = OrderedDict()    # host --> deque of (url, context)
+        self.ready_hosts = deque()          # hosts with items in round robin order
+        self.size = 0
+
+    def put(self, item):
+        host = get_host(item[0])
+        host_queue = self.host_queues.get(host)
+        if host_queue is None:
+            host_queue = self.host_queues[host] = deque()
+        if not host_queue:
+            self.ready_hosts.append(host)
+        host_queue.append(item)
+        self.size += 1
+
+    def get(self):
+        host = self.ready_hosts.popleft()
+        host_queue = self.host_queues[host]
+        item = host_queue.popleft()
+        if host_queue:
+            self.ready_hosts.append(host)
+        self.size -= 1
+        return item
+
+    def empty(self):
+        return self.size == 0
+
+    def qsize(self):
+        return self.size
+
+    def peek(self, n):
+        """
+        Returns the next `n` items in the order `get` would return them.
+        """
+        items = []
+        if n <= 0:
+            return items
+        for position in itertools.count():
+            found = False
+            for host in self.ready_hosts:
+                host_queue = self.host_queues[host]
+                if position < len(host_queue):
+                    items.append(host_queue[position])
+                    found = True
+                    if len(items) >= n:
+                        return items
+            if not found:
+                return items
@@ -0,0 +1,95 @@
+"""
+Retries scheduled by the crawler instead of sleeping inside `make_request`: URLs
+whose request failed with a temporary error are put aside in a `RetryQueue` until
+their backoff delay has passed, while the crawl continues with the other URLs.
+"""
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import heapq
+import itertools
+import random
+import time
+
+
+
+class RetryLater(Exception):
+    """
+    Raised by `make_request(url, retry_later=True)` when the request failed with
+    an error that is worth retrying later: a connection error, a timeout, or a
+    status code in `RETRY_STATUS_CODES`. `retry_after` is the number of seconds
+    from the `Retry-After` header of 429 and 503 responses, or None.
+    """
+
+    def __init__(self, url, reason, status_code=None, retry_after=None):
+        super().__init__(reason)
+        self.url = url
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """
+    Returns the number of seconds to wait from the `Retry-After` header `value`,
+    which is either a number of seconds or an HTTP date, or None if not valid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_date.tzinfo is None:
+        retry_date = retry_date.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, base=1.0, max_delay=300.0, jitter=0.5, rnd=random):
+    """
+    Exponential backoff delay before retry number `attempt` (1, 2, 3, ...):
+    `base`, 2*`base`, 4*`base`, ... up to `max_delay` seconds, plus a random
+    jitter of up to `jitter` times the delay so retries don't all happen at once.
+    """
+    delay = min(max_delay, base * 2 ** (attempt - 1))
+    return delay + rnd.uniform(0, delay * jitter)
+
+
+
+class RetryQueue(object):
+    """
+    (url, context) items waiting for their retry time. Items with the same retry
+    time are returned in the order they were added.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.heap = []      # (due time, seq, url, context)
+        self.seq = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, url, context, delay):
+        heapq.heappush(self.heap, (self.clock() + delay, next(self.seq), url, context))
+
+    def wait_time(self):
+        """
+        Returns the number of seconds until the next item is due (0 if already due).
+        """
+        if not self.heap:
+            return 0.0
+        return max(0.0, self.heap[0][0] - self.clock())
+
+    def pop_due(self):
+        """
+        Remove and return the list of (url, context) items that are due.
+        """
+        now = self.clock()
+        items = []
+        while self.heap and self.heap[0][0] <= now:
+            _, _, url, context = heapq.heappop(self.heap)
+            items.append((url, context))
+        return items
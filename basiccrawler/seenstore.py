@@ -0,0 +1,169 @@
+"""
+Compact store of URL counts for crawls of millions of URLs. Instead of keeping the
+URL strings, the `FingerprintCounter` keeps a 64-bit fingerprint of each URL and
+its count in an open-addressing hash table, which uses ~20-35 bytes per URL instead
+of the ~140 bytes per URL of a dict of URL strings (see benchmarks/bench_seen_store.py).
+"""
+from array import array
+import mmap
+import os
+
+
+KEY_SIZE = 8        # bytes per fingerprint (array typecode 'Q')
+COUNT_SIZE = 4      # bytes per count (array typecode 'I')
+MAX_COUNT = 2 ** 32 - 1
+FINGERPRINT_MASK = 2 ** 64 - 1
+
+
+
+def url_fingerprint(url):
+    """
+    Returns a non-zero 64-bit fingerprint of `url`. Two different URLs have the
+    same fingerprint with probability 2**-64, so for a crawl of 10M URLs the
+    chance of any collision is less than 1 in 100,000.
+    Uses Python's (SipHash) string hash, which is cached on the string object and
+    is much faster than hashlib, but is randomized for each Python process, so
+    fingerprints can't be saved and used by another process.
+    """
+    return (hash(url) & FINGERPRINT_MASK) or 1     # 0 marks empty slots
+
+
+
+class FingerprintCounter(object):
+    """
+    Map from URLs to counts with the subset of the dict API used by the crawler:
+    `url in counter`, `counter[url]` (0 for URLs not seen), `counter[url] = count`,
+    `counter.get(url, default)`, `len(counter)`, and `update(mapping)`. Values
+    that are not ints are stored as 1, so `urls_visited[url] = 'visited'` works.
+    The URLs cannot be listed since only their fingerprints are kept.
+
+    The table uses linear probing and doubles in size when more than 2/3 full.
+    When `path` is given, the table is kept in a memory-mapped file at `path`
+    (overwritten) so the operating system can page it out to disk.
+    """
+    MAX_LOAD = 2.0 / 3
+
+    def __init__(self, capacity=2 ** 16, path=None):
+        self.path = path
+        self.size = 0
+        self.allocate(max(capacity, 8), path)
+
+    def allocate(self, capacity, path):
+        """
+        Create an empty table with `capacity` slots (rounded up to a power of 2),
+        in memory or in a memory-mapped file at `path`.
+        """
+        self.capacity = 1 << (capacity - 1).bit_length()
+        self.mask = self.capacity - 1
+        self.max_size = int(self.capacity * self.MAX_LOAD)
+        keys_bytes = self.capacity * KEY_SIZE
+        if path is None:
+            self.mmap = None
+            self.keys = array('Q', bytes(keys_bytes))
+            self.counts = array('I', bytes(self.capacity * COUNT_SIZE))
+            return
+        total_bytes = keys_bytes + self.capacity * COUNT_SIZE
+        with open(path, 'w+b') as table_file:
+            table_file.truncate(total_bytes)
+            self.mmap = mmap.mmap(table_file.fileno(), total_bytes)
+        view = memoryview(self.mmap)
+        self.keys = view[:keys_bytes].cast('Q')
+        self.counts = view[keys_bytes:].cast('I')
+
+    def release(self):
+        if self.mmap is not None:
+            self.keys.release()
+            self.counts.release()
+            self.mmap.close()
+            self.mmap = None
+
+    def close(self):
+        """
+        Release the memory-mapped file and delete it.
+        """
+        if self.mmap is not None:
+            self.release()
+            os.remove(self.path)
+
+    def find_slot(self, fingerprint):
+        """
+        Returns the index of the slot of `fingerprint`, or of the empty slot where
+        it should be added.
+        """
+        keys = self.keys
+        mask = self.mask
+        index = fingerprint & mask
+        while True:
+            key = keys[index]
+            if key == fingerprint or key == 0:
+                return index
+            index = (index + 1) & mask
+
+    def grow(self):
+        old_keys, old_counts, old_mmap = self.keys, self.counts, self.mmap
+        new_path = self.path + '.new' if self.path else None
+        self.allocate(self.capacity * 2, new_path)
+        keys, counts = self.keys, self.counts
+        for index, key in enumerate(old_keys):
+            if key:
+                new_index = self.find_slot(key)
+                keys[new_index] = key
+                counts[new_index] = old_counts[index]
+        if old_mmap is not None:
+            old_keys.release()
+            old_counts.release()
+            old_mmap.close()
+            os.replace(new_path, self.path)
+
+
+    # DICT API
+    ############################################################################
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, url):
+        return self.keys[self.find_slot(url_fingerprint(url))] != 0
+
+    def get(self, url, default=None):
+        index = self.find_slot(url_fingerprint(url))
+        if self.keys[index] == 0:
+            return default
+        return self.counts[index]
+
+    def __getitem__(self, url):
+        index = self.find_slot(url_fingerprint(url))
+        return self.counts[index]     # 0 if empty slot
+
+    def __setitem__(self, url, count):
+        if not isinstance(count, int):
+            count = 1
+        fingerprint = url_fingerprint(url)
+        index = self.find_slot(fingerprint)
+        if self.keys[index] == 0:
+            if self.size >= self.max_size:
+                self.grow()
+                index = self.find_slot(fingerprint)
+            self.keys[index] = fingerprint
+            self.size += 1
+        self.counts[index] = min(count, MAX_COUNT)
+
+    def increment(self, url, amount=1):
+        """
+        Add `amount` to the count of `url` and return the new count.
+        """
+        fingerprint = url_fingerprint(url)
+        index = self.find_slot(fingerprint)
+        if self.keys[index] == 0:
+            if self.size >= self.max_size:
+                self.grow()
+                index = self.find_slot(fingerprint)
+            self.keys[index] = fingerprint
+            self.size += 1
+        count = min(self.counts[index] + amount, MAX_COUNT)
+        self.counts[index] = count
+        return count
+
+    def update(self, mapping):
+        for url, count in mapping.items():
+            self[url] = count
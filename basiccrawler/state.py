@@ -0,0 +1,286 @@
+"""
+SQLite-backed store for the crawler state, used to checkpoint a crawl and resume it.
+"""
+from collections import Counter, deque
+import json
+import os
+import sqlite3
+
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    nid INTEGER PRIMARY KEY,
+    parent_nid INTEGER,
+    position INTEGER,
+    has_parent INTEGER,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS frontier (
+    seq INTEGER PRIMARY KEY,
+    url TEXT,
+    parent_nid INTEGER,
+    context TEXT
+);
+CREATE TABLE IF NOT EXISTS seen (
+    url TEXT PRIMARY KEY,
+    count INTEGER
+);
+CREATE TABLE IF NOT EXISTS visited (
+    url TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS broken_links (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+ROOT_NID = 0
+
+
+
+class CrawlStateStore(object):
+    """
+    Persists the crawl state to the SQLite database at `path`:
+      - nodes: the web resource tree nodes (without `children` and `parent`)
+        and the tree edges as (parent_nid, position) pairs
+      - frontier: pending (url, context) queue items, where `context['parent']`
+        is stored as the node id of the parent
+      - seen, visited, broken_links: the crawler's URL bookkeeping
+    Changes are buffered in memory and written in a single transaction when
+    `checkpoint` is called, so the database always contains the state of the
+    crawl at the end of some crawl step.
+    Nodes are saved once they are attached to the tree, so changes made to a
+    node's attributes after the step in which it was attached are not saved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        parent_dir, _ = os.path.split(path)
+        if parent_dir and not os.path.exists(parent_dir):
+            os.makedirs(parent_dir, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+        self.node_ids = {}          # id(node) --> (nid, node)
+        self.next_nid = ROOT_NID + 1
+        self.persisted_counts = {}  # nid --> number of children already saved
+        self.pending_seqs = {}      # (url, id(context['parent'])) --> deque of seqs of frontier items
+        self.next_seq = 0
+
+        # changes since the last checkpoint
+        self.new_frontier_items = []    # (seq, url, context)
+        self.done_seqs = []
+        self.seen_increments = Counter()
+        self.new_visited = []
+        self.new_broken_links = []
+        self.dirty_nodes = {}           # id(node) --> node with new children
+        self.new_root = None
+        self.steps_since_checkpoint = 0
+
+    def clear(self):
+        for table in ['nodes', 'frontier', 'seen', 'visited', 'broken_links', 'meta']:
+            self.conn.execute('DELETE FROM ' + table)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+    # RECORDING CHANGES
+    ############################################################################
+
+    def set_root(self, root_node):
+        self.node_ids[id(root_node)] = (ROOT_NID, root_node)
+        self.dirty_nodes[id(root_node)] = root_node
+        self.new_root = root_node
+
+    def record_enqueue(self, url, context):
+        seq = self.next_seq
+        self.next_seq += 1
+        self.add_pending_seq(url, context, seq)
+        self.new_frontier_items.append((seq, url, context))
+
+    def add_pending_seq(self, url, context, seq):
+        key = (url, id(context.get('parent')))
+        seqs = self.pending_seqs.get(key)
+        if seqs is None:
+            seqs = self.pending_seqs[key] = deque()
+        seqs.append(seq)
+
+    def record_dequeue(self, url, context):
+        """
+        Called when the queue item (url, context) is taken from the queue. Items
+        are identified by url and parent node so the queue doesn't have to be FIFO
+        and can return copies of the contexts (see `PriorityFrontier`).
+        """
+        key = (url, id(context.get('parent')))
+        seqs = self.pending_seqs[key]
+        self.done_seqs.append(seqs.popleft())
+        if not seqs:
+            del self.pending_seqs[key]
+
+    def record_seen(self, url):
+        self.seen_increments[url] += 1
+
+    def record_visited(self, url):
+        self.new_visited.append(url)
+
+    def record_broken_link(self, url):
+        self.new_broken_links.append(url)
+
+    def record_step(self, parent_node):
+        """
+        Called at the end of each crawl step with the parent node of the URL
+        visited, which is where the new nodes of this step have been attached.
+        """
+        if parent_node is not None:
+            self.dirty_nodes[id(parent_node)] = parent_node
+        self.steps_since_checkpoint += 1
+
+
+    # CHECKPOINT
+    ############################################################################
+
+    def get_nid(self, node):
+        entry = self.node_ids.get(id(node))
+        if entry is not None:
+            return entry[0]
+        nid = self.next_nid
+        self.next_nid += 1
+        self.node_ids[id(node)] = (nid, node)   # keep ref so id(node) stays unique
+        return nid
+
+    def node_row(self, node, nid, parent_nid, position):
+        data = {key: val for key, val in node.items() if key not in ('children', 'parent')}
+        return (nid, parent_nid, position, int('parent' in node), json.dumps(data))
+
+    def collect_node_rows(self):
+        """
+        Returns the rows for all the nodes attached to the dirty nodes since the
+        last checkpoint, including their whole subtrees.
+        """
+        rows = []
+        stack = list(self.dirty_nodes.values())
+        while stack:
+            node = stack.pop()
+            nid = self.get_nid(node)
+            children = node.get('children', [])
+            start = self.persisted_counts.get(nid, 0)
+            for position in range(start, len(children)):
+                child = children[position]
+                rows.append(self.node_row(child, self.get_nid(child), nid, position))
+                stack.append(child)
+            self.persisted_counts[nid] = len(children)
+        return rows
+
+    def checkpoint(self, counter, finished=False):
+        """
+        Write all changes since the last checkpoint in a single transaction.
+        """
+        node_rows = self.collect_node_rows()
+        if self.new_root is not None:
+            node_rows.append(self.node_row(self.new_root, ROOT_NID, None, None))
+        frontier_rows = []
+        done_seqs = set(self.done_seqs)
+        for seq, url, context in self.new_frontier_items:
+            if seq in done_seqs:
+                continue    # enqueued and visited since last checkpoint
+            parent_nid = None
+            if 'parent' in context:
+                parent = context['parent']
+                if id(parent) not in self.node_ids:
+                    # parent not attached to the tree (yet), save it detached
+                    node_rows.append(self.node_row(parent, self.get_nid(parent), None, None))
+                parent_nid = self.get_nid(parent)
+            context_data = {key: val for key, val in context.items() if key != 'parent'}
+            frontier_rows.append((seq, url, parent_nid, json.dumps(context_data)))
+
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?)', node_rows)
+            self.conn.executemany('INSERT INTO frontier VALUES (?, ?, ?, ?)', frontier_rows)
+            self.conn.executemany('DELETE FROM frontier WHERE seq = ?', [(seq,) for seq in done_seqs])
+            self.conn.executemany('INSERT OR IGNORE INTO seen VALUES (?, 0)',
+                                  [(url,) for url in self.seen_increments])
+            self.conn.executemany('UPDATE seen SET count = count + ? WHERE url = ?',
+                                  [(count, url) for url, count in self.seen_increments.items()])
+            self.conn.executemany('INSERT OR IGNORE INTO visited VALUES (?)', [(url,) for url in self.new_visited])
+            self.conn.executemany('INSERT INTO broken_links (url) VALUES (?)',
+                                  [(url,) for url in self.new_broken_links])
+            meta = [('counter', str(counter)), ('next_seq', str(self.next_seq)),
+                    ('next_nid', str(self.next_nid)), ('finished', str(int(finished)))]
+            self.conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', meta)
+
+        self.new_frontier_items = []
+        self.done_seqs = []
+        self.seen_increments = Counter()
+        self.new_visited = []
+        self.new_broken_links = []
+        self.dirty_nodes = {}
+        self.new_root = None
+        self.steps_since_checkpoint = 0
+
+
+    # RESTORE
+    ############################################################################
+
+    def has_saved_state(self):
+        """
+        Returns True if the state of a crawl that didn't finish has been saved.
+        """
+        meta = dict(self.conn.execute("SELECT key, value FROM meta WHERE key IN ('counter', 'finished')"))
+        return 'counter' in meta and meta.get('finished') != '1'
+
+    def load(self, node_class=dict):
+        """
+        Rebuild the crawl state saved at the last checkpoint. Returns a dict with
+        keys `root`, `queue_items` (list of (url, context)), `seen` (dict),
+        `visited` (list), `broken_links` (list), and `counter`.
+        The tree nodes are created using `node_class` (dict or WebResource).
+        """
+        meta = dict(self.conn.execute('SELECT key, value FROM meta'))
+        self.next_seq = int(meta['next_seq'])
+        self.next_nid = int(meta['next_nid'])
+
+        # nodes and tree edges
+        nodes = {}
+        edges = []
+        for nid, parent_nid, position, has_parent, data in self.conn.execute('SELECT * FROM nodes'):
+            node = node_class(json.loads(data))
+            node['children'] = []
+            nodes[nid] = node
+            if parent_nid is not None:
+                edges.append((parent_nid, position, nid, has_parent))
+        root = nodes[ROOT_NID]
+        edges.sort()
+        for parent_nid, position, nid, has_parent in edges:
+            parent = nodes[parent_nid]
+            child = nodes[nid]
+            parent['children'].append(child)
+            if has_parent:
+                child['parent'] = parent
+        for nid, node in nodes.items():
+            self.node_ids[id(node)] = (nid, node)
+            self.persisted_counts[nid] = len(node['children'])
+
+        # frontier
+        queue_items = []
+        for seq, url, parent_nid, context_data in self.conn.execute('SELECT * FROM frontier ORDER BY seq'):
+            context = json.loads(context_data)
+            if parent_nid is not None:
+                context['parent'] = nodes[parent_nid]
+            queue_items.append((url, context))
+            self.add_pending_seq(url, context, seq)
+
+        return dict(
+            root=root,
+            queue_items=queue_items,
+            seen=dict(self.conn.execute('SELECT url, count FROM seen')),
+            visited=[row[0] for row in self.conn.execute('SELECT url FROM visited')],
+            broken_links=[row[0] for row in self.conn.execute('SELECT url FROM broken_links ORDER BY id')],
+            counter=int(meta['counter']),
+        )
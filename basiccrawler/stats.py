@@ -0,0 +1,198 @@
+"""
+Crawl instrumentation: time spent in each stage of the crawl (requests, parsing,
+ignore checks, handlers), counters (cache hits, bytes, retries, broken links...),
+request latency per host, and the size of the crawling queue over time.
+The `CrawlStats` collected can be saved as JSON lines and in the Prometheus text
+format, see `COLLECT_STATS` in `BasicCrawler`.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+import json
+import os
+import threading
+import time
+
+
+# upper bounds of histogram buckets in seconds
+DEFAULT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_PREFIX = 'basiccrawler_'
+
+
+
+class Histogram(object):
+    """
+    Counts of observed values in buckets with the upper bounds in `buckets`
+    (the last bucket, +Inf, holds larger values), plus their count and sum.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Returns the upper bound of the bucket that contains the `q` quantile,
+        or None if no values were observed (or the value is in the +Inf bucket).
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return None
+
+    def cumulative_counts(self):
+        """
+        Returns [(upper bound, number of values <= upper bound)] including +Inf.
+        """
+        counts = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), self.bucket_counts):
+            cumulative += bucket_count
+            counts.append((bound, cumulative))
+        return counts
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+
+
+class CrawlStats(object):
+    """
+    Metrics collected during a crawl. Can be updated from several threads.
+      - `stages`: stage name --> Histogram of the seconds spent in the stage
+      - `counters`: counter name --> count
+      - `hosts`: host --> Histogram of request latency in seconds
+      - `frontier_sizes`: list of (seconds since start, URLs in queue) sampled
+        at most every `sample_every` seconds
+    When `log_path` is given, a snapshot of the stats is appended as a JSON line
+    every `log_every` seconds; when `prometheus_path` is given, the file is
+    replaced with the current metrics in the Prometheus text format at the same time.
+    """
+
+    def __init__(self, log_path=None, log_every=10.0, prometheus_path=None, sample_every=1.0,
+                 clock=time.time):
+        self.log_path = log_path
+        self.log_every = log_every
+        self.prometheus_path = prometheus_path
+        self.sample_every = sample_every
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.start_time = clock()
+        self.stages = {}
+        self.counters = defaultdict(int)
+        self.hosts = {}
+        self.frontier_sizes = []
+        self.next_sample_time = self.start_time
+        self.next_log_time = self.start_time + log_every
+
+    def incr(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def observe(self, stage, seconds, host=None):
+        """
+        Record `seconds` spent in `stage`, and as request latency for `host` if given.
+        """
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+            if host is not None:
+                histogram = self.hosts.get(host)
+                if histogram is None:
+                    histogram = self.hosts[host] = Histogram()
+                histogram.observe(seconds)
+
+    def tick(self, frontier_size, force=False):
+        """
+        Called after each crawl step with the number of URLs in the queue to
+        sample the frontier size and write the log files when due.
+        """
+        now = self.clock()
+        if force or now >= self.next_sample_time:
+            self.frontier_sizes.append((round(now - self.start_time, 3), frontier_size))
+            self.next_sample_time = now + self.sample_every
+        if force or now >= self.next_log_time:
+            self.next_log_time = now + self.log_every
+            if self.log_path:
+                self.write_json_line(self.log_path, frontier_size)
+            if self.prometheus_path:
+                self.write_prometheus(self.prometheus_path, frontier_size)
+
+
+    # EXPORT
+    ############################################################################
+
+    def snapshot(self, frontier_size=None):
+        """
+        Returns a JSON-serializable dict with the current values of the stats.
+        """
+        with self.lock:
+            return {
+                'time': round(self.clock(), 3),
+                'elapsed': round(self.clock() - self.start_time, 3),
+                'frontier_size': frontier_size,
+                'counters': dict(self.counters),
+                'stages': {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+                'hosts': {host: histogram.to_dict() for host, histogram in self.hosts.items()},
+            }
+
+    def write_json_line(self, path, frontier_size=None):
+        with open(path, 'a') as log_file:
+            log_file.write(json.dumps(self.snapshot(frontier_size), sort_keys=True) + '\n')
+
+    def to_prometheus(self, frontier_size=None):
+        """
+        Returns the stats in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for counter, value in sorted(self.counters.items()):
+                name = METRICS_PREFIX + counter + '_total'
+                lines.append('# TYPE ' + name + ' counter')
+                lines.append(name + ' ' + str(value))
+            self.add_histogram_lines(lines, 'stage_seconds', 'stage', self.stages)
+            self.add_histogram_lines(lines, 'host_request_seconds', 'host', self.hosts)
+        if frontier_size is not None:
+            lines.append('# TYPE ' + METRICS_PREFIX + 'frontier_size gauge')
+            lines.append(METRICS_PREFIX + 'frontier_size ' + str(frontier_size))
+        return '\n'.join(lines) + '\n'
+
+    def add_histogram_lines(self, lines, metric, label, histograms):
+        if not histograms:
+            return
+        name = METRICS_PREFIX + metric
+        lines.append('# TYPE ' + name + ' histogram')
+        for key, histogram in sorted(histograms.items()):
+            label_value = label + '="' + key.replace('\\', '\\\\').replace('"', '\\"') + '"'
+            for bound, count in histogram.cumulative_counts():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(name + '_bucket{' + label_value + ',le="' + le + '"} ' + str(count))
+            lines.append(name + '_sum{' + label_value + '} ' + repr(histogram.sum))
+            lines.append(name + '_count{' + label_value + '} ' + str(histogram.count))
+
+    def write_prometheus(self, path, frontier_size=None):
+        text = self.to_prometheus(frontier_size)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as metrics_file:
+            metrics_file.write(text)
+        os.replace(tmp_path, path)      # so scrapers never read a partial file
@@ -0,0 +1,61 @@
+"""
+Iterative traversal of web resource trees. The tree utilities use an explicit
+stack instead of recursion so they work on very deep trees (e.g. long chains of
+"next page" links) without hitting Python's recursion limit.
+"""
+
+
+
+def iter_tree(tree_root):
+    """
+    Generates (node, parent, depth) for all nodes of the tree in depth-first
+    pre-order, which is the order in which a recursive walk visits the nodes.
+    The `parent` of `tree_root` is None and its depth is 0.
+    """
+    stack = [(tree_root, None, 0)]
+    while stack:
+        node, parent, depth = stack.pop()
+        yield (node, parent, depth)
+        children = node.get('children') if node is not None else None
+        if children:
+            for child in reversed(children):
+                stack.append((child, node, depth + 1))
+
+
+def iter_nodes(tree_root):
+    """
+    Generates all the nodes of the tree in depth-first pre-order. Faster than
+    `iter_tree` when the parent and depth of the nodes are not needed.
+    """
+    stack = [tree_root]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = node.get('children') if node is not None else None
+        if children:
+            stack.extend(reversed(children))
+
+
+def walk_tree(tree_root, pre_visit=None, post_visit=None):
+    """
+    Depth-first walk of the tree that calls the visitor callbacks:
+      - `pre_visit(node, parent, depth)` before visiting the children of `node`;
+        it can return False to skip the children of `node`, and it can modify
+        `node['children']` before they are visited
+      - `post_visit(node, parent, depth)` after all the children of `node` have
+        been visited (not called for nodes whose children were skipped)
+    """
+    stack = [(tree_root, None, 0, False)]
+    while stack:
+        node, parent, depth, children_visited = stack.pop()
+        if children_visited:
+            post_visit(node, parent, depth)
+            continue
+        if pre_visit is not None and pre_visit(node, parent, depth) is False:
+            continue
+        if post_visit is not None:
+            stack.append((node, parent, depth, True))
+        children = node.get('children') if node is not None else None
+        if children:
+            for child in reversed(children):
+                stack.append((child, node, depth + 1, False))
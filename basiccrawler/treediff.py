@@ -0,0 +1,111 @@
+"""
+Compute the differences between two web resource trees, e.g., the tree saved by
+the previous crawl and the tree from tonight's re-crawl, so that the downstream
+scraping steps can process only the nodes that changed.
+"""
+
+
+
+def flatten_web_resource_tree(tree_root):
+    """
+    Returns a list of records (url, parent_index, node) for all nodes in the
+    tree in depth-first pre-order, where `parent_index` is the index of the
+    parent node's record (None for `tree_root`).
+    """
+    records = []
+    if tree_root is None:
+        return records
+    stack = [(tree_root, None)]
+    while stack:
+        node, parent_index = stack.pop()
+        records.append((node['url'], parent_index, node))
+        index = len(records) - 1
+        for child in reversed(node.get('children', [])):
+            stack.append((child, index))
+    return records
+
+
+def index_records_by_url(records):
+    """
+    Returns a dict url --> list of record indices in pre-order (the same URL can
+    appear more than once in a tree, e.g., when two links redirect to one page).
+    """
+    url_index = {}
+    for index, (url, _, _) in enumerate(records):
+        url_index.setdefault(url, []).append(index)
+    return url_index
+
+
+def node_attrs(node):
+    """
+    Returns the attributes of `node` without the `children` and `parent` keys.
+    """
+    return {key: val for key, val in node.items() if key not in ('children', 'parent')}
+
+
+def node_changes(old_node, new_node):
+    """
+    Returns a dict key --> [old_value, new_value] of the attributes that differ.
+    """
+    changes = {}
+    for key in old_node.keys() | new_node.keys():
+        if key == 'children' or key == 'parent':
+            continue
+        old_value = old_node.get(key)
+        new_value = new_node.get(key)
+        if old_value != new_value:
+            changes[key] = [old_value, new_value]
+    return changes
+
+
+def parent_url(records, index):
+    parent_index = records[index][1]
+    if parent_index is None:
+        return None
+    return records[parent_index][0]
+
+
+def diff_web_resource_trees(old_tree, new_tree):
+    """
+    Compare the web resource trees `old_tree` and `new_tree` (without `parent`
+    links, either can be None for an empty tree) and return a dict with the lists of:
+      - `added`: nodes in `new_tree` only, as {url, parent_url, node}
+      - `removed`: nodes in `old_tree` only, as {url, parent_url}
+      - `moved`: nodes that have a different parent, as {url, old_parent_url, new_parent_url}
+      - `changed`: nodes with different attributes, as {url, parent_url, changes}
+        where changes is a dict key --> [old_value, new_value]
+    Nodes are matched by URL (in pre-order if a URL appears multiple times) using
+    dicts indexed by URL, so the diff takes time linear in the size of the trees.
+    A node can be both `moved` and `changed`. The `node` of added nodes doesn't
+    include its children, which are listed separately as added nodes.
+    """
+    old_records = flatten_web_resource_tree(old_tree)
+    new_records = flatten_web_resource_tree(new_tree)
+    old_index = index_records_by_url(old_records)
+    new_index = index_records_by_url(new_records)
+
+    diff = dict(added=[], removed=[], moved=[], changed=[])
+    seen_counts = {}    # url --> number of occurrences of url in new_tree so far
+    for index, (url, _, node) in enumerate(new_records):
+        occurrence = seen_counts.get(url, 0)
+        seen_counts[url] = occurrence + 1
+        old_indices = old_index.get(url, [])
+        if occurrence >= len(old_indices):
+            diff['added'].append(dict(url=url, parent_url=parent_url(new_records, index), node=node_attrs(node)))
+            continue
+        old_position = old_indices[occurrence]
+        old_parent_url = parent_url(old_records, old_position)
+        new_parent_url = parent_url(new_records, index)
+        if old_parent_url != new_parent_url:
+            diff['moved'].append(dict(url=url, old_parent_url=old_parent_url, new_parent_url=new_parent_url))
+        changes = node_changes(old_records[old_position][2], node)
+        if changes:
+            diff['changed'].append(dict(url=url, parent_url=new_parent_url, changes=changes))
+
+    seen_counts = {}    # url --> number of occurrences of url in old_tree so far
+    for index, (url, _, _) in enumerate(old_records):
+        occurrence = seen_counts.get(url, 0)
+        seen_counts[url] = occurrence + 1
+        if occurrence >= len(new_index.get(url, [])):
+            diff['removed'].append(dict(url=url, parent_url=parent_url(old_records, index)))
+    return diff
@@ -0,0 +1,130 @@
+"""
+Streaming JSON serializer for web resource trees. Produces the same output as
+`json.dump(tree, f, ensure_ascii=False, indent=2, sort_keys=True)` without
+building the whole JSON document in memory, and removes the nodes' `parent`
+links while walking the tree instead of in a separate cleanup pass.
+"""
+import json
+from json.encoder import encode_basestring
+
+from .nodes import WebResource
+
+
+WRITE_BATCH_SIZE = 1000     # number of chunks joined into a single file write
+NODE_TYPES = (dict, WebResource)
+
+
+
+def iter_web_resource_tree_json(tree_root, indent=2, compact=False, remove_parents=True):
+    """
+    Generates the JSON text for the web resource tree `tree_root` in chunks.
+    The tree is walked depth-first using an explicit stack, so very deep trees
+    don't hit the recursion limit. Node keys are sorted and the `parent` key is
+    skipped (and deleted from the node if `remove_parents` is True). Non-node
+    values are encoded using the standard `json` encoder.
+    When `compact` is True, the output has no indentation or extra whitespace.
+    """
+    if compact:
+        indent = None
+        item_separator, key_separator = ',', ':'
+    else:
+        item_separator, key_separator = (',', ': ') if indent is not None else (', ', ': ')
+    encoder = json.JSONEncoder(ensure_ascii=False, indent=indent, sort_keys=True,
+                               separators=(item_separator, key_separator))
+
+    newlines = []   # newline followed by the indentation for each level
+    def newline_at(level):
+        if indent is None:
+            return ''
+        while len(newlines) <= level:
+            newlines.append('\n' + ' ' * (indent * len(newlines)))
+        return newlines[level]
+
+    encoded_keys = {}   # key --> encoded key followed by key separator
+    def encode_key(key):
+        encoded_key = encoded_keys.get(key)
+        if encoded_key is None:
+            encoded_key = encoder.encode(key) + key_separator
+            encoded_keys[key] = encoded_key
+        return encoded_key
+
+    def encode_value(value, level):
+        # shortcuts for the most common values in nodes
+        value_type = type(value)
+        if value_type is str:
+            return encode_basestring(value)
+        if (value_type is list or value_type is dict) and not value:
+            return '[]' if value_type is list else '{}'
+        text = encoder.encode(value)
+        if indent is not None and '\n' in text:
+            text = text.replace('\n', newline_at(level))
+        return text
+
+    def encode_leaf(node, level):
+        # nodes without children are written in one go, without using the stack
+        if remove_parents and 'parent' in node:
+            del node['parent']
+        keys = sorted(key for key in node.keys() if key != 'parent')
+        if not keys:
+            return '{}'
+        inner_newline = newline_at(level + 1)
+        parts = [inner_newline + encode_key(key) + encode_value(node[key], level + 1) for key in keys]
+        return '{' + item_separator.join(parts) + newline_at(level) + '}'
+
+    stack = [(tree_root, 0)]    # str chunks or (node, level) still to be written
+    while stack:
+        item = stack.pop()
+        if type(item) is str:
+            yield item
+            continue
+        node, level = item
+        if not isinstance(node, NODE_TYPES):
+            yield encode_value(node, level)
+            continue
+        children = node.get('children')
+        if not children or not isinstance(children, list):
+            yield encode_leaf(node, level)
+            continue
+        if remove_parents and 'parent' in node:
+            del node['parent']
+        keys = sorted(key for key in node.keys() if key != 'parent')
+        # build the list of things to write for this node, then push them in reverse
+        todo = []
+        chunk = '{'
+        for position, key in enumerate(keys):
+            if position > 0:
+                chunk += item_separator
+            chunk += newline_at(level + 1) + encode_key(key)
+            if key != 'children':
+                chunk += encode_value(node[key], level + 1)
+                continue
+            chunk += '['
+            child_newline = newline_at(level + 2)
+            for child_position, child in enumerate(children):
+                if child_position > 0:
+                    chunk += item_separator
+                chunk += child_newline
+                if isinstance(child, NODE_TYPES) and not child.get('children'):
+                    chunk += encode_leaf(child, level + 2)
+                else:
+                    todo.append(chunk)
+                    todo.append((child, level + 2))
+                    chunk = ''
+            chunk += newline_at(level + 1) + ']'
+        todo.append(chunk + newline_at(level) + '}')
+        stack.extend(reversed(todo))
+
+
+def write_web_resource_tree_json(tree_root, wrt_file, indent=2, compact=False, remove_parents=True):
+    """
+    Write the JSON for the web resource tree `tree_root` to the open file `wrt_file`.
+    See `iter_web_resource_tree_json` for the options.
+    """
+    batch = []
+    for chunk in iter_web_resource_tree_json(tree_root, indent=indent, compact=compact,
+                                             remove_parents=remove_parents):
+        batch.append(chunk)
+        if len(batch) >= WRITE_BATCH_SIZE:
+            wrt_file.write(''.join(batch))
+            batch = []
+    wrt_file.write(''.join(batch))
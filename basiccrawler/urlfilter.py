@@ -0,0 +1,104 @@
+"""
+Compiled matcher for the IGNORE_URLS patterns and SOURCE_DOMAINS checks.
+"""
+from collections import OrderedDict, defaultdict
+import re
+
+
+# Python 3.* compatible type for patterns in re
+try:
+    Pattern = re._pattern_type      # Py3.5, Py3.6
+except AttributeError:
+    Pattern = re.Pattern            # Py3.7
+
+# inline global flags like (?i) that must be at the start of a regex
+INLINE_FLAGS_RE = re.compile(r'\(\?[aiLmsux]+\)')
+
+
+
+class URLFilter(object):
+    """
+    Compiled form of a list of ignore patterns and a list of source domains.
+    Decides if a URL should be ignored with the same semantics as checking
+    each pattern in turn, but faster:
+      - string patterns are kept in a set (exact match)
+      - regular expressions are merged into one alternation per set of flags
+      - source domains are checked with a single `str.startswith(tuple)` call
+      - callables are checked last since they are the slowest
+    The decisions for the `cache_size` most recently seen URLs are cached, so
+    callable patterns are assumed to always give the same answer for a URL.
+    """
+
+    def __init__(self, ignore_patterns, source_domains, normalize=None, cache_size=100000):
+        self.exact_urls = set()
+        self.regexes = []
+        self.callables = []
+        mergeable_sources = defaultdict(list)   # flags --> regex source strings
+        for pattern in ignore_patterns:
+            if isinstance(pattern, str):
+                self.exact_urls.add(pattern)
+            elif isinstance(pattern, Pattern):
+                if pattern.groups == 0 and isinstance(pattern.pattern, str):
+                    mergeable_sources[pattern.flags].append(pattern.pattern)
+                else:
+                    # groups would be renumbered and break backreferences
+                    self.regexes.append(pattern)
+            elif callable(pattern):
+                self.callables.append(pattern)
+            else:
+                raise ValueError('Unrecognized pattern in IGNORE_URLS. Use strings, REs, or callables.')
+        for flags, sources in mergeable_sources.items():
+            self.regexes.extend(self.merge_regexes(sources, flags))
+        self.source_domains = tuple(source_domains)
+        self.normalize = normalize
+        self.cache_size = cache_size
+        self.cache = OrderedDict()      # url --> should ignore decision (LRU order)
+
+    @staticmethod
+    def merge_regexes(sources, flags):
+        """
+        Returns a list of compiled regexes equivalent to the regex `sources`.
+        """
+        # inline global flags would apply to all the merged regexes (Python < 3.11)
+        # or be an error (Python >= 3.11), so regexes that start with them are not merged
+        regexes = [re.compile(source, flags) for source in sources if INLINE_FLAGS_RE.match(source)]
+        sources = [source for source in sources if not INLINE_FLAGS_RE.match(source)]
+        if len(sources) <= 1:
+            return regexes + [re.compile(source, flags) for source in sources]
+        closing = '\n)' if flags & re.VERBOSE else ')'   # in case of trailing comment
+        merged = '|'.join('(?:' + source + closing for source in sources)
+        try:
+            return regexes + [re.compile(merged, flags)]
+        except re.error:
+            return regexes + [re.compile(source, flags) for source in sources]
+
+    def matches_ignore_patterns(self, url):
+        if url in self.exact_urls:
+            return True
+        for regex in self.regexes:
+            if regex.match(url):
+                return True
+        for pattern in self.callables:
+            if pattern(url):
+                return True
+        return False
+
+    def is_on_source_domain(self, url):
+        return url.startswith(self.source_domains)
+
+    def should_ignore(self, url):
+        """
+        Returns True if `url` matches one of the ignore patterns, or if it is not
+        on one of the source domains. Uses and updates the decisions cache.
+        """
+        cache = self.cache
+        decision = cache.get(url)
+        if decision is not None:
+            cache.move_to_end(url)
+            return decision
+        clean_url = self.normalize(url) if self.normalize else url
+        decision = self.matches_ignore_patterns(clean_url) or not self.is_on_source_domain(clean_url)
+        cache[url] = decision
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return decision
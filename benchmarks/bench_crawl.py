@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""
+Crawl a synthetic site served on localhost with BasicCrawler and the example
+crawlers, and report pages/sec, requests per page, peak memory, and the time
+spent saving the web resource tree. Results are saved as JSON, and can be
+compared with the results saved by another version using --compare.
+
+    python benchmarks/bench_crawl.py --pages 2000 --latency 0.01
+    python benchmarks/bench_crawl.py --compare benchmarks/results/crawl-0.3.3.json
+"""
+import argparse
+import asyncio
+from datetime import datetime
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCHMARKS_DIR, '..')
+sys.path.insert(0, REPO_DIR)
+sys.path.append(os.path.join(REPO_DIR, 'examples'))
+
+import basiccrawler
+from basiccrawler.crawler import BasicCrawler, LOGGER, aiohttp
+from basiccrawler.nodes import WebResource
+from synthetic_site import add_site_arguments, serve_site, site_from_arguments
+
+
+# metrics compared by --compare, and whether higher values are better
+COMPARED_METRICS = [('pages_per_sec', True), ('requests_per_page', False),
+                    ('peak_rss_mb', False), ('save_tree_seconds', False)]
+
+
+
+# BENCHMARK CASES
+################################################################################
+
+def make_crawler(crawler_class, base_url, **attrs):
+    """
+    Returns an instance of a subclass of `crawler_class` that crawls the site at `base_url`.
+    """
+    attrs.update(
+        MAIN_SOURCE_DOMAIN=base_url,
+        SOURCE_DOMAINS=[base_url],
+        IGNORE_URLS=[],
+        COLLECT_STATS=True,
+    )
+    return type(crawler_class.__name__, (crawler_class,), attrs)(start_page=base_url + '/')
+
+
+def takehome_crawler(base_url):
+    from takehome_crawler import TakeHomeCrawler
+    LOGGER.setLevel(logging.CRITICAL)   # the example sets the DEBUG level
+    return make_crawler(TakeHomeCrawler, base_url)
+
+
+CASES = {   # name --> (function that returns crawler, crawl kwargs)
+    'basic': (lambda base_url: make_crawler(BasicCrawler, base_url), {}),
+    'basic-workers': (lambda base_url: make_crawler(BasicCrawler, base_url), {'workers': 8}),
+    'basic-async': (lambda base_url: make_crawler(BasicCrawler, base_url), {'concurrency': 32}),
+    'basic-compact': (lambda base_url: make_crawler(BasicCrawler, base_url, NODE_CLASS=WebResource,
+                                                    COMPACT_SEEN_STORE=True, COMPACT_JSON_OUTPUT=True), {}),
+    'takehome': (takehome_crawler, {}),
+}
+
+
+def run_case(case_name, base_url, results):
+    """
+    Run the benchmark case `case_name` in a new directory so the HTTP cache is
+    empty. Runs in a child process so the peak memory of each case is measured
+    separately.
+    """
+    try:
+        os.chdir(tempfile.mkdtemp())
+        LOGGER.setLevel(logging.CRITICAL)    # don't time the logging of broken links
+        make, crawl_kwargs = CASES[case_name]
+        crawler = make(base_url)
+        crawl_kwargs = dict(crawl_kwargs, limit=None, devmode=False)
+        start = time.perf_counter()
+        if 'concurrency' in crawl_kwargs:
+            asyncio.run(crawler.acrawl(**crawl_kwargs))
+        else:
+            crawler.crawl(**crawl_kwargs)
+        elapsed = time.perf_counter() - start
+        stats = crawler.stats
+        results.put(dict(
+            elapsed=elapsed,
+            pages=stats.counters['pages'],
+            peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,  # KB on Linux
+            save_tree_seconds=stats.stages['save_tree'].sum,
+            stage_seconds={stage: round(histogram.sum, 4) for stage, histogram in stats.stages.items()},
+            counters=dict(stats.counters),
+        ))
+    except Exception:
+        results.put(dict(error=traceback.format_exc()))
+
+
+def run_benchmark(case_name, server, base_url):
+    server.request_counts.clear()
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=run_case, args=(case_name, base_url, results))
+    process.start()
+    result = results.get()
+    process.join()
+    if 'error' in result:
+        return result
+    requests_sent = sum(server.request_counts.values())
+    result.update(
+        pages_per_sec=result['pages'] / result['elapsed'],
+        requests=requests_sent,
+        requests_per_page=requests_sent / float(max(result['pages'], 1)),
+    )
+    return result
+
+
+
+# RESULTS
+################################################################################
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results, previous):
+    print('\nCompared to {} (commit {}):'.format(previous['version'], previous['commit']))
+    if previous['site'] != results['site']:
+        print('  (note: the sites crawled were generated with different parameters)')
+    for case_name, result in sorted(results['cases'].items()):
+        old = previous['cases'].get(case_name)
+        if not old or 'error' in old or 'error' in result:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS:
+            if old[metric]:
+                change = (result[metric] - old[metric]) / old[metric] * 100
+                better = (change > 0) == higher_is_better
+                changes.append('{} {:+.1f}%{}'.format(metric, change, '' if better or abs(change) < 5 else ' (!)'))
+        print('  {:15s} {}'.format(case_name, '   '.join(changes)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    add_site_arguments(parser)
+    parser.add_argument('--cases', nargs='+', default=sorted(CASES), choices=sorted(CASES),
+                        help='benchmark cases to run')
+    parser.add_argument('--output', help='JSON file for the results (default benchmarks/results/crawl-VERSION.json)')
+    parser.add_argument('--compare', help='JSON file of previous results to compare with')
+    args = parser.parse_args()
+
+    site = site_from_arguments(args)
+    server, base_url = serve_site(site, latency=args.latency)
+    results = dict(
+        version=basiccrawler.__version__,
+        commit=get_git_commit(),
+        date=datetime.now().isoformat(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        site=dict(site.params(), latency=args.latency,
+                  html_pages=len(site.pages), media_files=len(site.media)),
+        cases={},
+    )
+    print('Site with {} pages and {} media files at {}'.format(len(site.pages), len(site.media), base_url))
+    for case_name in args.cases:
+        if case_name == 'basic-async' and aiohttp is None:
+            print('  {:15s} skipped (needs aiohttp)'.format(case_name))
+            continue
+        result = run_benchmark(case_name, server, base_url)
+        results['cases'][case_name] = result
+        if 'error' in result:
+            print('  {:15s} FAILED\n{}'.format(case_name, result['error']))
+            continue
+        print('  {:15s} {:6d} pages {:8.1f} pages/s {:5.2f} requests/page {:7.1f} MB peak RSS {:7.3f} s saving tree'.format(
+            case_name, result['pages'], result['pages_per_sec'], result['requests_per_page'],
+            result['peak_rss_mb'], result['save_tree_seconds']))
+    server.shutdown()
+
+    output = args.output or os.path.join(BENCHMARKS_DIR, 'results', 'crawl-{}.json'.format(results['version']))
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2, sort_keys=True)
+    print('Results saved to', output)
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            print_comparison(results, json.load(previous_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Compare the speed of link extraction using a full BeautifulSoup tree (the old
+default `on_page` behaviour) with the fast `extract_title_and_links` tokenizer.
+
+    python benchmarks/bench_link_extraction.py --links 2000 --repeat 10
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup
+from basiccrawler.parsing import extract_links, extract_title, extract_title_and_links
+
+
+PAGE_URL = 'http://site.org/section/page.html'
+
+
+def make_page(num_links, num_nav_links=30):
+    """
+    Generate a plain HTML page with global nav links, text content, and links.
+    """
+    parts = ['<html><head><title>Benchmark page</title>',
+             '<script>var tpl = "<a href=\'/not-a-link\'>";</script></head><body><ul class="nav">']
+    for i in range(num_nav_links):
+        parts.append('<li><a href="/nav/item{}/">Nav {}</a></li>'.format(i, i))
+    parts.append('</ul><div class="maincontent">')
+    for i in range(num_links):
+        parts.append('<div class="item item-{i}"><h3>Item {i}</h3>'
+                     '<p>Some text about item {i} &amp; <b>bold</b> <span>words</span>.</p>'
+                     '<a class="more" href="../items/{i}.html">Read more</a></div>\n'.format(i=i))
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def soup_extract(html):
+    page = BeautifulSoup(html, "html.parser")
+    return (extract_title(page), extract_links(PAGE_URL, page))
+
+
+def fast_extract(html):
+    return extract_title_and_links(PAGE_URL, html)
+
+
+def timeit(fn, html, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(html)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--links', type=int, default=2000, help='number of content links on page')
+    parser.add_argument('--repeat', type=int, default=10, help='number of runs to average')
+    args = parser.parse_args()
+
+    html = make_page(args.links)
+    assert soup_extract(html) == fast_extract(html), 'extractors disagree'
+
+    soup_time = timeit(soup_extract, html, args.repeat)
+    fast_time = timeit(fast_extract, html, args.repeat)
+    print('page size:       {:.1f} KB'.format(len(html) / 1024.0))
+    print('BeautifulSoup:   {:.2f} ms/page'.format(soup_time * 1000))
+    print('fast extractor:  {:.2f} ms/page'.format(fast_time * 1000))
+    print('speedup:         {:.1f}x'.format(soup_time / fast_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Compare the memory used by web resource trees built from plain dicts (the default
+`NODE_CLASS`) with trees built from the slotted `WebResource` nodes.
+
+    python benchmarks/bench_nodes.py --nodes 1000000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from basiccrawler.nodes import WebResource
+from basiccrawler.treejson import write_web_resource_tree_json
+
+
+def build_tree(node_class, num_nodes, fanout=20):
+    """
+    Build a tree of `num_nodes` nodes like the ones created by `on_page` and
+    `create_media_url_dict`: every page has `fanout` children, of which one
+    in ten is a media file with a `content-type`. Node URLs are created before
+    the tree so that only the memory used by the nodes is measured.
+    """
+    urls = ['http://site.org/path/to/page{}.html'.format(i) for i in range(num_nodes)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    root = node_class(kind='PageWebResource', url=urls[0], children=[])
+    pages = [root]
+    count = 1
+    position = 0
+    while count < num_nodes:
+        parent = pages[position]
+        position += 1
+        for i in range(fanout):
+            if count >= num_nodes:
+                break
+            if i % 10 == 9:
+                node = node_class(kind='MediaWebResource', url=urls[count], children=[])
+                node['content-type'] = 'application/pdf'
+            else:
+                node = node_class(kind='PageWebResource', url=urls[count], children=[])
+                pages.append(node)
+            node.update({'parent': parent})
+            parent['children'].append(node)
+            count += 1
+    build_time = time.perf_counter() - start
+    del pages
+    gc.collect()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return root, memory, build_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--nodes', type=int, default=1000000, help='number of nodes in tree')
+    args = parser.parse_args()
+
+    results = {}
+    for node_class in [dict, WebResource]:
+        root, memory, build_time = build_tree(node_class, args.nodes)
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull:
+            write_web_resource_tree_json(root, devnull)
+        write_time = time.perf_counter() - start
+        results[node_class.__name__] = (memory, build_time, write_time)
+        del root
+        gc.collect()
+
+    print('nodes:  {}'.format(args.nodes))
+    for name, (memory, build_time, write_time) in results.items():
+        print('{:12s} {:6.1f} bytes/node   build {:.2f}s   write json {:.2f}s'.format(
+            name, memory / float(args.nodes), build_time, write_time))
+    dict_memory, web_resource_memory = results['dict'][0], results['WebResource'][0]
+    print('memory saved: {:.0f}%'.format(100.0 * (dict_memory - web_resource_memory) / dict_memory))
+    print('(build times are measured with tracemalloc on, which slows down allocations)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Compare the memory use and insert/lookup throughput of the URL seen counts kept
+in a dict of URL strings (the default) and in a FingerprintCounter.
+
+    python benchmarks/bench_seen_store.py --urls 1000000 10000000
+"""
+import argparse
+from collections import defaultdict
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from basiccrawler.seenstore import FingerprintCounter
+
+
+def make_url(i):
+    return 'http://site.org/section{}/path/to/page{}.html?lang=en'.format(i % 1000, i)
+
+
+def get_rss():
+    """
+    Returns the resident set size of this process in bytes (Linux only).
+    """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def run_case(store_name, num_urls, results):
+    """
+    Insert `num_urls` URLs, then look up `num_urls` URLs of which half were inserted.
+    Runs in a child process so the memory used by each case is measured separately.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    rss_before = get_rss()
+    if store_name == 'dict':
+        seen = defaultdict(int)
+    elif store_name == 'fingerprints':
+        seen = FingerprintCounter()
+    else:
+        seen = FingerprintCounter(path=os.path.join(tmp_dir, 'seen.bin'))
+
+    start = time.perf_counter()
+    for i in range(num_urls):
+        seen[make_url(i)] += 1
+    insert_time = time.perf_counter() - start
+    memory = get_rss() - rss_before
+
+    start = time.perf_counter()
+    found = 0
+    for i in range(num_urls // 2, num_urls + num_urls // 2):
+        if make_url(i) in seen:
+            found += 1
+    lookup_time = time.perf_counter() - start
+    assert found == num_urls // 2
+
+    start = time.perf_counter()
+    for i in range(num_urls):
+        make_url(i)
+    url_time = time.perf_counter() - start   # time spent creating URLs, not in the store
+    results.put((memory, insert_time - url_time, lookup_time - url_time))
+    if store_name == 'fingerprints (mmap)':
+        seen.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--urls', type=int, nargs='+', default=[1000000], help='number of URLs')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('fork')
+    for num_urls in args.urls:
+        print('urls: {}'.format(num_urls))
+        for store_name in ['dict', 'fingerprints', 'fingerprints (mmap)']:
+            results = context.Queue()
+            process = context.Process(target=run_case, args=(store_name, num_urls, results))
+            process.start()
+            memory, insert_time, lookup_time = results.get()
+            process.join()
+            print('  {:20s} {:6.1f} bytes/url   insert {:5.2f} M/s   lookup {:5.2f} M/s'.format(
+                store_name, memory / float(num_urls),
+                num_urls / insert_time / 1e6, num_urls / lookup_time / 1e6))
+    print('(URL creation time is excluded; mmap memory is the part of the file in RAM)')
+
+
+if __name__ == '__main__':
+    main()
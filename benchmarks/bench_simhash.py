@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Measure the time to compute SimHash fingerprints of pages, and the time to add
+and look up fingerprints in a SimHashIndex with up to a million pages.
+
+    python benchmarks/bench_simhash.py --pages 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from basiccrawler.simhash import FINGERPRINT_BITS, SimHashIndex, extract_visible_text, simhash
+
+
+def make_page(rnd, num_words=500):
+    words = ' '.join('word{}'.format(rnd.randrange(20000)) for _ in range(num_words))
+    return ('<html><head><title>Page</title><script>var x = 1;</script></head>'
+            '<body><div class="nav"><a href="/">Home</a></div><p>' + words + '</p></body></html>')
+
+
+def flip_bits(fingerprint, rnd, num_bits):
+    for bit in rnd.sample(range(FINGERPRINT_BITS), num_bits):
+        fingerprint ^= 1 << bit
+    return fingerprint
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--pages', type=int, default=1000000, help='number of fingerprints in the index')
+    parser.add_argument('--lookups', type=int, default=100000, help='number of lookups')
+    parser.add_argument('--max-distance', type=int, default=3, help='DUPLICATE_MAX_DISTANCE')
+    args = parser.parse_args()
+    rnd = random.Random(0)
+
+    pages = [make_page(rnd) for _ in range(200)]
+    start = time.perf_counter()
+    for html in pages:
+        simhash(extract_visible_text(html))
+    print('simhash of 500-word page:    {:7.2f} ms'.format((time.perf_counter() - start) / len(pages) * 1000))
+
+    # random fingerprints stand in for the fingerprints of distinct pages
+    fingerprints = [rnd.getrandbits(FINGERPRINT_BITS) for _ in range(args.pages)]
+    index = SimHashIndex(max_distance=args.max_distance)
+    start = time.perf_counter()
+    for i, fingerprint in enumerate(fingerprints):
+        index.add(fingerprint, i)
+    add_time = time.perf_counter() - start
+    print('add {} fingerprints:     {:7.2f} us each'.format(args.pages, add_time / args.pages * 1e6))
+
+    queries = [rnd.getrandbits(FINGERPRINT_BITS) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    found = sum(1 for query in queries if index.find(query) is not None)
+    miss_time = time.perf_counter() - start
+    print('lookup (new page):           {:7.2f} us each  ({} false matches)'.format(
+        miss_time / args.lookups * 1e6, found))
+
+    queries = [flip_bits(rnd.choice(fingerprints), rnd, args.max_distance) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    found = sum(1 for query in queries if index.find(query) is not None)
+    hit_time = time.perf_counter() - start
+    print('lookup (near-duplicate):     {:7.2f} us each  ({} of {} found)'.format(
+        hit_time / args.lookups * 1e6, found, args.lookups))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Time the web resource tree utilities on a very deep tree (a chain of "next page"
+links) and on a very wide tree, and compare with recursive tree walks.
+
+    python benchmarks/bench_traversal.py --depth 100000 --width 1000000
+"""
+import argparse
+from collections import Counter
+import contextlib
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from basiccrawler.crawler import BasicCrawler
+
+
+SITE = 'http://site.org'
+
+
+def make_deep_tree(depth):
+    root = node = dict(kind='PageWebResource', url=SITE + '/page/0', children=[])
+    for i in range(1, depth):
+        child = dict(kind='PageWebResource', url=SITE + '/page/' + str(i), children=[], parent=node)
+        node['children'].append(child)
+        node = child
+    return root
+
+
+def make_wide_tree(width):
+    root = dict(kind='PageWebResource', url=SITE + '/', children=[])
+    for i in range(width):
+        kind = 'MediaWebResource' if i % 10 == 0 else 'PageWebResource'
+        child = dict(kind=kind, url=SITE + '/section' + str(i % 100) + '/' + str(i), children=[], parent=root)
+        root['children'].append(child)
+    return root
+
+
+def recursive_cleanup(subtree):
+    if 'parent' in subtree:
+        del subtree['parent']
+    for child in subtree['children']:
+        recursive_cleanup(child)
+
+
+def recursive_subtree_stats(subtree, counter):
+    counter[subtree['kind']] += 1
+    for child in subtree['children']:
+        recursive_subtree_stats(child, counter)
+    return counter
+
+
+def timed(fn):
+    start = time.perf_counter()
+    try:
+        fn()
+    except RecursionError:
+        return 'RecursionError'
+    return '{:.2f}s'.format(time.perf_counter() - start)
+
+
+def run_cases(crawler, make_tree, size):
+    tree = make_tree(size)
+    recursive_cleanup_tree = make_tree(size)
+    crawler.global_urls_seen_count = Counter(SITE + '/page/' + str(i) for i in range(0, size, 2))
+    crawler.urls_visited = {SITE + '/page/0': 'visited'}
+    crawler.global_nav_index = None
+    results = [
+        ('recursive subtree stats', timed(lambda: recursive_subtree_stats(tree, Counter()))),
+        ('recursive cleanup', timed(lambda: recursive_cleanup(recursive_cleanup_tree))),
+        ('cleanup_web_resource_tree', timed(lambda: crawler.cleanup_web_resource_tree(tree))),
+        ('compute_subtree_stats', timed(lambda: crawler.compute_subtree_stats(tree))),
+        ('infer_tree_structure', timed(lambda: crawler.infer_tree_structure(tree))),
+    ]
+    global_nav = {}
+    def infer_global_nav():
+        global_nav['nodes'] = crawler.infer_gloabal_nav(tree)
+    results.append(('infer_gloabal_nav', timed(infer_global_nav)))
+    results.append(('remove_global_nav', timed(lambda: crawler.remove_global_nav(tree, global_nav['nodes']))))
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        results.append(('print_tree', timed(lambda: crawler.print_tree(tree, print_depth=3))))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--depth', type=int, default=100000, help='depth of the deep tree')
+    parser.add_argument('--width', type=int, default=1000000, help='number of children in the wide tree')
+    args = parser.parse_args()
+    logging.getLogger('crawler').setLevel(logging.WARNING)
+
+    crawler = BasicCrawler(main_source_domain=SITE)
+    for name, make_tree, size in [('deep', make_deep_tree, args.depth), ('wide', make_wide_tree, args.width)]:
+        print('{} tree ({} nodes):'.format(name, size))
+        for case, result in run_cases(crawler, make_tree, size):
+            print('  {:28s} {}'.format(case, result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+"""
+Generate a synthetic website and serve it on localhost, to benchmark crawlers
+without depending on live sites. Pages use the markup expected by the
+`TakeHomeCrawler` example: a tree of topic pages whose children are listed in
+`<div class="maincontent">` as `<li class="{kind}-kind"><a href=...>` items.
+
+    python benchmarks/synthetic_site.py --pages 1000 --fanout 8 --port 8000
+"""
+import argparse
+import hashlib
+import http.server
+import random
+import socketserver
+import threading
+import time
+
+
+MEDIA_FILES = [     # (extension, content type, kind)
+    ('pdf', 'application/pdf', 'document'),
+    ('mp4', 'video/mp4', 'video'),
+    ('mp3', 'audio/mpeg', 'audio'),
+]
+MEDIA_CONTENT = b'0' * 2048
+WORDS = ('lesson learning activity student teacher science math reading history '
+         'water energy number shape story question answer example practice').split()
+
+
+
+class SyntheticSite(object):
+    """
+    Website with `num_pages` HTML pages (topic and content pages) arranged in a
+    tree: each topic page links to `fanout` children, down to `depth` levels
+    below the home page (or until `num_pages` pages exist).
+    Of the child links, a fraction `media_ratio` are media files and a fraction
+    `broken_ratio` return 404. A fraction `global_nav_ratio` of the links on
+    each page are global navigation links, which are the same on all pages.
+    The same arguments and `seed` always give the same site.
+    """
+
+    def __init__(self, num_pages=1000, fanout=8, depth=6, global_nav_ratio=0.3,
+                 media_ratio=0.1, broken_ratio=0.02, words_per_page=300, seed=0):
+        self.num_pages = num_pages
+        self.fanout = fanout
+        self.depth = depth
+        self.global_nav_ratio = global_nav_ratio
+        self.media_ratio = media_ratio
+        self.broken_ratio = broken_ratio
+        self.words_per_page = words_per_page
+        self.seed = seed
+        self.pages = {}         # path --> html
+        self.media = {}         # path --> content type
+        self.generate()
+
+    def params(self):
+        return dict(num_pages=self.num_pages, fanout=self.fanout, depth=self.depth,
+                    global_nav_ratio=self.global_nav_ratio, media_ratio=self.media_ratio,
+                    broken_ratio=self.broken_ratio, words_per_page=self.words_per_page,
+                    seed=self.seed)
+
+    def generate(self):
+        rnd = random.Random(self.seed)
+        num_nav_links = 0
+        if self.global_nav_ratio > 0:
+            num_nav_links = max(1, int(round(self.global_nav_ratio * self.fanout / (1 - self.global_nav_ratio))))
+        nav_paths = ['/nav/{}.html'.format(i) for i in range(num_nav_links)]
+        nav_html = ''.join('<li><a href="{}">Nav {}</a></li>'.format(path, i) for i, path in enumerate(nav_paths))
+
+        # build the tree breadth first: (path, kind, depth, children)
+        root = ('/', 'channel', 0, [])
+        nodes = [root]
+        num_html_pages = 1 + len(nav_paths)
+        next_id = 0
+        position = 0
+        while position < len(nodes) and num_html_pages < self.num_pages:
+            path, kind, depth, children = nodes[position]
+            position += 1
+            if kind not in ('channel', 'topic') or depth >= self.depth:
+                continue
+            for _ in range(self.fanout):
+                if num_html_pages >= self.num_pages:
+                    break
+                next_id += 1
+                draw = rnd.random()
+                if draw < self.broken_ratio:
+                    children.append(('/missing/{}.html'.format(next_id), 'document', depth + 1, []))
+                elif draw < self.broken_ratio + self.media_ratio:
+                    extension, content_type, media_kind = rnd.choice(MEDIA_FILES)
+                    child_path = '/media/{}.{}'.format(next_id, extension)
+                    self.media[child_path] = content_type
+                    children.append((child_path, media_kind, depth + 1, []))
+                else:
+                    child_kind = 'topic' if depth + 1 < self.depth and rnd.random() < 0.5 else 'document'
+                    child = ('/{}/{}.html'.format(child_kind, next_id), child_kind, depth + 1, [])
+                    children.append(child)
+                    nodes.append(child)
+                    num_html_pages += 1
+
+        for path, kind, depth, children in nodes:
+            if kind in ('channel', 'topic', 'document'):
+                self.pages[path] = self.make_page(rnd, path, nav_html, children)
+        for path in nav_paths:
+            self.pages[path] = self.make_page(rnd, path, nav_html, [])
+
+    def make_page(self, rnd, path, nav_html, children):
+        text = ' '.join(rnd.choice(WORDS) for _ in range(self.words_per_page))
+        items = ''.join('<li class="{}-kind"><a href="{}">{}</a></li>'.format(kind, child_path, child_path)
+                        for child_path, kind, _, _ in children)
+        return ('<!DOCTYPE html><html><head><title>Page ' + path + '</title>'
+                '<script>var page = "' + path + '";</script></head><body>'
+                '<ul class="nav">' + nav_html + '</ul>'
+                '<div class="maincontent"><h1>' + path + '</h1><p>' + text + '</p>'
+                '<ul>' + items + '</ul></div></body></html>')
+
+
+
+# LOCAL SERVER
+################################################################################
+
+class SyntheticSiteHandler(http.server.BaseHTTPRequestHandler):
+    site = None
+    latency = 0.0
+    request_counts = None   # method --> number of requests
+    status_counts = None    # status code --> number of responses
+    counts_lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, status, content_type, body, send_content, etag=None):
+        with self.counts_lock:
+            self.request_counts[self.command] = self.request_counts.get(self.command, 0) + 1
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        if status == 304:
+            self.end_headers()
+            return
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_content:
+            self.wfile.write(body)
+
+    def respond(self, send_content):
+        path = self.path.split('?')[0].split('#')[0]
+        if path in self.site.pages:
+            body = self.site.pages[path].encode('utf-8')
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            status = 304 if self.headers.get('If-None-Match') == etag else 200
+            self.send_body(status, 'text/html; charset=utf-8', body, send_content, etag=etag)
+        elif path in self.site.media:
+            self.send_body(200, self.site.media[path], MEDIA_CONTENT, send_content)
+        else:
+            self.send_body(404, 'text/html', b'<html><body>Not found</body></html>', send_content)
+
+    def do_GET(self):
+        self.respond(True)
+
+    def do_HEAD(self):
+        self.respond(False)
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+def serve_site(site, latency=0.0, port=0, handler_class=SyntheticSiteHandler):
+    """
+    Serve `site` on localhost from a background thread, waiting `latency` seconds
+    before each response. Returns (server, base_url). The number of requests of
+    each method is counted in `server.request_counts`, and the number of responses
+    of each status code in `server.status_counts`. Pages are served with an `ETag`
+    and a `304 Not Modified` response to matching `If-None-Match` requests.
+    """
+    handler = type('Handler', (handler_class,), dict(site=site, latency=latency, request_counts={},
+                                                     status_counts={}))
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.request_counts = handler.request_counts
+    server.status_counts = handler.status_counts
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+def add_site_arguments(parser):
+    parser.add_argument('--pages', type=int, default=1000, help='number of HTML pages')
+    parser.add_argument('--fanout', type=int, default=8, help='links to child pages per topic page')
+    parser.add_argument('--depth', type=int, default=6, help='max depth of the site tree')
+    parser.add_argument('--global-nav-ratio', type=float, default=0.3, help='fraction of links that are global nav')
+    parser.add_argument('--media-ratio', type=float, default=0.1, help='fraction of child links to media files')
+    parser.add_argument('--broken-ratio', type=float, default=0.02, help='fraction of child links that are broken')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before each response')
+    parser.add_argument('--seed', type=int, default=0, help='random seed used to generate the site')
+
+
+def site_from_arguments(args):
+    return SyntheticSite(num_pages=args.pages, fanout=args.fanout, depth=args.depth,
+                         global_nav_ratio=args.global_nav_ratio, media_ratio=args.media_ratio,
+                         broken_ratio=args.broken_ratio, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    add_site_arguments(parser)
+    parser.add_argument('--port', type=int, default=8000, help='port to serve the site on')
+    args = parser.parse_args()
+    site = site_from_arguments(args)
+    server, base_url = serve_site(site, latency=args.latency, port=args.port)
+    print('Serving {} pages and {} media files at {}/ (Ctrl-C to stop)'.format(
+        len(site.pages), len(site.media), base_url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
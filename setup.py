@@ -18,6 +18,10 @@ requirements = [
     "youtube_dl>=2020.6.6",
 ]
 
+extras_requirements = {
+    'async': ['aiohttp>=3.3.0'],   # for BasicCrawler.acrawl
+}
+
 test_requirements = [
     'pytest>=5.3.5',
 ]
@@ -33,6 +37,7 @@ setup(
     packages=find_packages(include=['basiccrawler']),
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras_requirements,
     license="MIT license",
     zip_safe=False,
     keywords='basiccrawler',
@@ -42,7 +47,6 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
         'Programming Language :: Python :: 3.5',
         'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
@@ -0,0 +1,54 @@
+"""
+Fixtures to crawl the synthetic site of the benchmarks served on localhost.
+"""
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from basiccrawler.crawler import BasicCrawler, LOGGER
+from synthetic_site import SyntheticSite, serve_site
+
+
+@pytest.fixture(autouse=True)
+def crawl_dir(tmp_path, monkeypatch):
+    """
+    Run each test in a new directory, so the HTTP cache and outputs start empty.
+    """
+    monkeypatch.chdir(tmp_path)
+    LOGGER.setLevel(logging.CRITICAL)
+    return tmp_path
+
+
+@pytest.fixture(scope='session')
+def site():
+    return SyntheticSite(num_pages=60, fanout=5, depth=4, words_per_page=40, seed=1)
+
+
+@pytest.fixture(scope='session')
+def site_server(site):
+    server, base_url = serve_site(site)
+    server.base_url = base_url
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def make_crawler(site_server):
+    """
+    Returns a function that returns a crawler for the synthetic site, with the
+    keyword arguments as class attributes, e.g. `make_crawler(MAX_RETRIES=2)`.
+    """
+    def make(crawler_class=BasicCrawler, base_url=None, **attrs):
+        base_url = base_url or site_server.base_url
+        attrs.update(
+            MAIN_SOURCE_DOMAIN=base_url,
+            SOURCE_DOMAINS=[base_url],
+            IGNORE_URLS=[],
+        )
+        return type(crawler_class.__name__, (crawler_class,), attrs)(start_page=base_url + '/')
+    return make
+
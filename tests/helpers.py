@@ -0,0 +1,31 @@
+"""
+Functions shared by the crawl tests.
+"""
+import asyncio
+import json
+
+from basiccrawler.nodes import WebResource, to_dict_tree
+from basiccrawler.traversal import iter_nodes
+
+
+def crawl(crawler, **kwargs):
+    kwargs.setdefault('save_web_resource_tree', False)
+    return crawler.crawl(devmode=False, **kwargs)
+
+
+def acrawl(crawler, **kwargs):
+    kwargs.setdefault('save_web_resource_tree', False)
+    return asyncio.run(crawler.acrawl(devmode=False, **kwargs))
+
+
+def tree_json(tree):
+    if isinstance(tree, WebResource):
+        tree = to_dict_tree(tree)
+    return json.dumps(tree, sort_keys=True)
+
+
+def find_node(tree, url):
+    for node in iter_nodes(tree):
+        if node.get('url') == url:
+            return node
+    return None
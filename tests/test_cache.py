@@ -0,0 +1,99 @@
+"""
+The SQLite HTTP cache, its eviction and the import of FileCache directories.
+"""
+import os
+import zlib
+
+import pytest
+from cachecontrol.caches import FileCache
+
+from basiccrawler import cache as cache_module
+from basiccrawler.cache import SQLiteCache, import_file_cache
+
+from .helpers import crawl, tree_json
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A fake `time` module for the cache module, whose clock only moves when told to.
+    """
+    class Clock(object):
+        now = 1000000.0
+
+        def time(self):
+            return self.now
+
+    fake_clock = Clock()
+    monkeypatch.setattr(cache_module, 'time', fake_clock)
+    return fake_clock
+
+
+def test_values_are_compressed(crawl_dir):
+    cache = SQLiteCache('cache/responses.sqlite3')
+    value = b'<html>' + b'hello world ' * 1000 + b'</html>'
+    cache.set('http://a/', value)
+    assert cache.get('http://a/') == value
+    assert cache.get('http://b/') is None
+    stored, size = cache.conn.execute('SELECT value, size FROM responses').fetchone()
+    assert zlib.decompress(stored) == value and size == len(stored) < len(value) / 10
+    cache.close()
+    reopened = SQLiteCache('cache/responses.sqlite3')
+    assert reopened.get('http://a/') == value
+    assert reopened.total_size == size
+    reopened.delete('http://a/')
+    assert reopened.get('http://a/') is None and reopened.total_size == 0
+
+
+def test_expired_values(clock):
+    cache = SQLiteCache('responses.sqlite3')
+    cache.set('http://a/', b'a', expires=10)
+    cache.set('http://b/', b'b')
+    clock.now += 11
+    assert cache.get('http://a/') is None
+    assert cache.get('http://b/') == b'b'
+
+
+def test_least_recently_used_are_evicted(clock):
+    values = dict((name, os.urandom(1000)) for name in 'abcd')   # ~1011 bytes compressed
+    cache = SQLiteCache('responses.sqlite3', max_size=3500)
+    for name in 'abc':
+        clock.now += 1
+        cache.set(name, values[name])
+    clock.now += 1
+    assert cache.get('a') == values['a']
+    clock.now += 1
+    cache.set('d', values['d'])
+    assert cache.get('b') is None
+    assert [cache.get(name) for name in 'acd'] == [values[name] for name in 'acd']
+    assert cache.total_size == cache.conn.execute('SELECT SUM(size) FROM responses').fetchone()[0] <= 3500
+
+
+def test_old_values_are_evicted(clock):
+    cache = SQLiteCache('responses.sqlite3', max_age=60)
+    cache.set('old', b'old')
+    clock.now += 30
+    cache.set('new', b'new')
+    clock.now += 31
+    cache.set('newest', b'newest')
+    assert [cache.get(name) for name in ['old', 'new', 'newest']] == [None, b'new', b'newest']
+    assert cache.total_size == cache.conn.execute('SELECT SUM(size) FROM responses').fetchone()[0]
+
+
+def test_import_file_cache(crawl_dir):
+    file_cache = FileCache('.webcache')
+    values = dict(('http://site/' + str(i), os.urandom(100)) for i in range(7))
+    for key, value in values.items():
+        file_cache.set(key, value)
+    (crawl_dir / '.webcache' / 'README').write_text('not a cache entry')
+    cache = SQLiteCache('.webcache.sqlite3')
+    assert import_file_cache('.webcache', cache, batch_size=3) == len(values)
+    assert all(cache.get(key) == value for key, value in values.items())
+
+
+def test_crawl_with_sqlite_cache(make_crawler):
+    expected = tree_json(crawl(make_crawler()))
+    crawler = make_crawler(CACHE=SQLiteCache('.webcache.sqlite3'))
+    assert tree_json(crawl(crawler)) == expected
+    assert crawler.CACHE.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0] > 0
+    assert tree_json(crawl(crawler)) == expected
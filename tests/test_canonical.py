@@ -0,0 +1,81 @@
+"""
+With a `URL_CANONICALIZER`, the different ways of writing a URL are crawled once.
+"""
+import copy
+
+import pytest
+
+from basiccrawler.canonical import SESSION_PARAMS, TRACKING_PARAMS, URLCanonicalizer, remove_dot_segments
+from synthetic_site import serve_site
+
+from .helpers import crawl, tree_json
+
+
+@pytest.mark.parametrize('url, canonical_url', [
+    ('HTTP://Site.ORG:80/a/./b/../c?b=2&a=1#top', 'http://site.org/a/c?a=1&b=2#top'),
+    ('https://site.org:443', 'https://site.org/'),
+    ('https://site.org:8443/', 'https://site.org:8443/'),
+    ('http://User@Site.org/%7euser/a%2fb', 'http://User@site.org/~user/a%2Fb'),
+    ('http://site.org/?utm_source=news&id=3&gclid=x&PHPSESSID=1', 'http://site.org/?id=3'),
+    ('http://site.org/?b=1&a=2&b=0', 'http://site.org/?a=2&b=1&b=0'),
+    ('http://site.org/about/', 'http://site.org/about/'),
+    ('mailto:Someone@Site.ORG', 'mailto:Someone@Site.ORG'),
+])
+def test_canonicalize(url, canonical_url):
+    canonicalizer = URLCanonicalizer(drop_params=TRACKING_PARAMS + SESSION_PARAMS)
+    assert canonicalizer.canonicalize(url) == canonical_url
+    assert canonicalizer.canonicalize(canonical_url) == canonical_url
+
+
+def test_canonicalize_options():
+    canonicalizer = URLCanonicalizer(sort_params=False, lowercase_host=False, remove_trailing_slash=True)
+    assert canonicalizer.canonicalize('http://Site.org/about/?b=1&a=2') == 'http://Site.org/about?b=1&a=2'
+    assert canonicalizer.canonicalize('http://site.org/') == 'http://site.org/'
+    with pytest.raises(ValueError):
+        URLCanonicalizer(drop_params=[3])
+
+
+def test_remove_dot_segments():
+    assert remove_dot_segments('/a/b/../c/./d') == '/a/c/d'
+    assert remove_dot_segments('/a/b/..') == '/a/'
+    assert remove_dot_segments('/../../a') == '/a'
+
+
+@pytest.fixture(scope='module')
+def variants_server(site):
+    """
+    The synthetic site with links to variants of a topic page added to the home page.
+    """
+    site = copy.deepcopy(site)
+    site.page_path = next(path for path in sorted(site.pages) if path.startswith('/topic/'))
+    encoded_path = '/topic/' + ''.join('%{:02x}'.format(ord(char)) for char in site.page_path[len('/topic/'):])
+    site.variants = [site.page_path + '?utm_source=news', site.page_path + '?b=2&a=1',
+                     site.page_path + '?a=1&b=2', encoded_path]
+    links = ''.join('<li><a href="' + path + '">Variant</a></li>' for path in site.variants)
+    site.pages['/'] = site.pages['/'].replace('</ul></div>', links + '</ul></div>')
+    server, base_url = serve_site(site)
+    server.base_url = base_url
+    server.site = site
+    yield server
+    server.shutdown()
+
+
+def requested_variants(crawler, server):
+    requested_urls = []
+    crawler.add_hook('before_request', lambda url, method, kwargs: requested_urls.append((method, url)))
+    tree = tree_json(crawl(crawler))
+    page_urls = [server.base_url + path for path in [server.site.page_path] + server.site.variants]
+    return tree, sorted(set(url for method, url in requested_urls if url in page_urls))
+
+
+def test_crawl_with_canonicalizer(variants_server, make_crawler):
+    base_url = variants_server.base_url
+    page_url = base_url + variants_server.site.page_path
+    tree, requested = requested_variants(make_crawler(base_url=base_url), variants_server)
+    assert len(requested) == 5
+
+    crawler = make_crawler(base_url=base_url, URL_CANONICALIZER=URLCanonicalizer(drop_params=TRACKING_PARAMS))
+    canonical_tree, requested = requested_variants(crawler, variants_server)
+    assert requested == [page_url, page_url + '?a=1&b=2']
+    assert crawler.duplicate_fetches_prevented == 3
+    assert canonical_tree.count('"url": "' + page_url + '?a=1&b=2"') == 1
@@ -0,0 +1,66 @@
+"""
+A crawl stopped by Ctrl-C or by an error continues from its last checkpoint
+with `crawl(resume=True)` and gives the same tree as an uninterrupted crawl.
+"""
+import pytest
+
+from basiccrawler.crawler import BasicCrawler
+
+from .helpers import crawl, tree_json
+
+
+class StoppingCrawler(BasicCrawler):
+    """
+    Simulates pressing Ctrl-C (or an error) after `stop_after` crawl steps.
+    """
+    CHECKPOINT_EVERY = 5
+    stop_after = None
+    stop_with_error = False
+    steps = 0
+
+    def end_crawl_step(self, context, counter):
+        self.steps += 1
+        if self.stop_after and self.steps == self.stop_after:
+            if self.stop_with_error:
+                raise RuntimeError('Crawl crashed')
+            self.stop_requested = True
+        super().end_crawl_step(context, counter)
+
+
+@pytest.mark.parametrize('stop_with_error', [False, True])
+@pytest.mark.parametrize('kwargs', [{}, {'workers': 3}])
+def test_resume_gives_same_tree(make_crawler, stop_with_error, kwargs):
+    uninterrupted = make_crawler(StoppingCrawler)
+    expected = tree_json(crawl(uninterrupted))
+    crawler = make_crawler(StoppingCrawler, stop_after=13, stop_with_error=stop_with_error)
+    expected_error = RuntimeError if stop_with_error else KeyboardInterrupt
+    with pytest.raises(expected_error):
+        crawl(crawler, checkpoint=True, **kwargs)
+    resumed = make_crawler(StoppingCrawler)
+    assert tree_json(crawl(resumed, resume=True, **kwargs)) == expected
+    # continued from the checkpoint at step 13 (Ctrl-C) or at step 10 (error)
+    checkpoint_steps = 10 if stop_with_error else 13
+    assert resumed.steps == uninterrupted.steps - checkpoint_steps
+
+
+def test_resume_without_saved_state(make_crawler):
+    expected = tree_json(crawl(make_crawler()))
+    assert tree_json(crawl(make_crawler(), resume=True)) == expected
+
+
+def test_resume_after_finished_crawl_starts_over(make_crawler):
+    crawler = make_crawler(StoppingCrawler)
+    expected = tree_json(crawl(crawler, checkpoint=True))
+    resumed = make_crawler(StoppingCrawler)
+    assert tree_json(crawl(resumed, resume=True)) == expected
+    assert resumed.steps == crawler.steps
+
+
+def test_resume_after_limit(make_crawler):
+    uninterrupted = make_crawler(StoppingCrawler)
+    expected = tree_json(crawl(uninterrupted))
+    crawler = make_crawler(StoppingCrawler)
+    crawl(crawler, checkpoint=True, limit=5)
+    resumed = make_crawler(StoppingCrawler)
+    assert tree_json(crawl(resumed, resume=True)) == expected
+    assert resumed.steps == uninterrupted.steps - crawler.steps
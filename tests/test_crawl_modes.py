@@ -0,0 +1,76 @@
+"""
+All the ways of running a crawl give the same tree as the sequential crawl.
+"""
+import threading
+
+import pytest
+
+from basiccrawler.crawler import BasicCrawler
+from basiccrawler.nodes import WebResource
+from basiccrawler.traversal import iter_nodes
+
+from .helpers import acrawl, crawl, tree_json
+
+
+class ThreadRecordingCrawler(BasicCrawler):
+    """
+    Records the threads that downloaded (and parsed) the pages.
+    """
+    def fetch_url(self, url):
+        self.fetch_threads.add(threading.current_thread().name)
+        return super().fetch_url(url)
+
+
+@pytest.fixture
+def sequential_tree(make_crawler, site):
+    tree = tree_json(crawl(make_crawler()))
+    assert all('/' + path.lstrip('/') + '"' in tree for path in list(site.pages) + list(site.media))
+    return tree
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'workers': 4},
+    {'parse_processes': 2},
+    {'workers': 4, 'parse_processes': 2},
+    {'shards': 2},
+    {'shards': 2, 'workers': 3},
+])
+def test_crawl_gives_sequential_tree(make_crawler, sequential_tree, kwargs):
+    assert tree_json(crawl(make_crawler(), **kwargs)) == sequential_tree
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'parse_processes': 2}])
+def test_acrawl_gives_sequential_tree(make_crawler, sequential_tree, kwargs):
+    assert tree_json(acrawl(make_crawler(), **kwargs)) == sequential_tree
+
+
+@pytest.mark.parametrize('attrs', [
+    {'SINGLE_REQUEST_FETCH': True},
+    {'FAST_LINK_EXTRACTION': False},
+    {'NODE_CLASS': WebResource},
+])
+def test_crawler_options_give_sequential_tree(make_crawler, sequential_tree, attrs):
+    assert tree_json(crawl(make_crawler(**attrs), workers=2)) == sequential_tree
+
+
+def test_parse_processes_parse_ahead(make_crawler, sequential_tree):
+    crawler = make_crawler(ThreadRecordingCrawler)
+    crawler.fetch_threads = set()
+    assert tree_json(crawl(crawler, parse_processes=2)) == sequential_tree
+    assert crawler.fetch_threads
+    assert threading.current_thread().name not in crawler.fetch_threads
+
+
+@pytest.mark.parametrize('crawl_function', [crawl, acrawl])
+def test_guess_media_from_extension(make_crawler, site, crawl_function):
+    def nodes(tree):
+        return sorted((node['url'], node['kind']) for node in iter_nodes(tree) if 'kind' in node)
+    expected = nodes(crawl(make_crawler()))
+    crawler = make_crawler(GUESS_MEDIA_FROM_EXTENSION=True)
+    requested_urls = []
+    crawler.add_hook('before_request', lambda url, method, kwargs: requested_urls.append(url))
+    tree = crawl_function(crawler)
+    assert nodes(tree) == expected
+    assert site.media and not [url for url in requested_urls if '/media/' in url]
+    media_node = next(node for node in iter_nodes(tree) if node.get('kind') == 'MediaWebResource')
+    assert 'content-type' not in media_node
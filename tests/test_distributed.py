@@ -0,0 +1,163 @@
+"""
+Sharded crawls give the same tree as sequential crawls, see `crawl(shards=N)`.
+"""
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from basiccrawler.cache import ParsedPageCache, SQLiteCache
+from basiccrawler.crawler import BasicCrawler
+from basiccrawler.distributed import (INHERITED_STORES, get_instance_config, make_remote_worker_crawler,
+                                      reopen_after_fork, shard_by_host, shard_by_url)
+from basiccrawler.nodes import WebResource
+
+from .helpers import crawl, find_node, tree_json
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAILING_PATH = '/topic/2.html'
+
+
+class PageRecordingCrawler(BasicCrawler):
+    """
+    Records the pages received by the handler in the coordinator.
+    """
+    def on_page(self, url, page, context):
+        self.pages.append(page)
+        return super().on_page(url, page, context)
+
+
+class DyingWorkerCrawler(BasicCrawler):
+    """
+    The first worker to download `FAILING_PATH` exits, or all the workers that
+    download it with `ALWAYS_DIE`.
+    """
+    ALWAYS_DIE = False
+
+    def fetch_url(self, url):
+        if url.endswith(FAILING_PATH):
+            try:
+                if not self.ALWAYS_DIE:
+                    os.close(os.open('died', os.O_CREAT | os.O_EXCL))
+                os._exit(1)
+            except FileExistsError:
+                pass
+        return super().fetch_url(url)
+
+
+class RaisingWorkerCrawler(BasicCrawler):
+    def fetch_url(self, url):
+        if url.endswith(FAILING_PATH):
+            raise ValueError('Bug in fetch_url')
+        return super().fetch_url(url)
+
+
+class RemoteCrawler(BasicCrawler):
+    """
+    Crawler for remote workers, imported by `python -m basiccrawler.distributed`.
+    """
+    COORDINATOR_AUTHKEY = 'secret'
+    START_LOCAL_WORKERS = False
+
+
+def test_reopen_after_fork(crawl_dir):
+    cache = SQLiteCache(str(crawl_dir / 'cache.sqlite3'))
+    cache.set('key', b'value')
+    connection = cache.conn
+    reopen_after_fork(cache)
+    assert cache.conn is None
+    assert connection in INHERITED_STORES
+    assert isinstance(cache.lock, type(threading.Lock()))
+    assert cache.get('key') == b'value'
+    assert cache.conn is not connection
+
+
+def test_sharded_crawl_with_sqlite_caches(make_crawler, crawl_dir):
+    expected = tree_json(crawl(make_crawler()))
+    crawler = make_crawler(CACHE=SQLiteCache(str(crawl_dir / 'cache.sqlite3')),
+                           PARSED_PAGES_CACHE=ParsedPageCache(str(crawl_dir / 'pages.sqlite3')))
+    crawler.CACHE.connect()     # opened in the coordinator before the workers are forked
+    crawler.PARSED_PAGES_CACHE.connect()
+    assert tree_json(crawl(crawler, shards=2, workers=2)) == expected
+    assert tree_json(crawl(crawler, shards=2, workers=2)) == expected   # from the cache
+
+
+def test_shard_by_host_with_rate_limits(make_crawler):
+    for attrs, shard_fn in [({}, shard_by_url), ({'MAX_REQUESTS_PER_SECOND': 100}, shard_by_host),
+                            ({'ROBOTS_TXT': True}, shard_by_host),
+                            ({'MAX_REQUESTS_PER_SECOND': 100, 'SHARD_BY': 'url'}, shard_by_url)]:
+        coordinator = make_crawler(**attrs).start_shards(2)
+        try:
+            assert coordinator.shard_fn is shard_fn
+        finally:
+            coordinator.shutdown()
+
+
+@pytest.mark.parametrize('attrs', [{}, {'FAST_LINK_EXTRACTION': False}, {'NODE_CLASS': WebResource}])
+def test_workers_send_pages_without_html(make_crawler, attrs):
+    expected = tree_json(crawl(make_crawler(**attrs)))
+    crawler = make_crawler(PageRecordingCrawler, **attrs)
+    crawler.pages = []
+    assert tree_json(crawl(crawler, shards=2, workers=2)) == expected
+    assert crawler.pages and all(page.raw_html is None and page.title_text for page in crawler.pages)
+    with pytest.raises(ValueError):
+        crawler.pages[0].find('a')
+
+
+def test_worker_exit(make_crawler, crawl_dir):
+    expected = tree_json(crawl(make_crawler()))
+    crawler = make_crawler(DyingWorkerCrawler)
+    assert tree_json(crawl(crawler, shards=3, workers=2)) == expected
+    assert (crawl_dir / 'died').exists()
+
+
+def test_all_workers_exit(make_crawler):
+    crawler = make_crawler(DyingWorkerCrawler, ALWAYS_DIE=True)
+    with pytest.raises(RuntimeError, match='All the workers disconnected'):
+        crawl(crawler, shards=2)
+
+
+def test_worker_errors_become_broken_links(make_crawler):
+    crawler = make_crawler(RaisingWorkerCrawler)
+    tree = crawl(crawler, shards=2, workers=2)
+    assert find_node(tree, crawler.MAIN_SOURCE_DOMAIN + FAILING_PATH)['kind'] == 'BrokenLink'
+    assert len(tree_json(tree)) > 1000
+
+
+def test_instance_config_for_remote_workers():
+    crawler = RemoteCrawler(start_page='http://site.org/')
+    crawler.SOURCE_DOMAINS = ['http://site.org']
+    crawler.MAX_REQUESTS_PER_SECOND = 7
+    crawler.UNPICKLABLE = lambda: None
+    config = get_instance_config(crawler)
+    assert config == dict(START_PAGE='http://site.org/', MAIN_SOURCE_DOMAIN='http://site.org',
+                          SOURCE_DOMAINS=['http://site.org'], MAX_REQUESTS_PER_SECOND=7)
+    worker_crawler = make_remote_worker_crawler(RemoteCrawler, crawler.START_PAGE, config)
+    assert worker_crawler.MAX_REQUESTS_PER_SECOND == 7 and worker_crawler.broken_links == []
+    assert RemoteCrawler.MAX_REQUESTS_PER_SECOND != 7
+
+
+def test_remote_worker(make_crawler, site_server, crawl_dir):
+    expected = tree_json(crawl(make_crawler()))
+    with socket.socket() as free_socket:
+        free_socket.bind(('127.0.0.1', 0))
+        port = free_socket.getsockname()[1]
+    base_url = site_server.base_url
+    crawler = RemoteCrawler(start_page=base_url + '/')
+    crawler.MAIN_SOURCE_DOMAIN = base_url
+    crawler.SOURCE_DOMAINS = [base_url]
+    crawler.IGNORE_URLS = []
+    crawler.COORDINATOR_ADDRESS = ('127.0.0.1', port)
+    env = dict(os.environ, BASICCRAWLER_AUTHKEY='secret', PYTHONPATH=REPO_DIR)
+    worker = subprocess.Popen([sys.executable, '-m', 'basiccrawler.distributed',
+                               'tests.test_distributed:RemoteCrawler', '127.0.0.1:' + str(port)],
+                              cwd=str(crawl_dir), env=env)
+    try:
+        assert tree_json(crawl(crawler, shards=1, workers=2)) == expected
+        assert worker.wait(timeout=30) == 0
+    finally:
+        worker.kill()
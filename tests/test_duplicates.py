@@ -0,0 +1,71 @@
+"""
+Near-duplicate pages are added to the tree as DuplicateOf nodes when
+`DETECT_DUPLICATES` is set.
+"""
+import pytest
+
+from basiccrawler.simhash import SimHashIndex, hamming_distance, simhash
+from synthetic_site import SyntheticSite, serve_site
+
+from .helpers import crawl, find_node
+
+
+@pytest.fixture(scope='module')
+def duplicates_server():
+    """
+    Site where the last document pages are copies of the first one, with one
+    word changed.
+    """
+    site = SyntheticSite(num_pages=60, fanout=5, depth=4, words_per_page=200, seed=2)
+    documents = sorted(path for path in site.pages if path.startswith('/document/'))
+    original = site.pages[documents[0]]
+    site.copies = documents[-3:]
+    for path in site.copies:
+        site.pages[path] = original.replace('</p>', ' extra</p>', 1)
+    site.original = documents[0]
+    server, base_url = serve_site(site)
+    server.base_url = base_url
+    server.site = site
+    yield server
+    server.shutdown()
+
+
+def test_simhash_of_near_duplicates():
+    words = ' '.join('word{}'.format(i % 97) for i in range(300))
+    assert hamming_distance(simhash(words), simhash(words + ' more')) <= 3
+    assert hamming_distance(simhash(words), simhash('completely different text ' * 50)) > 3
+    assert simhash('') is None
+
+
+def test_simhash_index_finds_earliest_match():
+    index = SimHashIndex(max_distance=3)
+    index.add(0b1011 << 40, 'http://site.org/a')
+    index.add(0b1010 << 40, 'http://site.org/b')
+    assert index.find(0b1011 << 40 | 1) == 'http://site.org/a'
+    assert index.find(~(0b1011 << 40) & (2 ** 64 - 1)) is None
+    assert len(index) == 2
+
+
+@pytest.mark.parametrize('crawl_kwargs', [{}, {'workers': 4}, {'shards': 2, 'workers': 2}])
+def test_duplicate_pages(duplicates_server, make_crawler, crawl_kwargs):
+    base_url = duplicates_server.base_url
+    site = duplicates_server.site
+    crawler = make_crawler(base_url=base_url, DETECT_DUPLICATES=True)
+    tree = crawl(crawler, **crawl_kwargs)
+    assert find_node(tree, base_url + site.original)['kind'] == 'PageWebResource'
+    for path in site.copies:
+        node = find_node(tree, base_url + path)
+        assert node['kind'] == 'DuplicateOf'
+        assert node['duplicate_of'] == base_url + site.original
+    assert crawler.duplicate_pages_found == len(site.copies)
+
+
+def test_duplicates_count_as_visited_for_global_nav(make_crawler):
+    crawler = make_crawler(DETECT_DUPLICATES=True)
+    channel_dict, _ = crawler.start_crawl()
+    base_url = crawler.MAIN_SOURCE_DOMAIN
+    crawler.urls_visited[base_url + '/'] = 'visited'
+    crawler.enqueue_url_and_context(base_url + '/nav/0.html', {'parent': channel_dict})
+    assert crawler.global_nav_index.is_global_nav(base_url + '/nav/0.html')
+    crawler.add_duplicate(base_url + '/print/', {'parent': channel_dict}, base_url + '/')
+    assert not crawler.global_nav_index.is_global_nav(base_url + '/nav/0.html')
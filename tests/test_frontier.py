@@ -0,0 +1,68 @@
+"""
+The PriorityFrontier gives the same order as a heap, also when items spill to disk.
+"""
+import heapq
+import random
+
+import pytest
+
+from basiccrawler.frontier import PriorityFrontier
+
+from .helpers import crawl, tree_json
+
+
+@pytest.mark.parametrize('max_items_in_memory', [None, 1, 4, 10])
+def test_frontier_order_matches_heap(max_items_in_memory):
+    rng = random.Random(max_items_in_memory)
+    parents = [{'url': 'parent' + str(i), 'children': []} for i in range(5)]
+    frontier = PriorityFrontier(lambda url, context: context['priority'], max_items_in_memory)
+    heap = []
+    for step in range(2000):
+        if rng.random() < 0.55:
+            context = {'priority': rng.randint(0, 5), 'kind': rng.choice(['page', 'topic'])}
+            if rng.random() < 0.8:
+                context['parent'] = rng.choice(parents)
+            url = 'url' + str(step)
+            frontier.put((url, context))
+            heapq.heappush(heap, (context['priority'], step, url, context))
+        elif heap:
+            expected_next = [(url, context) for _, _, url, context in heapq.nsmallest(3, heap)]
+            assert frontier.peek(3) == expected_next
+            _, _, expected_url, expected_context = heapq.heappop(heap)
+            url, context = frontier.get()
+            assert url == expected_url
+            assert context == expected_context
+            assert context.get('parent') is expected_context.get('parent')
+            assert list(context) == list(expected_context)
+        assert frontier.qsize() == len(heap) and frontier.empty() == (not heap)
+        if max_items_in_memory:
+            assert frontier.memory_size <= max_items_in_memory
+    while heap:
+        _, _, expected_url, expected_context = heapq.heappop(heap)
+        url, context = frontier.get()
+        assert url == expected_url and context.get('parent') is expected_context.get('parent')
+    assert frontier.empty() and frontier.parents == {}
+
+
+def test_spilled_items_come_back_in_order():
+    frontier = PriorityFrontier(lambda url, context: context['priority'], max_items_in_memory=4)
+    parent = {'url': 'parent', 'children': []}
+    for i, priority in enumerate([3, 1, 2, 1, 0, 3, 2, 0, 1]):
+        frontier.put(('url' + str(i), {'priority': priority, 'parent': parent}))
+    assert frontier.spill_size > 0 and frontier.memory_size <= 4
+    items = [frontier.get() for _ in range(9)]
+    assert [url for url, _ in items] == ['url4', 'url7', 'url1', 'url3', 'url8', 'url2', 'url6', 'url0', 'url5']
+    assert all(context['parent'] is parent for _, context in items)
+    assert frontier.empty() and frontier.parents == {}
+
+
+@pytest.mark.parametrize('attrs', [
+    {},
+    {'DEPTH_PRIORITY': 1},
+    {'KIND_PRIORITIES': {'MediaWebResource': 1}, 'DEPTH_PRIORITY': 2},
+])
+def test_priority_crawl_with_spilling(make_crawler, attrs):
+    expected = tree_json(crawl(make_crawler(PRIORITY_CRAWL=True, **attrs)))
+    crawler = make_crawler(PRIORITY_CRAWL=True, FRONTIER_MAX_MEMORY_ITEMS=4, **attrs)
+    assert tree_json(crawl(crawler)) == expected
+    assert crawler.queue.spill is not None
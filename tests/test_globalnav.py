@@ -0,0 +1,31 @@
+"""
+With `SKIP_GLOBAL_NAV` the global nav links found during the warm-up are put
+aside, and skipped once the warm-up is over.
+"""
+from basiccrawler.traversal import iter_nodes
+
+from .helpers import crawl
+
+
+def nav_urls(tree):
+    return [node['url'] for node in iter_nodes(tree) if '/nav/' in node.get('url', '')]
+
+
+def test_global_nav_pages_are_visited_by_default(site, make_crawler):
+    tree = crawl(make_crawler())
+    assert len(nav_urls(tree)) == len([path for path in site.pages if path.startswith('/nav/')]) > 0
+
+
+def test_skip_global_nav(make_crawler):
+    crawler = make_crawler(SKIP_GLOBAL_NAV=True, GLOBAL_NAV_WARMUP=10)
+    requested_urls = []
+    crawler.add_hook('before_request', lambda url, method, kwargs: requested_urls.append(url))
+    tree = crawl(crawler)
+    assert nav_urls(tree) == []
+    assert len(crawler.global_nav_index.urls) > 0
+    assert [url for url in requested_urls if '/nav/' in url] == []
+
+
+def test_global_nav_pages_are_visited_if_warmup_is_not_over(site, make_crawler):
+    tree = crawl(make_crawler(SKIP_GLOBAL_NAV=True, GLOBAL_NAV_WARMUP=1000))
+    assert len(nav_urls(tree)) == len([path for path in site.pages if path.startswith('/nav/')])
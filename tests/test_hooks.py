@@ -0,0 +1,99 @@
+"""
+Hook listeners are called in order, can be removed, and their errors are not caught.
+"""
+import pytest
+
+from basiccrawler.hooks import EVENTS, Hooks
+
+from .helpers import acrawl, crawl, tree_json
+
+
+class HookError(Exception):
+    pass
+
+
+def test_listeners_called_in_order_until_one_returns_a_value():
+    hooks = Hooks()
+    calls = []
+    hooks.add('after_parse', lambda url, page: calls.append(('first', url)))
+    hooks.add('after_parse', lambda url, page: calls.append(('second', url)) or page.upper())
+    hooks.add('after_parse', lambda url, page: calls.append(('third', url)))
+    assert hooks.dispatch('after_parse', 'http://a/', 'page') == 'PAGE'
+    assert calls == [('first', 'http://a/'), ('second', 'http://a/')]
+    assert hooks.dispatch('before_enqueue', 'http://a/', {}) is None
+    assert all(getattr(hooks, event) == () for event in EVENTS if event != 'after_parse')
+
+
+def test_remove_listener():
+    hooks = Hooks()
+    calls = []
+
+    def listener(node):
+        calls.append(node)
+    hooks.add('on_node_created', lambda node: calls.append('other'))
+    hooks.add('on_node_created', listener)
+    hooks.add('on_node_created', listener)
+    hooks.remove('on_node_created', listener)
+    hooks.dispatch('on_node_created', 'node')
+    assert calls == ['other', 'node']
+    listeners = hooks.on_node_created
+    hooks.remove('on_node_created', listener)
+    assert listeners != hooks.on_node_created and len(hooks.on_node_created) == 1
+    with pytest.raises(ValueError):
+        hooks.remove('on_node_created', listener)
+
+
+def test_unknown_event():
+    hooks = Hooks()
+    with pytest.raises(ValueError, match='on_node_created'):
+        hooks.add('on_node', print)
+    with pytest.raises(ValueError):
+        hooks.remove('on_node', print)
+
+
+def test_listener_errors_propagate():
+    hooks = Hooks()
+    calls = []
+
+    def failing(url, context):
+        raise HookError(url)
+    hooks.add('before_enqueue', failing)
+    hooks.add('before_enqueue', lambda url, context: calls.append(url))
+    with pytest.raises(HookError):
+        hooks.dispatch('before_enqueue', 'http://a/', {})
+    assert calls == []
+
+
+def test_hooks_during_crawl(make_crawler, site):
+    expected = tree_json(crawl(make_crawler()))
+    crawler = make_crawler()
+    events = []
+    crawler.add_hook('before_request', lambda url, method, kwargs: events.append(('before_request', method, url)))
+    crawler.add_hook('after_response', lambda url, method, response: events.append(('after_response', method, url)))
+    crawler.add_hook('after_parse', lambda url, page: events.append(('after_parse', url)))
+    crawler.add_hook('on_crawl_end', lambda tree: events.append(('on_crawl_end',)))
+    assert tree_json(crawl(crawler)) == expected
+    assert events[-1] == ('on_crawl_end',)
+    for i, event in enumerate(events):
+        if event[0] == 'after_response':
+            assert events[i - 1] == ('before_request',) + event[1:]
+    assert len([event for event in events if event[0] == 'after_parse']) == len(site.pages)
+
+    skip_media = lambda url, context: True if '/media/' in url else None
+    crawler.add_hook('before_enqueue', skip_media)
+    assert '/media/' not in tree_json(crawl(crawler))
+    crawler.remove_hook('before_enqueue', skip_media)
+    assert tree_json(crawl(crawler)) == expected
+
+
+@pytest.mark.parametrize('event', ['before_request', 'after_response', 'after_parse'])
+@pytest.mark.parametrize('crawl_function', [crawl, acrawl])
+def test_listener_errors_stop_the_crawl(make_crawler, event, crawl_function):
+    crawler = make_crawler()
+
+    def failing(url, *args):
+        if url.endswith('.html'):
+            raise HookError(url)
+    crawler.add_hook(event, failing)
+    with pytest.raises(HookError):
+        crawl_function(crawler)
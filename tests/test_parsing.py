@@ -0,0 +1,96 @@
+"""
+The fast link extractor must find the same title and links as BeautifulSoup,
+including on the sloppy markup that real sites serve.
+"""
+import random
+
+from bs4 import BeautifulSoup
+import pytest
+
+from basiccrawler.crawler import BasicCrawler
+from basiccrawler.parsing import ParsedPage, extract_links, extract_title, extract_title_and_links
+
+from .helpers import crawl
+
+
+PAGE_URL = 'http://site.org/section/page.html'
+
+
+def soup_extract(html):
+    page = BeautifulSoup(html, "html.parser")
+    return (extract_title(page), extract_links(PAGE_URL, page))
+
+
+MALFORMED_PAGES = [
+    '<a href="/1" class="c"">one</a> <a href="/2">two</a> <a href="/3">x</a><a href="/4">y</a>',
+    "<a title=Don't href='/1'>x</a><a href='/2'>y</a>",
+    '<a href="/1>one</a> <a href="/2">two</a> <a href="/3">three</a>',
+    '<a href="/1">one</a> <a href="/2>two</a>',
+    '<p class="x>text <a href="/hidden">no</a> " <a href="/1">one</a>',
+    '<a href = "/1" >x</a><a href=/2 title="a>b">y</a><a href="/3"title=t>z</a>',
+    '<a\nhref="/1"\n>x</a><A HREF="/2">y</A><a href=="/3">z</a>',
+    '<a href="/1" <a href="/2">x</a>',
+    '<div title="<a href=/not-a-link>"><a href="/1">x</a></div>',
+    '</b title="<a href=/not-a-link>"><a href="/1">x</a>',
+    '<abbr href="/not-a-link">x</abbr><a href="/1?a=1&amp;b=2">y</a>',
+    '<!-- <a href="/commented"> --><script>var a = "<a href=\'/s\'>";</script><a href="/1">x</a>',
+    '<html><head><title>A &amp; B</title><base href="/base/"></head><a href="rel">x</a></html>',
+    '<html><head><script src="a.js"/><title>T</title></head><a href="/after">x</a></html>',
+    '<style/><a href="/after">x</a><STYLE type="text/css" /><a href="/2">y</a>',
+    '<script src=a.js/><a href="/after">x</a><script><a href="/in-script"></script>',
+    '<head><title/><a href="/1">x</a></head><title>Not the title</title>',
+    '<script src="a.js" /><script>var a = "</a>";</script><a href="/after">x</a>',
+]
+
+
+@pytest.mark.parametrize('html', MALFORMED_PAGES)
+def test_fast_extractor_matches_soup_on_malformed_markup(html):
+    assert extract_title_and_links(PAGE_URL, html) == soup_extract(html)
+
+
+def test_fast_extractor_matches_soup_on_random_markup():
+    pieces = ['<a href="/{n}">', "<a href='/{n}'>", '<a href=/{n}>', '</a>', 'text', ' ', '"', "'", '=', '>',
+              '<a href="/{n}" class="c"">', "<a title=Don't href='/{n}'>", '<a href="/{n}>', '<b>', '</b>',
+              '<a href=/{n} title="x>y">', '<!-- c -->', '<p class="x>', '<a class=x href=/{n}>',
+              '<script src="a.js"/>', '<style/>', '<script>', '</script>', '<br/>', '<a href="/{n}"/>']
+    rnd = random.Random(0)
+    for _ in range(500):
+        html = ''.join(rnd.choice(pieces).format(n=rnd.randint(0, 99)) for _ in range(rnd.randint(1, 30)))
+        assert extract_title_and_links(PAGE_URL, html) == soup_extract(html), html
+
+
+def test_parsed_page_works_like_soup():
+    html = '<html><head><title>T</title></head><body><a href="/1">x</a><a href="/2">y</a></body></html>'
+    soup = BeautifulSoup(html, "html.parser")
+    page = ParsedPage(PAGE_URL, html, 'T', ['http://site.org/1', 'http://site.org/2'])
+    assert [link['href'] for link in page('a')] == ['/1', '/2']
+    assert page.find('a', href='/2').get_text() == 'y'
+    assert [str(el) for el in page] == [str(el) for el in soup]
+    assert len(page) == len(soup)
+    assert page.html in page
+    assert page.find('head').title.string == 'T'
+    with pytest.raises(KeyError):
+        page['href']
+    assert bool(ParsedPage(PAGE_URL, '', '', []))
+    assert isinstance(page.soup, BeautifulSoup)
+
+
+class SoupHandlerCrawler(BasicCrawler):
+    """
+    Crawler whose handler for the home page uses the BeautifulSoup API.
+    """
+    START_PAGE_CONTEXT = {'kind': 'home'}
+    kind_handlers = {'home': 'on_home'}
+
+    def on_home(self, url, page, context):
+        self.home_hrefs = [link['href'] for link in page('a') if link.has_attr('href')]
+        self.home_tags = len([el for el in page.descendants if el.name])
+        self.on_page(url, page, context)
+
+
+def test_kind_handler_with_soup_api(make_crawler, site):
+    crawler = make_crawler(SoupHandlerCrawler)
+    crawl(crawler, limit=1)
+    soup = BeautifulSoup(site.pages['/'], "html.parser")
+    assert crawler.home_hrefs == [link['href'] for link in soup('a')]
+    assert crawler.home_tags == len([el for el in soup.descendants if el.name])
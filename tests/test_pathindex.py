@@ -0,0 +1,68 @@
+"""
+The path trie keeps the number of distinct paths below each prefix up to date
+as URLs are added, see `PathTrie` and `infer_tree_structure`.
+"""
+import random
+
+from basiccrawler.pathindex import PathTrie
+
+from .helpers import crawl
+
+
+def leaf_counts(paths):
+    """
+    Reference counts: number of distinct paths (that are not a prefix of another
+    path) starting with each prefix.
+    """
+    paths = set(tuple(path.split('/')[1:]) for path in paths)
+    leaves = [path for path in paths if not any(len(other) > len(path) and other[:len(path)] == path
+                                                for other in paths)]
+    counts = {}
+    for leaf in leaves:
+        for depth in range(1, len(leaf) + 1):
+            prefix = '/'.join(leaf[:depth])
+            counts[prefix] = counts.get(prefix, 0) + 1
+    return counts
+
+
+def test_counts_match_reference():
+    rnd = random.Random(0)
+    trie = PathTrie()
+    paths = []
+    for _ in range(300):
+        path = '/' + '/'.join(rnd.choice('abcd') for _ in range(rnd.randint(1, 4)))
+        paths.append(path)
+        trie.add_url(path + '?page=' + str(rnd.randint(0, 3)))
+        if rnd.random() < 0.1:
+            expected = leaf_counts(paths)
+            for prefix, count in expected.items():
+                assert trie.get_count(prefix) == count, prefix
+    expected = leaf_counts(paths)
+    assert trie.get_count('x') == 0 and trie.get_count('a/x') == 0
+    for depth in range(1, 5):
+        top = trie.top_prefixes(depth=depth, k=5)
+        level = sorted((count for prefix, count in expected.items() if prefix.count('/') == depth - 1), reverse=True)
+        assert [count for _, count in top] == level[:5]
+        assert all(expected[prefix] == count for prefix, count in top)
+    assert trie.top_prefixes(depth=5) == [] and trie.top_prefixes(depth=0) == []
+
+
+def test_prefixes_in_insertion_order_for_ties():
+    trie = PathTrie(url_to_path=lambda url: url.replace('http://site.org', ''))
+    for url in ['http://site.org/course/1', 'http://site.org/lesson/1', 'http://site.org/course/2',
+                'http://site.org/lesson/2', 'http://site.org/about']:
+        trie.add_url(url)
+    assert trie.top_prefixes(depth=1) == [('course', 2), ('lesson', 2), ('about', 1)]
+    assert trie.top_prefixes(depth=2, k=2) == [('course/1', 1), ('lesson/1', 1)]
+
+
+def test_path_index_during_crawl(make_crawler):
+    crawler = make_crawler()
+    crawl(crawler)
+    assert crawler.path_index is None
+    crawler = make_crawler(PATH_INDEX=True)
+    tree = crawl(crawler)
+    for depth in [1, 2]:
+        # the URLs are added in a different order, so compare all the counts
+        expected = crawler.infer_tree_structure(tree, show_top=1000, depth=depth)
+        assert expected and set(crawler.path_index.top_prefixes(depth=depth, k=1000)) == set(expected)
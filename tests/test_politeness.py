@@ -0,0 +1,128 @@
+"""
+Crawls with `ROBOTS_TXT` skip the URLs disallowed by robots.txt and space out
+the requests to each host as set by its Crawl-delay or Request-rate.
+"""
+import threading
+import time
+
+import pytest
+
+from basiccrawler.crawler import BasicCrawler
+from basiccrawler.politeness import HostRateLimiter, RobotsCache
+from synthetic_site import SyntheticSiteHandler, serve_site
+
+from .helpers import acrawl, crawl, tree_json
+
+
+class RobotsHandler(SyntheticSiteHandler):
+    """
+    Serves `robots_txt` at /robots.txt and records the (time, method, path) of
+    the other requests.
+    """
+    robots_txt = ''
+    robots_requests = None
+    requests = None
+    requests_lock = threading.Lock()
+
+    def respond(self, send_content):
+        if self.path == '/robots.txt':
+            self.robots_requests.append(self.command)
+            self.send_body(200, 'text/plain', self.robots_txt.encode('utf-8'), send_content)
+            return
+        with self.requests_lock:
+            self.requests.append((time.monotonic(), self.command, self.path))
+        super().respond(send_content)
+
+
+@pytest.fixture
+def robots_server(site):
+    server, base_url = serve_site(site, handler_class=RobotsHandler)
+    server.base_url = base_url
+    server.RequestHandlerClass.robots_requests = []
+    server.RequestHandlerClass.requests = []
+    yield server
+    server.shutdown()
+
+
+@pytest.mark.parametrize('crawl_function, kwargs', [(crawl, {}), (crawl, {'workers': 4}), (acrawl, {})])
+def test_robots_txt_disallow(robots_server, make_crawler, crawl_function, kwargs):
+    handler = robots_server.RequestHandlerClass
+    handler.robots_txt = 'User-agent: *\nDisallow: /document/\n'
+    crawler = make_crawler(base_url=robots_server.base_url, ROBOTS_TXT=True)
+    tree = tree_json(crawl_function(crawler, **kwargs))
+    assert handler.robots_requests == ['GET']
+    assert handler.requests
+    assert not [path for _, _, path in handler.requests if path.startswith('/document/')]
+    assert '/topic/' in tree and '/document/' not in tree
+
+
+class CountingRobotsCrawler(BasicCrawler):
+    """
+    Records the URLs checked against the robots.txt rules.
+    """
+    def start_politeness(self):
+        super().start_politeness()
+        can_fetch = self.robots.can_fetch
+        def counting_can_fetch(url):
+            self.robots_checks.append(url)
+            return can_fetch(url)
+        self.robots.can_fetch = counting_can_fetch
+
+
+def test_robots_txt_checked_once_per_url(robots_server, make_crawler):
+    robots_server.RequestHandlerClass.robots_txt = 'User-agent: *\nDisallow: /document/\n'
+    crawler = make_crawler(CountingRobotsCrawler, base_url=robots_server.base_url, ROBOTS_TXT=True)
+    crawler.robots_checks = []
+    crawl(crawler)
+    assert sum(crawler.global_urls_seen_count.values()) > len(crawler.robots_checks)
+    assert sorted(crawler.robots_checks) == sorted(set(crawler.robots_checks))
+    assert any('/nav/' in url for url in crawler.robots_checks)
+
+
+def test_robots_txt_for_other_user_agent(robots_server, make_crawler):
+    handler = robots_server.RequestHandlerClass
+    handler.robots_txt = 'User-agent: OtherBot\nDisallow: /\n'
+    expected = tree_json(crawl(make_crawler(base_url=robots_server.base_url)))
+    crawler = make_crawler(base_url=robots_server.base_url, ROBOTS_TXT=True)
+    assert tree_json(crawl(crawler)) == expected
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'workers': 4}])
+def test_robots_txt_request_rate(robots_server, make_crawler, kwargs):
+    handler = robots_server.RequestHandlerClass
+    handler.robots_txt = 'User-agent: *\nRequest-rate: 20/1\n'     # one request every 0.05 seconds
+    crawler = make_crawler(base_url=robots_server.base_url, ROBOTS_TXT=True)
+    crawl(crawler, limit=5, **kwargs)
+    times = sorted(request_time for request_time, _, _ in handler.requests)
+    assert len(times) > 5
+    # requests are received with some jitter, so check the average spacing
+    assert times[-1] - times[0] > (len(times) - 1) * 0.05 - 0.03
+
+
+def test_robots_cache_crawl_delay():
+    fetched = []
+    def fetch(robots_url):
+        fetched.append(robots_url)
+        if 'slow' in robots_url:
+            return (200, 'User-agent: *\nCrawl-delay: 2\nRequest-rate: 1/5\n')
+        if 'down' in robots_url:
+            return (503, '')
+        return (404, '')
+    robots = RobotsCache(fetch, user_agent='BasicCrawler')
+    assert robots.crawl_delay('http://slow.org/a') == 5.0
+    assert robots.crawl_delay('http://slow.org/b') == 5.0
+    assert robots.crawl_delay('http://fast.org/a') is None
+    assert robots.can_fetch('http://fast.org/a')
+    assert not robots.can_fetch('http://down.org/a')
+    assert fetched == ['http://slow.org/robots.txt', 'http://fast.org/robots.txt', 'http://down.org/robots.txt']
+
+
+def test_rate_limiter_spaces_out_requests():
+    now = [0.0]
+    robots = RobotsCache(lambda robots_url: (200, 'User-agent: *\nCrawl-delay: 2\n'))
+    limiter = HostRateLimiter(rate=10, burst=3, robots=robots, clock=lambda: now[0])
+    assert [limiter.reserve('http://site.org/' + str(i)) for i in range(3)] == [0.0, 2.0, 4.0]
+    limiter = HostRateLimiter(rate=10, burst=3, clock=lambda: now[0])
+    assert [limiter.reserve('http://site.org/' + str(i)) for i in range(4)] == [0.0, 0.0, 0.0, pytest.approx(0.1)]
+    now[0] = 1.0
+    assert limiter.reserve('http://site.org/') == 0.0
@@ -0,0 +1,131 @@
+"""
+Failed requests are retried later with exponential backoff, and a failed HEAD
+request still falls back to a GET like before retries were added.
+"""
+import itertools
+import queue
+import threading
+
+import pytest
+
+from basiccrawler.retry import RetryLater, RetryQueue, backoff_delay
+from synthetic_site import SyntheticSiteHandler, serve_site
+
+from .helpers import acrawl, crawl, find_node
+
+
+class FlakyHandler(SyntheticSiteHandler):
+    """
+    Returns the status codes in `failures[(method, path)]` one at a time before
+    the normal responses, and records the (method, path) of all requests.
+    """
+    failures = None
+    requests = None
+
+    def respond(self, send_content):
+        self.requests.append((self.command, self.path))
+        statuses = self.failures.get((self.command, self.path))
+        if statuses:
+            self.send_body(statuses.pop(0), 'text/html', b'<html>Error</html>', send_content)
+        else:
+            super().respond(send_content)
+
+
+@pytest.fixture
+def flaky_server(site):
+    server, base_url = serve_site(site, handler_class=FlakyHandler)
+    server.base_url = base_url
+    server.RequestHandlerClass.failures = {}
+    server.RequestHandlerClass.requests = []
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def page_path(site):
+    """
+    Path of an HTML page linked from the home page.
+    """
+    return next(path for path in sorted(site.pages) if path.startswith('/topic/'))
+
+
+def crawl_flaky_site(server, make_crawler, **attrs):
+    crawler = make_crawler(base_url=server.base_url, RETRY_BACKOFF=0.01, **attrs)
+    return crawl(crawler)
+
+
+def test_backoff_delay_doubles_up_to_max_delay():
+    delays = [backoff_delay(attempt, base=1.0, max_delay=5.0, jitter=0) for attempt in range(1, 6)]
+    assert delays == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_failed_get_is_retried_later(flaky_server, make_crawler, page_path):
+    handler = flaky_server.RequestHandlerClass
+    handler.failures[('GET', page_path)] = [503, 500]
+    crawler = make_crawler(base_url=flaky_server.base_url, RETRY_BACKOFF=0.01)
+    tree = crawl(crawler)
+    assert find_node(tree, flaky_server.base_url + page_path)['kind'] == 'PageWebResource'
+    assert handler.requests.count(('GET', page_path)) == 3
+    assert handler.requests.count(('HEAD', page_path)) == 1    # media check remembered for the retries
+    assert crawler.media_verdicts == {}
+
+
+def test_broken_link_after_max_retries(flaky_server, make_crawler, page_path):
+    handler = flaky_server.RequestHandlerClass
+    handler.failures[('GET', page_path)] = [500] * 10
+    tree = crawl_flaky_site(flaky_server, make_crawler, MAX_RETRIES=2)
+    node = find_node(tree, flaky_server.base_url + page_path)
+    assert node['kind'] == 'BrokenLink'
+    assert [attempt['status_code'] for attempt in node['attempts']] == [500, 500, 500]
+    assert handler.requests.count(('GET', page_path)) == 3
+    assert handler.requests.count(('HEAD', page_path)) == 1
+
+
+@pytest.mark.parametrize('allow_broken_head', [True, False])
+def test_failed_head_falls_back_to_get(flaky_server, make_crawler, page_path, allow_broken_head):
+    handler = flaky_server.RequestHandlerClass
+    handler.failures[('HEAD', page_path)] = [500] * 10
+    page_url = flaky_server.base_url + page_path
+    tree = crawl_flaky_site(flaky_server, make_crawler,
+                            ALLOW_BROKEN_HEAD_URLS=[page_url] if allow_broken_head else [])
+    assert find_node(tree, page_url)['kind'] == 'PageWebResource'
+    assert handler.requests.count(('HEAD', page_path)) == 1
+    assert handler.requests.count(('GET', page_path)) == 1
+
+
+def test_failed_head_falls_back_to_get_in_acrawl(flaky_server, make_crawler, page_path):
+    pytest.importorskip('aiohttp')
+    handler = flaky_server.RequestHandlerClass
+    handler.failures[('HEAD', page_path)] = [500] * 10
+    crawler = make_crawler(base_url=flaky_server.base_url, RETRY_BACKOFF=0.01)
+    tree = acrawl(crawler)
+    assert find_node(tree, flaky_server.base_url + page_path)['kind'] == 'PageWebResource'
+    assert handler.requests.count(('HEAD', page_path)) == 1
+
+
+@pytest.mark.parametrize('retry_after, expected_delay', [(86400, 60.0), (5, 5.0)])
+def test_retry_after_is_capped(make_crawler, retry_after, expected_delay):
+    crawler = make_crawler(RETRY_MAX_BACKOFF=60.0)
+    channel_dict, _ = crawler.start_crawl()
+    url, context = crawler.get_url_and_context()
+    crawler.schedule_retry(url, context, RetryLater(url, 'HTTP 503', status_code=503, retry_after=retry_after))
+    assert crawler.retry_queue.wait_time() == pytest.approx(expected_delay, abs=1)
+
+
+def test_waits_until_retry_is_due(make_crawler):
+    crawler = make_crawler()
+    crawler.start_crawl()
+    url, context = crawler.get_url_and_context()
+    # clock that only moves forward after being read three times, so the first
+    # pop_due after waiting for the retry doesn't find it due yet
+    times = itertools.chain([0.0, 0.0, 0.0], itertools.repeat(1.0))
+    crawler.retry_queue = RetryQueue(clock=lambda: next(times))
+    crawler.retry_queue.push(url, context, 0.01)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(crawler.get_url_and_context()), daemon=True)
+    thread.start()
+    thread.join(5)
+    assert result == [(url, context)]
+    assert crawler.queue_is_empty()
+    with pytest.raises(queue.Empty):
+        crawler.get_url_and_context()
@@ -0,0 +1,39 @@
+"""
+Re-crawls with `REVALIDATE` get `304 Not Modified` responses for the cached pages,
+and with a `PARSED_PAGES_CACHE` don't parse the unchanged pages again.
+"""
+from basiccrawler import crawler as crawler_module
+from basiccrawler.cache import ParsedPageCache
+
+from .helpers import crawl, tree_json
+
+
+def test_revalidate_gives_same_tree(make_crawler, site, site_server, monkeypatch):
+    expected = tree_json(crawl(make_crawler()))
+    parsed_urls = []
+
+    def parse_page_html(url, html, fields):
+        parsed_urls.append(url)
+        return parse_page_html.original(url, html, fields)
+    parse_page_html.original = crawler_module.parse_page_html
+    monkeypatch.setattr(crawler_module, 'parse_page_html', parse_page_html)
+
+    crawler = make_crawler(REVALIDATE=True, PARSED_PAGES_CACHE=ParsedPageCache('parsed_pages.sqlite3'))
+    assert tree_json(crawl(crawler)) == expected
+    assert len(parsed_urls) == len(site.pages)
+
+    not_modified = site_server.status_counts.get(304, 0)
+    gets = site_server.request_counts['GET']
+    del parsed_urls[:]
+    assert tree_json(crawl(crawler)) == expected
+    assert site_server.status_counts.get(304, 0) - not_modified == len(site.pages)
+    assert site_server.request_counts['GET'] - gets >= len(site.pages)
+    assert parsed_urls == []
+
+
+def test_cached_pages_are_not_requested_without_revalidate(make_crawler, site_server):
+    crawler = make_crawler()
+    expected = tree_json(crawl(crawler))
+    gets = site_server.request_counts['GET']
+    assert tree_json(crawl(crawler)) == expected
+    assert site_server.request_counts['GET'] == gets
@@ -0,0 +1,41 @@
+"""
+Crawls with `COMPACT_SEEN_STORE` give the same tree as crawls that keep the URLs.
+"""
+import random
+
+import pytest
+
+from basiccrawler.seenstore import FingerprintCounter
+
+from .helpers import crawl, tree_json
+
+
+@pytest.mark.parametrize('path', [None, 'urls_seen.bin'])
+def test_fingerprint_counter_matches_dict(path):
+    rng = random.Random(0)
+    counter = FingerprintCounter(capacity=8, path=path)
+    expected = {}
+    for _ in range(5000):
+        url = 'http://site/' + str(rng.randint(0, 2000))
+        if rng.random() < 0.5:
+            assert counter.increment(url) == expected.get(url, 0) + 1
+            expected[url] = expected.get(url, 0) + 1
+        else:
+            counter[url] = expected[url] = rng.randint(1, 10)
+    assert len(counter) == len(expected) and counter.capacity > 8
+    assert all(url in counter and counter[url] == count for url, count in expected.items())
+    assert 'http://other/' not in counter and counter['http://other/'] == 0
+    assert counter.get('http://other/', 'missing') == 'missing'
+    counter.close()
+
+
+@pytest.mark.parametrize('attrs', [
+    {'COMPACT_SEEN_STORE': True},
+    {'COMPACT_SEEN_STORE': True, 'SEEN_STORE_DIR': 'seen'},
+])
+@pytest.mark.parametrize('kwargs', [{}, {'workers': 3}])
+def test_compact_seen_store_gives_same_tree(make_crawler, attrs, kwargs):
+    expected = tree_json(crawl(make_crawler()))
+    crawler = make_crawler(**attrs)
+    assert tree_json(crawl(crawler, **kwargs)) == expected
+    assert isinstance(crawler.global_urls_seen_count, FingerprintCounter)
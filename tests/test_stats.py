@@ -0,0 +1,95 @@
+"""
+Crawl stats collected with `COLLECT_STATS` and their JSON lines and Prometheus exports.
+"""
+import json
+import re
+
+from basiccrawler.stats import CrawlStats, Histogram
+
+from .helpers import crawl
+
+
+PROMETHEUS_LINE_RE = re.compile(r'^([a-z_]+)(\{([a-z]+)="([^"]*)"(,le="([^"]+)")?\})? (\S+)$')
+
+
+def parse_prometheus(text):
+    """
+    Returns {metric name: {(label value, le): value}} checking the line format.
+    """
+    metrics = {}
+    types = {}
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, name, metric_type = line.split(' ')
+            assert metric_type in ('counter', 'gauge', 'histogram') and name not in types
+            types[name] = metric_type
+            continue
+        match = PROMETHEUS_LINE_RE.match(line)
+        assert match, line
+        name, _, _, label_value, _, le, value = match.groups()
+        base_name = re.sub('_(bucket|sum|count)$', '', name) if label_value is not None else name
+        assert base_name in types
+        metrics.setdefault(name, {})[(label_value, le)] = float(value)
+    return metrics
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(1.0, 2.0, 5.0))
+    for value in [0.5, 1.0, 1.5, 3.0, 10.0]:
+        histogram.observe(value)
+    assert histogram.bucket_counts == [2, 1, 1, 1]
+    assert histogram.cumulative_counts() == [(1.0, 2), (2.0, 3), (5.0, 4), (float('inf'), 5)]
+    assert (histogram.quantile(0.4), histogram.quantile(0.6), histogram.quantile(1.0)) == (1.0, 2.0, None)
+    assert histogram.to_dict()['mean'] == 3.2
+    assert Histogram().quantile(0.5) is None
+
+
+def test_logs_written_when_due(crawl_dir):
+    now = [100.0]
+    stats = CrawlStats(log_path='stats.jsonl', log_every=10.0, prometheus_path='metrics.prom',
+                       sample_every=1.0, clock=lambda: now[0])
+    stats.incr('pages')
+    for step in range(25):
+        now[0] += 0.5
+        stats.tick(frontier_size=step)
+    lines = [json.loads(line) for line in open('stats.jsonl')]
+    assert [line['frontier_size'] for line in lines] == [19]
+    assert lines[0]['elapsed'] == 10.0 and lines[0]['counters'] == {'pages': 1}
+    assert [size for _, size in stats.frontier_sizes] == list(range(0, 25, 2))
+    stats.tick(frontier_size=0, force=True)
+    assert len(open('stats.jsonl').readlines()) == 2
+    assert parse_prometheus(open('metrics.prom').read())['basiccrawler_frontier_size'] == {(None, None): 0}
+
+
+def test_crawl_stats(make_crawler, site, site_server):
+    crawler = make_crawler(COLLECT_STATS=True, STATS_LOG_PATH='stats/crawl_stats.jsonl',
+                           STATS_PROMETHEUS_PATH='stats/crawl_metrics.prom')
+    requests_before = sum(site_server.request_counts.values())
+    crawl(crawler)
+    requests_sent = sum(site_server.request_counts.values()) - requests_before
+    counters = crawler.stats.counters
+    assert counters['pages'] == len(site.pages)
+    assert counters['media_files'] == len(site.media)
+    assert counters['network_requests'] == requests_sent and 'cache_hits' not in counters
+    assert counters['bytes'] == sum(len(page.encode('utf-8')) for page in site.pages.values())
+    assert crawler.stats.stages['fetch'].count == len(site.pages) + len(site.media)
+    assert sum(histogram.count for histogram in crawler.stats.hosts.values()) == requests_sent
+
+    lines = [json.loads(line) for line in open('stats/crawl_stats.jsonl')]
+    assert lines[-1]['counters'] == dict(counters) and lines[-1]['frontier_size'] == 0
+    assert set(lines[-1]['stages']) >= {'fetch', 'parse', 'handler', 'ignore_check', 'save_tree'}
+    assert lines[-1]['stages']['handler']['count'] == len(site.pages)
+
+    metrics = parse_prometheus(open('stats/crawl_metrics.prom').read())
+    for counter, value in counters.items():
+        assert metrics['basiccrawler_' + counter + '_total'] == {(None, None): value}
+    assert metrics['basiccrawler_frontier_size'] == {(None, None): 0}
+    buckets = metrics['basiccrawler_stage_seconds_bucket']
+    fetch_counts = [count for (stage, _), count in buckets.items() if stage == 'fetch']
+    assert fetch_counts == sorted(fetch_counts) and buckets[('fetch', '+Inf')] == fetch_counts[-1]
+    assert metrics['basiccrawler_stage_seconds_count'][('fetch', None)] == fetch_counts[-1]
+    assert sum(metrics['basiccrawler_host_request_seconds_count'].values()) == requests_sent
+
+    crawl(crawler)
+    assert crawler.stats.counters['cache_hits'] == len(site.pages)
+    assert crawler.stats.counters['cache_hits'] + crawler.stats.counters['network_requests'] == requests_sent
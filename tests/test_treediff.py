@@ -0,0 +1,38 @@
+"""
+Differences between the web resource trees of two crawls, see `crawl(save_tree_diff=True)`.
+"""
+import json
+
+from basiccrawler.treediff import diff_web_resource_trees
+
+from .helpers import crawl
+
+
+def test_diff_web_resource_trees():
+    old_tree = {'url': 'a', 'kind': 'Channel', 'children': [
+        {'url': 'b', 'title': 'B', 'children': [{'url': 'c', 'children': []}]},
+        {'url': 'd', 'children': []},
+    ]}
+    new_tree = {'url': 'a', 'kind': 'Channel', 'children': [
+        {'url': 'b', 'title': 'New B', 'children': []},
+        {'url': 'd', 'children': [{'url': 'c', 'children': []}, {'url': 'e', 'children': []}]},
+    ]}
+    diff = diff_web_resource_trees(old_tree, new_tree)
+    assert diff['added'] == [{'url': 'e', 'parent_url': 'd', 'node': {'url': 'e'}}]
+    assert diff['removed'] == []
+    assert diff['moved'] == [{'url': 'c', 'old_parent_url': 'b', 'new_parent_url': 'd'}]
+    assert diff['changed'] == [{'url': 'b', 'parent_url': 'a', 'changes': {'title': ['B', 'New B']}}]
+    assert len(diff_web_resource_trees(None, new_tree)['added']) == 5
+
+
+def test_diff_saved_next_to_tree(make_crawler, crawl_dir):
+    crawler = make_crawler(CRAWLING_STAGE_OUTPUT='trees/site.json')
+    crawl(crawler, save_web_resource_tree=True, save_tree_diff=True)
+    with open('trees/site_diff.json') as diff_file:
+        diff = json.load(diff_file)
+    assert diff['added'] and not diff['removed']
+    crawl(crawler, save_web_resource_tree=True, save_tree_diff=True)
+    with open('trees/site_diff.json') as diff_file:
+        diff = json.load(diff_file)
+    assert diff == dict(added=[], removed=[], moved=[], changed=[])
+    assert not (crawl_dir / 'chefdata' / 'trees' / 'web_resource_tree_diff.json').exists()
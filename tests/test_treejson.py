@@ -0,0 +1,80 @@
+"""
+The streamed web resource tree json is byte-identical to the output of `json.dump`.
+"""
+import io
+import json
+
+import pytest
+
+from basiccrawler.nodes import WebResource
+from basiccrawler.treejson import write_web_resource_tree_json
+
+
+def make_tree(node_class=dict, depth=3):
+    """
+    Tree with parent links and the kinds of values found in nodes.
+    """
+    root = node_class(url='http://site.org/', kind='Channel', title='Accueil é ü 中文 "quoted"\n', children=[])
+    stack = [(root, 0)]
+    while stack:
+        node, level = stack.pop()
+        if level >= depth:
+            continue
+        for position in range(3):
+            child = node_class(url=node['url'] + str(position) + '/', parent=node, children=[],
+                               kind='TopicNode' if position else 'PageWebResource', position=position,
+                               score=position / 3.0, nested={'b': [1, {'c': None}], 'a': True},
+                               empty_list=[], empty_dict={}, tags=['x', 'y'])
+            node['children'].append(child)
+            stack.append((child, level + 1))
+    return root
+
+
+def expected_json(tree, **kwargs):
+    def copy_without_parents(node):
+        if isinstance(node, (dict, WebResource)):
+            return {key: copy_without_parents(value) for key, value in node.items() if key != 'parent'}
+        if isinstance(node, list):
+            return [copy_without_parents(item) for item in node]
+        return node
+    return json.dumps(copy_without_parents(tree), ensure_ascii=False, sort_keys=True, **kwargs)
+
+
+def streamed_json(tree, **kwargs):
+    wrt_file = io.StringIO()
+    write_web_resource_tree_json(tree, wrt_file, **kwargs)
+    return wrt_file.getvalue()
+
+
+@pytest.mark.parametrize('node_class', [dict, WebResource])
+def test_same_as_json_dump(node_class):
+    tree = make_tree(node_class)
+    expected = expected_json(tree, indent=2)
+    compact_expected = expected_json(tree, separators=(',', ':'))
+    assert streamed_json(tree, remove_parents=False) == expected
+    assert streamed_json(tree, compact=True, remove_parents=False) == compact_expected
+    assert streamed_json(tree) == expected
+    assert 'parent' not in tree['children'][0]
+
+
+def test_deep_tree():
+    root = node = {'url': 'http://site.org/', 'children': []}
+    for level in range(5000):
+        child = {'url': 'http://site.org/' + str(level), 'parent': node, 'children': []}
+        node['children'].append(child)
+        node = child
+    assert streamed_json(root, compact=True).count('"children"') == 5001
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_crawl_output(make_crawler, compact):
+    crawler = make_crawler(CRAWLING_STAGE_OUTPUT='tree.json', COMPACT_JSON_OUTPUT=compact)
+    crawler.crawl(devmode=False)
+    with open('tree.json', encoding='utf-8') as tree_file:
+        text = tree_file.read()
+    tree = json.loads(text)
+    assert tree['children']
+    if compact:
+        assert text == json.dumps(tree, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    else:
+        assert text == json.dumps(tree, ensure_ascii=False, sort_keys=True, indent=2)
@@ -0,0 +1,48 @@
+"""
+`URLFilter` decides like checking each of the IGNORE_URLS patterns in turn.
+"""
+import re
+import warnings
+
+from basiccrawler.urlfilter import URLFilter
+
+
+SOURCE_DOMAINS = ['http://site.org']
+
+
+def test_ignore_patterns():
+    url_filter = URLFilter(['http://site.org/exact'], SOURCE_DOMAINS)
+    assert url_filter.should_ignore('http://site.org/exact')
+    assert not url_filter.should_ignore('http://site.org/exact/page')
+    assert url_filter.should_ignore('http://other.org/page')
+
+
+def test_merged_regexes_and_callables():
+    patterns = [re.compile('.*/login'), re.compile(r'.*\.zip$'), re.compile('.*/(a)/\\1/'),
+                lambda url: url.endswith('/logout')]
+    url_filter = URLFilter(patterns, SOURCE_DOMAINS)
+    assert url_filter.should_ignore('http://site.org/login')
+    assert url_filter.should_ignore('http://site.org/files/data.zip')
+    assert url_filter.should_ignore('http://site.org/a/a/')
+    assert url_filter.should_ignore('http://site.org/logout')
+    assert not url_filter.should_ignore('http://site.org/a/b/')
+    assert not url_filter.should_ignore('http://site.org/files/data.zip.html')
+
+
+def test_inline_flags_apply_only_to_their_regex():
+    patterns = [re.compile('(?i).*/admin'), re.compile('.*/private', re.IGNORECASE),
+                re.compile('.*/secret', re.IGNORECASE)]
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        url_filter = URLFilter(patterns, SOURCE_DOMAINS)
+    assert url_filter.should_ignore('http://site.org/ADMIN')
+    assert url_filter.should_ignore('http://site.org/Private')
+    assert url_filter.should_ignore('http://site.org/SECRET')
+    assert len(url_filter.regexes) == 2
+
+
+def test_inline_flags_are_not_merged():
+    regexes = URLFilter.merge_regexes(['(?i)http://site.org/a', 'http://site.org/b', 'http://site.org/c'], 0)
+    assert [regex.pattern for regex in regexes] == [
+        '(?i)http://site.org/a', '(?:http://site.org/b)|(?:http://site.org/c)']
+    assert not any(regex.match('http://site.org/B') for regex in regexes)